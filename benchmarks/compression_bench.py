@@ -0,0 +1,74 @@
+import argparse
+import io
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.aead import send_gcm_file, receive_gcm_file, default_workers
+from utils.compression import CODECS
+
+def _sample_data(kind, size):
+    if kind == "random":
+        return os.urandom(size)
+    rows = []
+    length = 0
+    generator = random.Random(1)
+    while length < size:
+        row = f"{len(rows)},{generator.choice(['alpha', 'beta', 'gamma'])},{generator.random():.6f},user{generator.randint(1, 500)}\n"
+        rows.append(row)
+        length += len(row)
+    text = ''.join(rows).encode()[:size]
+    if kind == "csv":
+        return text
+    # Mixed: half text, half already compressed looking data
+    return text[:size // 2] + os.urandom(size - size // 2)
+
+def bench_transfer(data, codec, workers):
+    # Chunked AES-GCM over a local socket pair: read -> compress -> seal -> send -> open -> decompress -> write
+    key = os.urandom(32)
+    nonce = os.urandom(12)
+    sender, receiver = socket.socketpair()
+    received = io.BytesIO()
+    result = {}
+
+    def receive():
+        result["sizes"] = receive_gcm_file(receiver, received, len(data), key, nonce, workers, compressed=codec is not None)
+
+    thread = threading.Thread(target=receive)
+    start = time.perf_counter()
+    thread.start()
+    send_gcm_file(sender, io.BytesIO(data), len(data), key, nonce, workers, codec)
+    thread.join()
+    elapsed = time.perf_counter() - start
+    sender.close()
+    receiver.close()
+
+    if received.getvalue() != data:
+        raise RuntimeError("Received data does not match")
+    _, wire_bytes = result["sizes"]
+    return wire_bytes / len(data), len(data) / elapsed / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Compression stage benchmark: ratio and effective throughput per data type.")
+    parser.add_argument("-s", "--size", type=int, default=32, help="Test data size in MB")
+    parser.add_argument("-w", "--workers", type=int, default=default_workers())
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    print(f"Chunked AES-GCM transfer over a socket pair, {args.size} MB, {args.workers} workers")
+    print(f"  {'data':8s} {'codec':6s} {'ratio':>7s} {'MB/s':>9s}")
+    for kind in ("csv", "mixed", "random"):
+        data = _sample_data(kind, size)
+        for name, codec in [("none", None)] + list(CODECS.items()):
+            with redirect_stdout(io.StringIO()):
+                ratio, throughput = bench_transfer(data, codec, args.workers)
+            print(f"  {kind:8s} {name:6s} {ratio:7.3f} {throughput:9.1f}")
+
+if __name__ == "__main__":
+    main()
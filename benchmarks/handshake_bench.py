@@ -0,0 +1,229 @@
+import argparse
+import io
+import os
+import queue
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from utils.handshake import load_host_key, x25519_client_hello, x25519_server_accept, rsa_client_hello, rsa_server_accept
+from utils.tcp_sender import TcpSendSession
+
+def _timed(func, iterations):
+    # Median wall time and mean CPU time per call, in milliseconds
+    wall = []
+    cpu_start = time.process_time()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        wall.append((time.perf_counter() - start) * 1000)
+    cpu = (time.process_time() - cpu_start) * 1000 / iterations
+    return statistics.median(wall), cpu
+
+def bench_startup(iterations, host_key_path):
+    print("Receiver startup (key preparation):")
+    rsa_wall, _ = _timed(lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048), iterations)
+    host_wall, _ = _timed(lambda: load_host_key(host_key_path), iterations)
+    print(f"  RSA-2048 generation : {rsa_wall:8.3f} ms")
+    print(f"  X25519 host key load: {host_wall:8.3f} ms")
+    print(f"  X25519 ephemeral    : {0:8.3f} ms (generated per session)")
+
+def bench_server_cpu(iterations):
+    print("Server CPU per connection:")
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    rsa_hello = rsa_client_hello(rsa_key.public_key(), "admin", "admin123")[0]
+
+    def rsa_server():
+        rsa_server_accept(rsa_key, rsa_hello)
+
+    _, rsa_cpu = _timed(rsa_server, iterations)
+
+    # Client hellos are prepared up front so only server work is measured
+    server_key = X25519PrivateKey.generate()
+    hellos = iter([x25519_client_hello(server_key.public_key(), "admin", "admin123")[0] for _ in range(iterations)])
+    _, x25519_cpu = _timed(lambda: x25519_server_accept(server_key, next(hellos)), iterations)
+    _, keygen_cpu = _timed(X25519PrivateKey.generate, iterations)
+    print(f"  RSA-OAEP (one hello)      : {rsa_cpu:8.3f} ms")
+    print(f"  X25519 + HKDF + GCM       : {x25519_cpu + keygen_cpu:8.3f} ms (ephemeral key included)")
+    print(f"  Speedup                   : {rsa_cpu / (x25519_cpu + keygen_cpu):8.1f}x")
+
+def _wait_for_port(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Receiver on port {port} did not start")
+
+def _start_receiver(protocol, port, handshake, output_dir):
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main.py")
+    return subprocess.Popen(
+        [sys.executable, main_py, "--" + protocol, "-r", output_dir, "-p", str(port), "--handshake", handshake],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def bench_loopback(iterations, port, handshake, output_dir):
+    # Full TCP handshake against a real receiver process over 127.0.0.1
+    start = time.perf_counter()
+    receiver = _start_receiver("tcp", port, handshake, output_dir)
+    try:
+        _wait_for_port(port)
+        startup = (time.perf_counter() - start) * 1000
+
+        def connect():
+            with redirect_stdout(io.StringIO()):
+                with TcpSendSession("127.0.0.1", port, "admin", "admin123") as session:
+                    if not session.connect():
+                        raise RuntimeError("Authentication failed")
+                    session.close()  # Sends the hello and waits for the server's answer
+
+        connect()  # Warm up
+        wall, cpu = _timed(connect, iterations)
+        print(f"  {handshake:7s}: process startup {startup:8.1f} ms, handshake {wall:7.3f} ms median, client CPU {cpu:6.3f} ms")
+    finally:
+        receiver.terminate()
+        receiver.wait()
+
+class _DelayedPipe:
+    # Forwards data after a fixed one-way delay, without slowing down the data rate
+    def __init__(self, send, delay):
+        self.send = send
+        self.delay = delay
+        self.queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, data):
+        self.queue.put((time.perf_counter() + self.delay, data))
+
+    def _run(self):
+        while True:
+            due, data = self.queue.get()
+            if data is None:
+                return
+            time.sleep(max(0.0, due - time.perf_counter()))
+            try:
+                self.send(data)
+            except OSError:
+                return
+
+def _relay_tcp(listen_port, target_port, delay):
+    # TCP relay that adds delay to every direction; the local connect itself is not delayed,
+    # so on a real link TCP adds one more round trip for its own connection setup
+    listener = socket.create_server(("127.0.0.1", listen_port))
+
+    def pump(source, pipe):
+        while True:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b""
+            pipe.put(data or None)
+            if not data:
+                return
+
+    def open_session(client):
+        # The server accepts once the client's handshake ACK has crossed the link
+        time.sleep(delay)
+        server = socket.create_connection(("127.0.0.1", target_port))
+        for source, target in ((client, server), (server, client)):
+            target.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=pump, args=(source, _DelayedPipe(target.sendall, delay)), daemon=True).start()
+
+    def serve():
+        while True:
+            client, _ = listener.accept()
+            threading.Thread(target=open_session, args=(client,), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+
+def _relay_udp(listen_port, target_port, delay):
+    # UDP relay that adds delay to every direction; answers go to the last client address
+    outside = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    outside.bind(("127.0.0.1", listen_port))
+    inside = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    inside.connect(("127.0.0.1", target_port))
+    client = {}
+    to_server = _DelayedPipe(inside.send, delay)
+    to_client = _DelayedPipe(lambda data: outside.sendto(data, client["address"]), delay)
+
+    def forward():
+        while True:
+            data, client["address"] = outside.recvfrom(65535)
+            to_server.put(data)
+
+    def backward():
+        while True:
+            to_client.put(inside.recv(65535))
+
+    threading.Thread(target=forward, daemon=True).start()
+    threading.Thread(target=backward, daemon=True).start()
+
+def bench_ttfb(iterations, port, rtt, output_dir):
+    # Time to first data byte through a relay that adds rtt milliseconds of round-trip time;
+    # a handshake taking n round trips has a TTFB of about n * rtt
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main.py")
+    sample = os.path.join(output_dir, "ttfb_sample.bin")
+    with open(sample, 'wb') as file:
+        file.write(os.urandom(4096))
+    received = os.path.join(output_dir, "received") + os.sep
+
+    print(f"Time to first byte over {rtt} ms RTT:")
+    for offset, protocol in enumerate(("tcp", "udp")):
+        receiver_port = port + 2 * offset
+        receiver = _start_receiver(protocol, receiver_port, "x25519", received)
+        try:
+            if protocol == "tcp":
+                _wait_for_port(receiver_port)
+                _relay_tcp(receiver_port + 1, receiver_port, rtt / 2000)
+            else:
+                time.sleep(1.0)
+                _relay_udp(receiver_port + 1, receiver_port, rtt / 2000)
+
+            samples = []
+            for _ in range(iterations):
+                result = subprocess.run([sys.executable, main_py, "--" + protocol, "-s", sample, "-i", "127.0.0.1", "-p", str(receiver_port + 1)],
+                                        capture_output=True, text=True)
+                match = re.search(r"\(TTFB\): ([0-9.]+) ms", result.stdout)
+                if not match:
+                    raise RuntimeError(f"{protocol} transfer failed:\n{result.stdout}")
+                samples.append(float(match.group(1)))
+            ttfb = statistics.median(samples)
+            setup = " + 1 RTT TCP connection setup" if protocol == "tcp" else ""
+            print(f"  {protocol}: {ttfb:8.1f} ms median ({ttfb / rtt:.1f} RTT{setup})")
+        finally:
+            receiver.terminate()
+            receiver.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Handshake micro-benchmark: RSA-OAEP vs X25519 + HKDF.")
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("-p", "--port", type=int, default=23500)
+    parser.add_argument("--rtt", help="Round-trip time added for the time-to-first-byte test (ms).", type=float, default=150)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        host_key_path = os.path.join(tmp, "host_key.pem")
+        with redirect_stdout(io.StringIO()):
+            load_host_key(host_key_path)
+
+        bench_startup(max(1, args.iterations // 20), host_key_path)
+        bench_server_cpu(args.iterations)
+        print("Loopback handshake (connect, hello, server answer):")
+        bench_loopback(args.iterations, args.port, "rsa", tmp + os.sep)
+        bench_loopback(args.iterations, args.port + 1, "x25519", tmp + os.sep)
+        bench_ttfb(max(1, args.iterations // 40), args.port + 2, args.rtt, tmp)
+
+if __name__ == "__main__":
+    main()
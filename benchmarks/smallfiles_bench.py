@@ -0,0 +1,99 @@
+import argparse
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.aead import send_gcm_file, receive_gcm_file, default_workers, recv_exact, GcmStreamWriter, GcmStreamReader
+from utils.archive import walk_tree, write_archive, extract_archive
+
+def _make_files(root, count, size):
+    os.makedirs(root)
+    for index in range(count):
+        with open(os.path.join(root, f"f{index}.bin"), 'wb') as file:
+            file.write(os.urandom(size))
+
+def _run(send, receive):
+    # Sender and receiver on the two ends of a local socket pair, returns elapsed seconds
+    sender, receiver = socket.socketpair()
+    thread = threading.Thread(target=receive, args=(receiver,))
+    start = time.perf_counter()
+    thread.start()
+    send(sender)
+    thread.join()
+    elapsed = time.perf_counter() - start
+    sender.close()
+    receiver.close()
+    return elapsed
+
+def bench_packed(source, target, workers):
+    # Entry stream: files packed into shared sealed chunks, reads ahead, batched writes
+    key = os.urandom(32)
+    nonce = os.urandom(12)
+    entries = walk_tree(source)
+
+    def send(sock):
+        stream = GcmStreamWriter(sock, key, nonce, workers)
+        write_archive(stream, entries, workers)
+        stream.close()
+
+    def receive(sock):
+        extract_archive(GcmStreamReader(sock, key, nonce), target, workers)
+
+    return _run(send, receive)
+
+def bench_per_file(source, target, workers):
+    # Previous multi-file path: 1024-byte header and a chunked AES-GCM stream of its own per file
+    key = os.urandom(32)
+    nonce = os.urandom(12)
+    names = sorted(os.listdir(source))
+    os.makedirs(target)
+
+    def send(sock):
+        for name in names:
+            path = os.path.join(source, name)
+            size = os.path.getsize(path)
+            sock.sendall(f"{name}|{size}|".encode().ljust(1024, b'a'))
+            with open(path, 'rb') as file:
+                send_gcm_file(sock, file, size, key, nonce, workers)
+
+    def receive(sock):
+        for _ in names:
+            name, size, _ = recv_exact(sock, 1024).decode().split('|', 2)
+            with open(os.path.join(target, name), 'wb') as file:
+                receive_gcm_file(sock, file, int(size), key, nonce, workers)
+
+    return _run(send, receive)
+
+def main():
+    parser = argparse.ArgumentParser(description="Small-file benchmark: files per second over a local socket pair.")
+    parser.add_argument("-n", "--files", type=int, default=2000, help="Files per size")
+    parser.add_argument("-w", "--workers", type=int, default=default_workers())
+    args = parser.parse_args()
+
+    print(f"{args.files} files per size, {args.workers} workers")
+    print(f"  {'size':>6s} {'mode':9s} {'files/s':>9s} {'MB/s':>7s}")
+    workdir = tempfile.mkdtemp(prefix="smallfiles_bench_")
+    try:
+        for size_kib in (1, 4, 16, 64):
+            source = os.path.join(workdir, f"source{size_kib}")
+            _make_files(source, args.files, size_kib * 1024)
+            for mode, bench in (("per-file", bench_per_file), ("packed", bench_packed)):
+                target = os.path.join(workdir, f"target{size_kib}_{mode}")
+                with redirect_stdout(io.StringIO()):
+                    elapsed = bench(source, target, args.workers)
+                print(f"  {size_kib:4d}KB {mode:9s} {args.files / elapsed:9.0f} {args.files * size_kib / 1024 / elapsed:7.1f}")
+                shutil.rmtree(target)
+            shutil.rmtree(source)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
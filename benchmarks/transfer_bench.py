@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    import resource  # CPU time and peak RSS; not available on Windows
+except ImportError:
+    resource = None
+
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+METRICS = ("mb_per_s", "files_per_s", "handshake_ms", "wall_seconds", "sender_cpu_seconds", "sender_peak_rss", "receiver_cpu_seconds",
+           "receiver_peak_rss")
+
+def _parse_size(text: str):
+    # "1K", "64M", "4G" or plain bytes
+    text = text.upper().rstrip("B").rstrip("I")
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+def _format_size(size: int):
+    for unit in ("G", "M", "K"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return str(size)
+
+def _usage():
+    # (CPU seconds, peak RSS bytes) of this process
+    if resource is None:
+        return None, None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return usage.ru_utime + usage.ru_stime, rss
+
+def _free_port():
+    # Auto mode pings first, so both sides have to agree on the port before the receiver starts
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _make_source(root: str, size: int, count: int):
+    # One file, or a directory of count files; random data, compression gains nothing
+    os.makedirs(root)
+    paths = [os.path.join(root, f"f{index}.bin") for index in range(count)]
+    for path in paths:
+        with open(path, 'wb') as file:
+            remaining = size
+            while remaining:
+                block = min(remaining, 16 << 20)
+                file.write(os.urandom(block))
+                remaining -= block
+    return paths[0] if count == 1 else root
+
+# Child processes: the receiver and the sender run in processes of their own, so CPU time and peak RSS
+# belong to one side; the library's prints go to devnull, the parent reads JSON lines from stdout
+
+def _child_serve(config: dict):
+    from utils.transfer import TransferServer
+    output, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    server = TransferServer(config["folder"], config["port"], protocol=config["protocol"], workers=config["workers"],
+                            handshake=config["handshake"])
+    server.start(timeout=60)
+    cpu_start, _ = _usage()
+    output.write(json.dumps({"port": server.port}) + "\n")
+    output.flush()
+    sys.stdin.read()  # The parent closes stdin once the sender is done
+    server.stop()
+    cpu_end, rss = _usage()
+    output.write(json.dumps({"cpu_seconds": None if cpu_start is None else cpu_end - cpu_start, "peak_rss": rss}) + "\n")
+
+def _child_send(config: dict):
+    from utils.errors import TransferError
+    from utils.transfer import TransferClient
+    output, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    client = TransferClient("127.0.0.1", config["port"], protocol=config["protocol"], fragment=config["fragment"], aead=config["aead"],
+                            workers=config["workers"], streams=config["streams"], compress=config["compress"],
+                            integrity_only=config["integrity_only"], ping_count=config["ping_count"])
+    cpu_start, _ = _usage()
+    start_time = time.perf_counter()
+    try:
+        result = client.send(config["path"])
+    except (TransferError, OSError) as e:
+        output.write(json.dumps({"error": f"{type(e).__name__}: {e}"}) + "\n")
+        return
+    wall = time.perf_counter() - start_time
+    cpu_end, rss = _usage()
+    output.write(json.dumps({"wall_seconds": wall, "cpu_seconds": None if cpu_start is None else cpu_end - cpu_start, "peak_rss": rss,
+                             "result": result.to_dict()}) + "\n")
+
+def _spawn(role: str, config: dict):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", role, json.dumps(config)],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+def _read_json(process, role: str):
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError(f"{role} exited with code {process.returncode}")
+    return json.loads(line)
+
+def run_once(protocol: str, path: str, target: str, args):
+    # One transfer between a fresh receiver and sender process
+    port = _free_port()
+    config = {"protocol": protocol, "port": port, "workers": args.workers}
+    receiver = _spawn("serve", dict(config, folder=target, handshake=args.handshake))
+    try:
+        port = _read_json(receiver, "receiver")["port"]
+        sender = _spawn("send", dict(config, port=port, path=path, fragment=args.fragment, aead=args.aead, streams=args.streams,
+                                     compress=args.codec if args.compress else None, integrity_only=args.integrity_only,
+                                     ping_count=args.ping_count))
+        try:
+            sent = _read_json(sender, "sender")
+        finally:
+            sender.wait()
+        receiver.stdin.close()
+        received = _read_json(receiver, "receiver")
+    finally:
+        if not receiver.stdin.closed:
+            receiver.stdin.close()
+        try:
+            receiver.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            receiver.kill()
+            receiver.wait()
+
+    if "error" in sent:
+        return {"error": sent["error"]}
+    result = sent["result"]
+    duration = max(result["duration"], 1e-9)
+    return {"protocol": result["protocol"], "mb_per_s": result["bytes"] / duration / 1e6, "files_per_s": result["file_count"] / duration,
+            "handshake_ms": result["handshake_time"] * 1000, "wall_seconds": sent["wall_seconds"], "transfer_seconds": result["duration"],
+            "retransmits": result["retransmits"], "verified": result["verified"], "sender_cpu_seconds": sent["cpu_seconds"],
+            "sender_peak_rss": sent["peak_rss"], "receiver_cpu_seconds": received["cpu_seconds"], "receiver_peak_rss": received["peak_rss"],
+            "stats": result["stats"]}
+
+def _median(runs: list, metric: str):
+    values = [run[metric] for run in runs if run.get(metric) is not None]
+    return round(statistics.median(values), 6) if values else None
+
+def _cases(args):
+    # (size, count, protocols) combinations within the size limits
+    for size in args.sizes:
+        for count in args.counts:
+            if size * count > args.max_total:
+                continue
+            # UDP keeps the whole transfer in memory
+            protocols = [protocol for protocol in args.protocols if protocol != "udp" or size * count <= args.udp_max_total]
+            if protocols:
+                yield size, count, protocols
+
+def _key(case: dict):
+    return f"{case['protocol']} {_format_size(case['size'])} x{case['files']}"
+
+def print_diff(old: dict, new: dict):
+    # Median metrics of the cases both runs have, new against old (peak RSS in MB)
+    old_cases = {_key(case): case for case in old["cases"]}
+    print(f"  {'case':22s} {'metric':22s} {'old':>12s} {'new':>12s} {'change':>8s}")
+    for case in new["cases"]:
+        before = old_cases.get(_key(case))
+        if before is None:
+            continue
+        for metric in METRICS:
+            a, b = before["median"].get(metric), case["median"].get(metric)
+            if a is None or b is None:
+                continue
+            if metric.endswith("rss"):
+                a, b = a / 1e6, b / 1e6
+            change = f"{(b - a) / a * 100:+7.1f}%" if a else ""
+            print(f"  {_key(case):22s} {metric:22s} {a:12.3f} {b:12.3f} {change:>8s}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Loopback benchmark of TCP, UDP and auto transfers between a receiver and a sender process.")
+    parser.add_argument("--protocols", nargs="+", choices=["tcp", "udp", "auto"], default=["tcp", "udp", "auto"])
+    parser.add_argument("--sizes", nargs="+", type=_parse_size, default=[_parse_size(size) for size in ("1K", "64K", "1M", "64M", "1G", "4G")],
+                        help="File sizes (K, M, G suffixes)")
+    parser.add_argument("--counts", nargs="+", type=int, default=[1, 100, 1000], help="Files per transfer (more than one: a directory)")
+    parser.add_argument("--max-total", type=_parse_size, default=_parse_size("4G"), help="Skip combinations with more bytes per transfer")
+    parser.add_argument("--udp-max-total", type=_parse_size, default=_parse_size("16M"),
+                        help="Skip larger UDP transfers (held in memory, loses packets on loopback bursts)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Runs per case, the medians are reported")
+    parser.add_argument("-o", "--output", default="transfer_bench.json", help="JSON result file")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("-f", "--fragment", type=int, default=1024)
+    parser.add_argument("--aead", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--streams", type=int, default=1)
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--codec", choices=["zlib", "lzma"], default="zlib")
+    parser.add_argument("--integrity-only", action="store_true")
+    parser.add_argument("--handshake", choices=["rsa", "x25519"], default="rsa")
+    parser.add_argument("-c", "--ping-count", type=int, default=2, help="Pings of the auto mode")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        role, config = args.child
+        (_child_serve if role == "serve" else _child_send)(json.loads(config))
+        return
+
+    if args.diff:
+        with open(args.diff[0]) as old_file, open(args.diff[1]) as new_file:
+            print_diff(json.load(old_file), json.load(new_file))
+        return
+
+    options = {name: getattr(args, name) for name in ("fragment", "aead", "workers", "streams", "compress", "codec", "integrity_only", "handshake",
+                                                       "ping_count", "repeat")}
+    report = {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(), "options": options}, "cases": []}
+
+    # CPU seconds and peak RSS: sender/receiver
+    print(f"  {'case':22s} {'MB/s':>8s} {'files/s':>9s} {'hs ms':>7s} {'cpu s':>13s} {'rss MB':>13s}")
+    workdir = tempfile.mkdtemp(prefix="transfer_bench_")
+    try:
+        for size, count, protocols in _cases(args):
+            source = _make_source(os.path.join(workdir, "source"), size, count)
+            for protocol in protocols:
+                runs = []
+                for _ in range(args.repeat):
+                    target = os.path.join(workdir, "target")
+                    runs.append(run_once(protocol, source, target, args))
+                    shutil.rmtree(target, ignore_errors=True)
+                case = {"protocol": protocol, "size": size, "files": count, "bytes": size * count, "runs": runs,
+                        "failed": sum("error" in run for run in runs),
+                        "median": {metric: _median(runs, metric) for metric in METRICS}}
+                report["cases"].append(case)
+                median = case["median"]
+                if median["mb_per_s"] is None:
+                    print(f"  {_key(case):22s} failed: {runs[-1]['error']}")
+                    continue
+                cpu = f"{median['sender_cpu_seconds'] or 0:.2f}/{median['receiver_cpu_seconds'] or 0:.2f}"
+                rss = f"{(median['sender_peak_rss'] or 0) / 1e6:.0f}/{(median['receiver_peak_rss'] or 0) / 1e6:.0f}"
+                print(f"  {_key(case):22s} {median['mb_per_s']:8.1f} {median['files_per_s']:9.1f} {median['handshake_ms']:7.1f} {cpu:>13s} {rss:>13s}")
+            shutil.rmtree(os.path.join(workdir, "source"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=1)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
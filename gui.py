@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
 import threading
+import queue
 from contextlib import redirect_stdout, redirect_stderr
-
-# Ping limit for auto protocol selection
-PING_LIMIT = 50  # milliseconds - adjust this value as needed
+from utils.progress import format_progress
+from utils.transfer import PING_LIMIT, TransferClient, TransferServer
+PROGRESS_POLL_MS = 100  # How often the Tk thread picks up progress events
 
 class TerminalRedirector:
     def __init__(self, text_widget):
@@ -82,6 +83,14 @@ class FileTransferGUI:
         clear_btn = ttk.Button(main_frame, text="Clear Terminal", command=self.clear_terminal)
         clear_btn.grid(row=3, column=0, pady=5, sticky=tk.W)
         
+        # Transfer progress (fed by progress events, not by terminal output)
+        progress_frame = ttk.Frame(main_frame)
+        progress_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        self.progress_bar = ttk.Progressbar(progress_frame, orient="horizontal", mode="determinate", maximum=100)
+        self.progress_bar.pack(side='left', fill='x', expand=True, padx=(0, 10))
+        self.progress_var = tk.StringVar(value="")
+        ttk.Label(progress_frame, textvariable=self.progress_var, width=55).pack(side='right')
+        
         # Grid configuration
         root.columnconfigure(0, weight=1)
         root.rowconfigure(0, weight=1)
@@ -98,6 +107,10 @@ class FileTransferGUI:
         # Terminal redirection
         self.terminal_redirector = TerminalRedirector(self.terminal_text)
         
+        # Progress events of the GUI's own transfers arrive on transfer threads; only the latest one is shown, from the Tk thread
+        self.progress_events = queue.Queue()
+        self.root.after(PROGRESS_POLL_MS, self.poll_progress)
+        
     def setup_tcp_udp_tab(self):
         # TCP/UDP tab
         frame = self.tcp_udp_frame
@@ -313,6 +326,20 @@ class FileTransferGUI:
     def clear_terminal(self):
         self.terminal_text.delete(1.0, tk.END)
     
+    def poll_progress(self):
+        event = None
+        try:
+            while True:
+                event = self.progress_events.get_nowait()
+        except queue.Empty:
+            pass
+        if event is not None:
+            if event.total_bytes:
+                self.progress_bar.configure(mode="determinate")
+                self.progress_bar["value"] = min(event.bytes_done / event.total_bytes, 1.0) * 100
+            self.progress_var.set(format_progress(event))
+        self.root.after(PROGRESS_POLL_MS, self.poll_progress)
+    
     def run_in_thread(self, func):
         """Run function in separate thread and redirect output to terminal"""
         def wrapper():
@@ -343,73 +370,26 @@ class FileTransferGUI:
             
             if protocol == "auto":
                 print(f"Starting AUTO protocol selection...")
-                print(f"Path: {path}")
-                print(f"IP: {ip}, Port: {port}")
-                print(f"Fragment size: {fragment}")
-                print(f"Username: {username}")
-                print(f"Ping limit: {PING_LIMIT}ms")
-                print("-" * 50)
-                
-                try:
-                    ping_count = int(self.auto_ping_count_var.get())
-                    
-                    if mode == "send":
-                        from utils.ping_sender import ping_send_return
-                        ping_result = ping_send_return(ip, port, ping_count)
-                        if ping_result < PING_LIMIT:
-                            print(f"\nPing {PING_LIMIT}'den küçük olduğu için TCP protokolü seçildi.\n")
-                            from utils.tcp_sender import tcp_send
-                            tcp_send(path, ip, port, fragment, username, password)
-                        else:
-                            print(f"\nPing {PING_LIMIT}'den büyük olduğu için UDP protokolü seçildi.\n")
-                            from utils.udp_sender import udp_send
-                            udp_send(path, ip, port, fragment, username, password)
-                    else:  # receive mode
-                        from utils.ping_receiver import ping_receive_return
-                        ping_result = ping_receive_return(port)
-                        if ping_result < PING_LIMIT:
-                            print(f"\nPing {PING_LIMIT}'den küçük olduğu için TCP protokolü seçildi.\n")
-                            from utils.tcp_receiver import tcp_receive
-                            tcp_receive(path, port, username, password)
-                        else:
-                            print(f"\nPing {PING_LIMIT}'den büyük olduğu için UDP protokolü seçildi.\n")
-                            from utils.udp_receiver import udp_receive
-                            udp_receive(path, port, username, password)
-                            
-                except ImportError as e:
-                    print(f"Module import error: {e}")
-                    print("Make sure the utils modules are available in the correct path.")
-                except Exception as e:
-                    print(f"Auto protocol selection error: {e}")
             else:
-                # Manual protocol selection (existing code)
                 print(f"Starting {protocol.upper()} {mode}...")
-                print(f"Path: {path}")
-                print(f"IP: {ip}, Port: {port}")
-                print(f"Fragment size: {fragment}")
-                print(f"Username: {username}")
-                print("-" * 50)
-                
-                try:
-                    if protocol == "tcp":
-                        if mode == "send":
-                            from utils.tcp_sender import tcp_send
-                            tcp_send(path, ip, port, fragment, username, password)
-                        else:
-                            from utils.tcp_receiver import tcp_receive
-                            tcp_receive(path, port, username, password)
-                    elif protocol == "udp":
-                        if mode == "send":
-                            from utils.udp_sender import udp_send
-                            udp_send(path, ip, port, fragment, username, password)
-                        else:
-                            from utils.udp_receiver import udp_receive
-                            udp_receive(path, port, username, password)
-                except ImportError as e:
-                    print(f"Module import error: {e}")
-                    print("Make sure the utils modules are available in the correct path.")
-                except Exception as e:
-                    print(f"Transfer error: {e}")
+            print(f"Path: {path}")
+            print(f"IP: {ip}, Port: {port}")
+            print(f"Fragment size: {fragment}")
+            print(f"Username: {username}")
+            if protocol == "auto":
+                print(f"Ping limit: {PING_LIMIT}ms")
+            print("-" * 50)
+            
+            try:
+                ping_count = int(self.auto_ping_count_var.get()) if protocol == "auto" else 5
+                if mode == "send":
+                    result = TransferClient(ip, port, username, password, protocol, fragment, ping_count=ping_count,
+                                            on_progress=self.progress_events.put).send(path)
+                    print(f"\n{result.summary()}")
+                else:
+                    TransferServer(path, port, username, password, protocol, on_progress=self.progress_events.put).serve_forever()
+            except Exception as e:
+                print(f"Transfer error: {e}")
         
         self.run_in_thread(transfer)
     
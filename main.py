@@ -1,11 +1,10 @@
 import argparse
-
-PING_LIMIT = 50
+import sys
 
 def main():
     parser = argparse.ArgumentParser(description="Simple file transfer system.")
 
-    parser.add_argument("path", help="Path of the file or directory to send or receive.", nargs="?")
+    parser.add_argument("path", help="Path of the file(s) or directory to send or receive.", nargs="*")
     
     # Protocol selection
     protocol_group = parser.add_mutually_exclusive_group(required=True)
@@ -28,6 +27,22 @@ def main():
     parser.add_argument("-c", "--count", help="Packet count for ping.", type=int, default=5)
     parser.add_argument("-U", "--username", help="Username for authentication.", type=str, default="admin")
     parser.add_argument("-P", "--password", help="Password for authentication.", type=str, default="admin123")
+    parser.add_argument("--aead", action="store_true", help="Use chunked AES-GCM encryption for TCP transfers.")
+    parser.add_argument("--workers", help="Worker threads for chunk encryption and decryption.", type=int, default=None)
+    parser.add_argument("--streams", help="Parallel TCP connections for sending one file.", type=int, default=1)
+    parser.add_argument("--resume", action="store_true", help="Resume interrupted TCP transfers, sending only missing chunks.")
+    parser.add_argument("--delta", action="store_true", help="Send only the parts of a TCP file that differ from the receiver's existing copy.")
+    parser.add_argument("--dedup", action="store_true", help="Send only TCP file chunks the receiver's chunk store does not have yet.")
+    parser.add_argument("--chunk-store", help="Chunk store directory of the TCP receiver for deduplicated transfers.", type=str, default=None)
+    parser.add_argument("--compress", action="store_true", help="Compress chunks before encryption (incompressible chunks are sent as they are).")
+    parser.add_argument("--codec", help="Compression codec used with --compress.", choices=["zlib", "lzma"], default="zlib")
+    parser.add_argument("--integrity-only", action="store_true", help="Send TCP file contents unencrypted with sendfile, protected by an HMAC (trusted networks only).")
+    parser.add_argument("--queue-depth", help="Chunks buffered between the pipeline threads of a TCP transfer (sender: read, encrypt, send; receiver: network, decrypt, write).", type=int, default=None)
+    parser.add_argument("--max-sessions", help="Maximum simultaneous TCP receive sessions.", type=int, default=16)
+    parser.add_argument("--handshake", help="Key exchange used by the receiver.", choices=["rsa", "x25519"], default="rsa")
+    parser.add_argument("--host-key", help="Persistent X25519 host key file for the receiver (created if missing).", type=str, default=None)
+    parser.add_argument("--stats-json", help="Append the per-stage timings and counters of every finished transfer to this file (JSON Lines).", type=str, default=None)
+    parser.add_argument("--progress-interval", help="Seconds between progress updates of a transfer.", type=float, default=0.2)
 
     # iperf Params
     parser.add_argument("--iserver", help="Server IP for iperf.", type=str, default="speedtest.serverius.net")
@@ -37,43 +52,44 @@ def main():
     parser.add_argument("--iinter", help="Interface for iperf.", type=str, default=None)
     parser.add_argument("--iexport", help="Export path for iperf.", type=str, default="bandwidth_test.json")
 
-    args = parser.parse_args()
+    args = parser.parse_intermixed_args()
 
-    if args.auto == True:
-        if args.send == True:
-            from utils.ping_sender import ping_send_return
-            if ping_send_return(args.ip, args.port, args.count) < PING_LIMIT:
-                print(f"\nPing {PING_LIMIT}'den küçük olduğu için TCP protokolü seçildi.\n")
-                from utils.tcp_sender import tcp_send
-                tcp_send(args.path, args.ip, args.port, args.fragment, args.username, args.password)
-            else:
-                print(f"\nPing {PING_LIMIT}'den büyük olduğu için UDP protokolü seçildi.\n")
-                from utils.udp_sender import udp_send
-                udp_send(args.path, args.ip, args.port, args.fragment, args.username, args.password)
-        else:
-            from utils.ping_receiver import ping_receive_return
-            if ping_receive_return(args.port) < PING_LIMIT:
-                print(f"\nPing {PING_LIMIT}'den küçük olduğu için TCP protokolü seçildi.\n")
-                from utils.tcp_receiver import tcp_receive
-                tcp_receive(args.path, args.port, args.username, args.password)
+    if not args.gui:
+        # Transfers report throttled progress events, the CLI prints those of its transfer on one line
+        from utils.progress import set_interval
+        set_interval(args.progress_interval)
+
+    compress = args.codec if args.compress else None
+    protocol = "auto" if args.auto else "tcp" if args.tcp else "udp"
+
+    if args.auto or args.tcp or args.udp:
+        from utils.errors import TransferError, VerificationError
+        from utils.stats import append_json
+        from utils.transfer import TransferClient, TransferServer
+        from utils.progress import print_progress
+        try:
+            if args.send:
+                client = TransferClient(args.ip, args.port, args.username, args.password, protocol, args.fragment, args.aead, args.workers,
+                                        args.streams, args.resume, args.delta, args.dedup, compress, args.integrity_only, args.count,
+                                        args.queue_depth, print_progress)
+                try:
+                    result = client.send(args.path)
+                except VerificationError as e:
+                    if args.stats_json and e.result is not None:
+                        append_json(args.stats_json, e.result.to_dict())
+                    raise
+                if args.stats_json:
+                    append_json(args.stats_json, result.to_dict())
+                print(f"\n{result.summary()}")
             else:
-                print(f"\nPing {PING_LIMIT}'den büyük olduğu için UDP protokolü seçildi.\n")
-                from utils.udp_receiver import udp_receive
-                udp_receive(args.path, args.port, args.username, args.password)
-    elif args.tcp == True:
-        if args.send == True:
-            from utils.tcp_sender import tcp_send
-            tcp_send(args.path, args.ip, args.port, args.fragment, args.username, args.password)
-        else:
-            from utils.tcp_receiver import tcp_receive
-            tcp_receive(args.path, args.port, args.username, args.password)
-    elif args.udp == True:
-        if args.send == True:
-            from utils.udp_sender import udp_send
-            udp_send(args.path, args.ip, args.port, args.fragment, args.username, args.password)
-        else:
-            from utils.udp_receiver import udp_receive
-            udp_receive(args.path, args.port, args.username, args.password)
+                on_result = (lambda result: append_json(args.stats_json, result.to_dict())) if args.stats_json else None
+                server = TransferServer(args.path[0] if args.path else None, args.port, args.username, args.password, protocol, args.workers,
+                                        args.max_sessions, args.handshake, args.host_key, args.chunk_store, on_result, args.queue_depth, print_progress)
+                server.serve_forever()
+        except (TransferError, OSError) as e:
+            # Scripts tell a failed transfer from a successful one by the exit status
+            print(f"HATA: {e}")
+            sys.exit(1)
     elif args.ping == True:
         if args.send == True:
             from utils.ping_sender import ping_send
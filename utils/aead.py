@@ -0,0 +1,286 @@
+import os
+import hashlib
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from utils.compression import compress_chunk, decompress_chunk
+from utils.progress import Progress
+from utils.stats import current
+
+CHUNK_SIZE = 1024 * 1024  # 1MB plaintext per sealed chunk
+TAG_SIZE = 16             # AES-GCM authentication tag
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def chunk_count(filesize: int):
+    # Empty files still get one (empty) chunk so the last-chunk flag is authenticated
+    return max(1, (filesize + CHUNK_SIZE - 1) // CHUNK_SIZE)
+
+def file_iv(session_iv: bytes, index: int):
+    # Every file sent in a session gets its own IV derived from the session IV
+    return hashlib.sha256(session_iv + index.to_bytes(8, 'big')).digest()[:16]
+
+def chunk_nonce(base_nonce: bytes, index: int):
+    # Per-chunk nonce: last 8 bytes of the 12-byte base nonce XOR chunk index
+    counter = struct.unpack('!Q', base_nonce[4:12])[0] ^ index
+    return base_nonce[:4] + struct.pack('!Q', counter)
+
+def chunk_aad(index: int, is_last: bool):
+    # Bind chunk position and end of stream so chunks cannot be reordered or cut off
+    return struct.pack('!QB', index, 1 if is_last else 0)
+
+def recv_exact(sock, size: int):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        length = sock.recv_into(view[received:])
+        if not length:
+            raise ConnectionError("Bağlantı beklenmedik şekilde kapandı")
+        received += length
+    return buffer
+
+def _seal_chunk(aesgcm, nonce: bytes, data: bytes, aad: bytes, codec, stats):
+    # Compression (optional) and encryption both run on the worker thread
+    started = time.perf_counter()
+    if codec is not None:
+        plain_length = len(data)
+        data = compress_chunk(data, codec)
+        compressed = time.perf_counter()
+        stats.add("compress", compressed - started, plain_length)
+        started = compressed
+    sealed = aesgcm.encrypt(nonce, data, aad)
+    stats.add("encrypt", time.perf_counter() - started, len(data))
+    return sealed
+
+def _open_chunk(aesgcm, nonce: bytes, sealed: bytes, aad: bytes, compressed: bool, plain_length: int, stats):
+    # plain_length None: length unknown in advance, at most one full chunk
+    started = time.perf_counter()
+    data = aesgcm.decrypt(nonce, sealed, aad)
+    decrypted = time.perf_counter()
+    stats.add("decrypt", decrypted - started, len(data))
+    if compressed:
+        limit = CHUNK_SIZE if plain_length is None else plain_length
+        data = decompress_chunk(data, limit + 1)
+        if len(data) > limit or (plain_length is not None and len(data) != plain_length):
+            raise ValueError("Sıkıştırılmış parça boyutu hatalı")
+        stats.add("decompress", time.perf_counter() - decrypted, len(data))
+    return data
+
+def send_gcm_file(sock, file, filesize: int, key: bytes, base_nonce: bytes, workers: int, codec: int = None):
+    # With a codec every chunk is compressed before sealing and sent with a length prefix;
+    # returns (file bytes, bytes on the wire)
+    aesgcm = AESGCM(key)
+    count = chunk_count(filesize)
+    window = workers * 2  # Chunks in flight, bounds memory use
+    bytes_sent = 0
+    wire_bytes = 0
+    chunks_sent = 0
+    progress = Progress(filesize, count, "parça")
+    stats = current()
+    clock = time.perf_counter
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def send_oldest():
+            nonlocal bytes_sent, wire_bytes, chunks_sent
+            plain_length, future = pending.popleft()
+            started = clock()
+            sealed = future.result()
+            sealed_done = clock()
+            if codec is not None:
+                sock.sendall(struct.pack('!I', len(sealed)))
+                wire_bytes += 4
+            sock.sendall(sealed)
+            stats.add("pipeline_wait", sealed_done - started)
+            stats.add("socket_send", clock() - sealed_done, len(sealed))
+            bytes_sent += plain_length
+            wire_bytes += len(sealed)
+            chunks_sent += 1
+            progress.update(bytes_sent, chunks_sent)
+
+        for index in range(count):
+            started = clock()
+            data = file.read(min(CHUNK_SIZE, filesize - index * CHUNK_SIZE))  # Never read past the range
+            stats.add("disk_read", clock() - started, len(data))
+            is_last = index == count - 1
+            pending.append((len(data), pool.submit(_seal_chunk, aesgcm, chunk_nonce(base_nonce, index), data, chunk_aad(index, is_last), codec, stats)))
+
+            if len(pending) >= window:
+                send_oldest()
+
+        while pending:
+            send_oldest()
+
+    progress.finish()
+    return bytes_sent, wire_bytes
+
+def _open_chunk_at(file, position: int, aesgcm, nonce: bytes, sealed: bytes, aad: bytes, compressed: bool, plain_length: int, stats):
+    # Decrypted chunk is written at its position by the worker itself, in any order
+    data = _open_chunk(aesgcm, nonce, sealed, aad, compressed, plain_length, stats)
+    started = time.perf_counter()
+    file.write_at(position, data)
+    stats.add("disk_write", time.perf_counter() - started, len(data))
+    return data
+
+def receive_gcm_file(sock, file, filesize: int, key: bytes, base_nonce: bytes, workers: int, file_hash=None, compressed: bool = False):
+    # Raises cryptography.exceptions.InvalidTag if any chunk was modified;
+    # file_hash (optional, a merkle.TreeHasher that records its own hash time) is updated with the decrypted data;
+    # a file with write_at (storage.OffsetWriter) gets every chunk written at its offset by the workers;
+    # returns (file bytes, bytes on the wire)
+    positional = hasattr(file, 'write_at')
+    aesgcm = AESGCM(key)
+    count = chunk_count(filesize)
+    window = workers * 2
+    bytes_written = 0
+    wire_bytes = 0
+    chunks_written = 0
+    progress = Progress(filesize, count, "parça")
+    stats = current()
+    clock = time.perf_counter
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def write_oldest():
+            nonlocal bytes_written, chunks_written
+            started = clock()
+            data = pending.popleft().result()
+            opened = clock()
+            stats.add("pipeline_wait", opened - started)
+            if not positional:
+                file.write(data)
+                written = clock()
+                stats.add("disk_write", written - opened, len(data))
+                opened = written
+            if file_hash is not None:
+                file_hash.update(data)
+            bytes_written += len(data)
+            chunks_written += 1
+            progress.update(bytes_written, chunks_written)
+
+        for index in range(count):
+            is_last = index == count - 1
+            plain_length = filesize - index * CHUNK_SIZE if is_last else CHUNK_SIZE
+            started = clock()
+            if compressed:
+                sealed_length = struct.unpack('!I', recv_exact(sock, 4))[0]
+                if sealed_length > plain_length + 1 + TAG_SIZE:
+                    raise ValueError("Sıkıştırılmış parça çok büyük")
+                wire_bytes += 4
+            else:
+                sealed_length = plain_length + TAG_SIZE
+            sealed = recv_exact(sock, sealed_length)
+            stats.add("socket_recv", clock() - started, sealed_length)
+            wire_bytes += sealed_length
+            if positional:
+                pending.append(pool.submit(_open_chunk_at, file, index * CHUNK_SIZE, aesgcm, chunk_nonce(base_nonce, index), sealed, chunk_aad(index, is_last), compressed, plain_length, stats))
+            else:
+                pending.append(pool.submit(_open_chunk, aesgcm, chunk_nonce(base_nonce, index), sealed, chunk_aad(index, is_last), compressed, plain_length, stats))
+
+            if len(pending) >= window:
+                write_oldest()
+
+        while pending:
+            write_oldest()
+
+    progress.finish()
+    return bytes_written, wire_bytes
+
+class GcmStreamWriter:
+    # File-like writer for a stream of unknown length: written data is cut into chunks that are
+    # (optionally compressed and) sealed on worker threads; every chunk is sent with its sealed
+    # length and last-chunk flag, close() seals the final (possibly empty) chunk
+    def __init__(self, sock, key: bytes, base_nonce: bytes, workers: int, codec: int = None):
+        self.sock = sock
+        self.aesgcm = AESGCM(key)
+        self.base_nonce = base_nonce
+        self.codec = codec
+        self.window = workers * 2
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.index = 0
+        self.bytes_written = 0
+        self.wire_bytes = 0
+        self.stats = current()
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= CHUNK_SIZE:
+            self._seal(bytes(self.buffer[:CHUNK_SIZE]), False)
+            del self.buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def _seal(self, data: bytes, is_last: bool):
+        self.pending.append((is_last, self.pool.submit(_seal_chunk, self.aesgcm, chunk_nonce(self.base_nonce, self.index), data, chunk_aad(self.index, is_last), self.codec,
+                                                       self.stats)))
+        self.index += 1
+        self.bytes_written += len(data)
+        while len(self.pending) >= self.window or (is_last and self.pending):
+            is_chunk_last, future = self.pending.popleft()
+            started = time.perf_counter()
+            sealed = future.result()
+            sealed_done = time.perf_counter()
+            self.sock.sendall(struct.pack('!IB', len(sealed), is_chunk_last))
+            self.sock.sendall(sealed)
+            self.stats.add("pipeline_wait", sealed_done - started)
+            self.stats.add("socket_send", time.perf_counter() - sealed_done, 5 + len(sealed))
+            self.wire_bytes += 5 + len(sealed)
+
+    def close(self):
+        try:
+            self._seal(bytes(self.buffer), True)
+            self.buffer.clear()
+        finally:
+            self.pool.shutdown()
+
+class GcmStreamReader:
+    # Reading side of GcmStreamWriter; chunks are opened in order as data is needed,
+    # a stream cut off before its last chunk raises ConnectionError
+    def __init__(self, sock, key: bytes, base_nonce: bytes, compressed: bool = False):
+        self.sock = sock
+        self.aesgcm = AESGCM(key)
+        self.base_nonce = base_nonce
+        self.compressed = compressed
+        self.buffer = b''
+        self.position = 0
+        self.index = 0
+        self.finished = False
+        self.wire_bytes = 0
+        self.stats = current()
+
+    def _next_chunk(self):
+        if self.finished:
+            return False
+        started = time.perf_counter()
+        sealed_length, is_last = struct.unpack('!IB', recv_exact(self.sock, 5))
+        if sealed_length > CHUNK_SIZE + 1 + TAG_SIZE:
+            raise ValueError("Parça çok büyük")
+        sealed = recv_exact(self.sock, sealed_length)
+        self.stats.add("socket_recv", time.perf_counter() - started, 5 + sealed_length)
+        self.buffer = _open_chunk(self.aesgcm, chunk_nonce(self.base_nonce, self.index), sealed, chunk_aad(self.index, bool(is_last)), self.compressed, None,
+                                  self.stats)
+        self.position = 0
+        self.index += 1
+        self.finished = bool(is_last)
+        self.wire_bytes += 5 + sealed_length
+        return True
+
+    def read(self, size: int):
+        # Returns size bytes, fewer only at the end of the stream
+        parts = []
+        while size:
+            if self.position == len(self.buffer):
+                if not self._next_chunk():
+                    break
+                continue
+            part = self.buffer[self.position:self.position + size]
+            self.position += len(part)
+            size -= len(part)
+            parts.append(part)
+        return b''.join(parts)
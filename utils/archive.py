@@ -0,0 +1,215 @@
+import os
+import stat
+import struct
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.progress import Progress
+from utils.storage import temp_file
+from utils.stats import current
+
+ENTRY_DIRECTORY = b'D'
+ENTRY_FILE = b'F'
+ENTRY_END = b'E'
+ENTRY_HEADER = struct.Struct('!cHIqQ')  # Type, path length, mode, mtime (ns), size
+COPY_PIECE_SIZE = 1024 * 1024
+PACK_THRESHOLD = 64 * 1024  # Files up to this size are read ahead, packed together and written in batches
+READ_AHEAD = 256            # Small files read ahead of the network
+WRITE_BATCH_FILES = 256     # Small files handed to a writer thread at once
+WRITE_BATCH_BYTES = 4 * 1024 * 1024
+
+def walk_tree(root: str):
+    # Every directory and regular file below root as (relative path with '/', source path, stat result);
+    # directories come before their contents, symbolic links are skipped
+    entries = []
+    pending = ['']
+    while pending:
+        relative = pending.pop()
+        with os.scandir(os.path.join(root, relative) if relative else root) as scan:
+            children = sorted(scan, key=lambda entry: entry.name)
+        for child in children:
+            if child.is_symlink():
+                continue
+            child_path = f"{relative}/{child.name}" if relative else child.name
+            if child.is_dir():
+                entries.append((child_path, child.path, child.stat()))
+                pending.append(child_path)
+            elif child.is_file():
+                entries.append((child_path, child.path, child.stat()))
+    return entries
+
+def tree_size(entries: list):
+    return sum(info.st_size for _, _, info in entries if stat.S_ISREG(info.st_mode))
+
+def _read_file(path: str, stats):
+    started = time.perf_counter()
+    with open(path, 'rb') as file:
+        data = file.read()
+    stats.add("disk_read", time.perf_counter() - started, len(data))
+    return data
+
+def _is_small(info):
+    return stat.S_ISREG(info.st_mode) and info.st_size <= PACK_THRESHOLD
+
+def write_archive(out, entries: list, workers: int = 1):
+    # Streams entry frames (header, path, file data) into out; small files are read ahead on a
+    # thread pool and packed back to back into the sealed chunks of out, large files are copied
+    # through in pieces
+    files = 0
+    bytes_done = 0
+    progress = Progress(tree_size(entries), len(entries), "kayıt")
+    stats = current()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reads = deque()  # (entry index, future) of small files read ahead
+        next_read = 0
+
+        for count, (path, source, info) in enumerate(entries, 1):
+            path_bytes = path.encode('utf-8')
+            if stat.S_ISDIR(info.st_mode):
+                out.write(ENTRY_HEADER.pack(ENTRY_DIRECTORY, len(path_bytes), stat.S_IMODE(info.st_mode), info.st_mtime_ns, 0) + path_bytes)
+            elif _is_small(info):
+                while next_read < len(entries) and next_read < count + READ_AHEAD:
+                    if _is_small(entries[next_read][2]):
+                        reads.append(pool.submit(_read_file, entries[next_read][1], stats))
+                    next_read += 1
+                # Size comes from the data read, a file that changed since the walk stays consistent
+                data = reads.popleft().result()
+                out.write(ENTRY_HEADER.pack(ENTRY_FILE, len(path_bytes), stat.S_IMODE(info.st_mode), info.st_mtime_ns, len(data)) + path_bytes + data)
+                files += 1
+                bytes_done += len(data)
+            else:
+                with open(source, 'rb') as file:
+                    size = os.fstat(file.fileno()).st_size
+                    out.write(ENTRY_HEADER.pack(ENTRY_FILE, len(path_bytes), stat.S_IMODE(info.st_mode), info.st_mtime_ns, size) + path_bytes)
+                    remaining = size
+                    while remaining:
+                        started = time.perf_counter()
+                        data = file.read(min(COPY_PIECE_SIZE, remaining))
+                        if not data:
+                            raise ValueError(f"Dosya okunurken kısaldı: {path}")
+                        stats.add("disk_read", time.perf_counter() - started, len(data))
+                        out.write(data)
+                        remaining -= len(data)
+                        bytes_done += len(data)
+                        progress.update(bytes_done, count - 1)
+                files += 1
+            progress.update(bytes_done, count)
+    out.write(ENTRY_HEADER.pack(ENTRY_END, 0, 0, 0, 0))
+    progress.finish()
+    return files
+
+def safe_path(root: str, path: str):
+    # Entry paths are relative with '/' separators; anything that could leave root is rejected
+    parts = path.split('/')
+    for part in parts:
+        if part in ('', '.', '..') or '\\' in part or ':' in part or '\0' in part:
+            raise ValueError(f"Geçersiz dosya yolu: {path}")
+    return os.path.join(root, *parts)
+
+def safe_name(name: str):
+    # File names of single files come from the peer too: exactly one path component
+    if '/' in name:
+        raise ValueError(f"Geçersiz dosya adı: {name}")
+    safe_path('', name)
+    return name
+
+def _read_exact(stream, size: int):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Arşiv akışı beklenmedik şekilde bitti")
+    return data
+
+def _write_file(path: str, data: bytes, mode: int, mtime_ns: int):
+    with open(path, 'wb') as file:
+        file.write(data)
+    os.chmod(path, mode)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def _write_batch(batch: list, stats):
+    started = time.perf_counter()
+    for entry in batch:
+        _write_file(*entry)
+    stats.add("disk_write", time.perf_counter() - started, sum(len(entry[1]) for entry in batch))
+
+def extract_archive(stream, root: str, workers: int = 1, expected_bytes: int = None):
+    # Recreates the tree below root from entry frames read from stream, returns (file count, file bytes);
+    # small files are collected into batches that writer threads create while the stream is read on;
+    # expected_bytes (optional) is the total file size announced by the sender, for progress only
+    os.makedirs(root, exist_ok=True)
+    directories = []
+    files = 0
+    total_bytes = 0
+    entries = 0
+    progress = Progress(expected_bytes, unit="kayıt")
+    stats = current()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        writes = deque()
+        batch = []
+        batch_bytes = 0
+
+        def flush_batch():
+            nonlocal batch, batch_bytes
+            if batch:
+                writes.append(pool.submit(_write_batch, batch, stats))
+                batch = []
+                batch_bytes = 0
+            # Bounds the received data held in memory, also raises errors of finished writes
+            while len(writes) > workers * 2 or (writes and writes[0].done()):
+                writes.popleft().result()
+
+        while True:
+            kind, path_length, mode, mtime_ns, size = ENTRY_HEADER.unpack(_read_exact(stream, ENTRY_HEADER.size))
+            if kind == ENTRY_END:
+                break
+            path = safe_path(root, _read_exact(stream, path_length).decode('utf-8'))
+
+            if kind == ENTRY_DIRECTORY:
+                # Created right away, later batches may contain its files
+                os.makedirs(path, exist_ok=True)
+                directories.append((path, mode, mtime_ns))
+            elif kind == ENTRY_FILE and size <= PACK_THRESHOLD:
+                batch.append((path, _read_exact(stream, size), mode, mtime_ns))
+                batch_bytes += size
+                if len(batch) >= WRITE_BATCH_FILES or batch_bytes >= WRITE_BATCH_BYTES:
+                    flush_batch()
+                files += 1
+                total_bytes += size
+            elif kind == ENTRY_FILE:
+                # Streamed into a temporary file next to path that replaces it only once the whole entry
+                # has been read, a cut stream or a failed tag never leaves a truncated copy behind
+                temp_fd, temp_path = temp_file(path)
+                try:
+                    with os.fdopen(temp_fd, 'wb') as file:
+                        remaining = size
+                        while remaining:
+                            data = _read_exact(stream, min(COPY_PIECE_SIZE, remaining))
+                            started = time.perf_counter()
+                            file.write(data)
+                            stats.add("disk_write", time.perf_counter() - started, len(data))
+                            remaining -= len(data)
+                            progress.update(total_bytes + size - remaining, entries)
+                    os.chmod(temp_path, mode)
+                    os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+                    os.replace(temp_path, path)
+                except Exception:
+                    os.remove(temp_path)
+                    raise
+                files += 1
+                total_bytes += size
+            else:
+                raise ValueError("Geçersiz arşiv kaydı")
+
+            entries += 1
+            progress.update(total_bytes, entries)
+
+        flush_batch()
+        while writes:
+            writes.popleft().result()
+    progress.finish()
+
+    # Directory times last, creating their contents changed them
+    for path, mode, mtime_ns in reversed(directories):
+        os.chmod(path, mode)
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return files, total_bytes
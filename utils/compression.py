@@ -0,0 +1,64 @@
+import zlib
+import lzma
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODECS = {"zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+
+ZLIB_LEVEL = 1           # Fast levels keep compression from becoming the bottleneck of the transfer
+LZMA_PRESET = 1
+SAMPLE_SIZE = 16 * 1024  # Trial-compressed part of every chunk
+SKIP_RATIO = 0.9         # Chunks whose sample does not shrink by 10% are sent as they are
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+def compress_chunk(data, codec: int):
+    # Returns codec byte + payload; the codec is chosen per chunk, already compressed
+    # (high entropy) data is detected with a cheap trial on a sample and stored raw
+    middle = max(0, len(data) // 2 - SAMPLE_SIZE // 2)
+    sample = bytes(data[middle:middle + SAMPLE_SIZE])
+    if sample and len(zlib.compress(sample, 1)) < len(sample) * SKIP_RATIO:
+        if codec == CODEC_LZMA:
+            payload = lzma.compress(data, preset=LZMA_PRESET)
+        else:
+            payload = zlib.compress(data, ZLIB_LEVEL)
+        if len(payload) < len(data):
+            return bytes([codec]) + payload
+    return bytes([CODEC_RAW]) + bytes(data)
+
+def decompress_chunk(frame, max_length: int):
+    # Never produces more than max_length bytes, a damaged frame cannot exhaust memory
+    codec = frame[0]
+    payload = bytes(memoryview(frame)[1:])
+    if codec == CODEC_RAW:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj().decompress(payload, max_length)
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor().decompress(payload, max_length)
+    raise ValueError("Bilinmeyen sıkıştırma biçimi")
+
+def compress_stream(data, codec: int, workers: int):
+    # Whole data compressed chunk by chunk on worker threads, every frame is length prefixed
+    chunks = [data[start:start + STREAM_CHUNK_SIZE] for start in range(0, len(data), STREAM_CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = pool.map(compress_chunk, chunks, [codec] * len(chunks))
+        return b''.join(struct.pack('!I', len(frame)) + frame for frame in frames)
+
+class StreamDecompressor:
+    # Takes a compress_stream stream in pieces of any size, returns the decompressed data of complete frames
+    def __init__(self):
+        self.pending = bytearray()
+
+    def feed(self, data):
+        self.pending += data
+        output = []
+        while len(self.pending) >= 4:
+            frame_length = struct.unpack('!I', self.pending[:4])[0]
+            if len(self.pending) < 4 + frame_length:
+                break
+            output.append(decompress_chunk(self.pending[4:4 + frame_length], STREAM_CHUNK_SIZE))
+            del self.pending[:4 + frame_length]
+        return b''.join(output)
@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import struct
+import threading
+from bisect import bisect_left
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Optional: gear hashes are computed with a pure Python rolling loop instead
+
+CDC_MIN_SIZE = 16 * 1024   # Content-defined chunks are 16KB - 256KB, normalized around 64KB
+CDC_AVG_SIZE = 64 * 1024
+CDC_MAX_SIZE = 256 * 1024
+CDC_SEGMENT_SIZE = 8 * 1024 * 1024
+MASK_S = (1 << 16) - 1     # FastCDC normalized chunking: harder cut condition below the average size,
+MASK_L = (1 << 12) - 1     # easier one above it, so chunk sizes gather around the average
+DIGEST_SIZE = 32
+
+# Gear table: one fixed pseudo-random 16-bit value per byte value, the same on every machine
+GEAR = [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:2], 'big') for value in range(256)]
+
+def _gear_hashes(buffer):
+    # 16-bit FastCDC gear hash at every offset: h = (h << 1) + GEAR[byte], so only the last 16 bytes
+    # count; vectorized as sum of GEAR[byte] << age, built in 4 doubling steps with uint16 wrap around
+    if numpy is not None:
+        hashes = numpy.array(GEAR, dtype=numpy.uint16)[numpy.frombuffer(buffer, dtype=numpy.uint8)]
+        shifted = numpy.empty_like(hashes)
+        for width in (1, 2, 4, 8):
+            numpy.left_shift(hashes[:-width], width, out=shifted[width:])
+            hashes[width:] += shifted[width:]
+        return hashes
+
+    hashes = []
+    gear_hash = 0
+    for value in buffer:
+        gear_hash = ((gear_hash << 1) + GEAR[value]) & 0xffff
+        hashes.append(gear_hash)
+    return hashes
+
+def _cut_candidates(buffer):
+    # Offsets after which a chunk may end, for the strict and for the relaxed mask
+    hashes = _gear_hashes(buffer)
+    if numpy is not None:
+        strict = numpy.flatnonzero((hashes & MASK_S) == 0).tolist()
+        relaxed = numpy.flatnonzero((hashes & MASK_L) == 0).tolist()
+        return strict, relaxed
+    strict = [offset for offset, value in enumerate(hashes) if not value & MASK_S]
+    relaxed = [offset for offset, value in enumerate(hashes) if not value & MASK_L]
+    return strict, relaxed
+
+def _next_cut(start: int, end: int, strict: list, relaxed: list):
+    # End of the chunk that starts at start, the buffer holds data up to end
+    if end - start <= CDC_MIN_SIZE:
+        return end
+    for candidates, lowest, highest in ((strict, CDC_MIN_SIZE, CDC_AVG_SIZE), (relaxed, CDC_AVG_SIZE, CDC_MAX_SIZE)):
+        position = bisect_left(candidates, start + lowest - 1)
+        if position < len(candidates) and candidates[position] < min(start + highest - 1, end):
+            return candidates[position] + 1
+    return min(start + CDC_MAX_SIZE, end)
+
+def file_chunks(file, filesize: int):
+    # Content-defined chunks of filesize bytes of file: list of (offset, length, sha256 digest)
+    chunks = []
+    buffer = b''
+    buffer_offset = 0  # File offset of buffer[0]
+    bytes_read = 0
+
+    while True:
+        data = file.read(min(CDC_SEGMENT_SIZE, filesize - bytes_read))
+        bytes_read += len(data)
+        at_end = not data or bytes_read >= filesize
+        buffer += data
+
+        strict, relaxed = _cut_candidates(buffer)
+        view = memoryview(buffer)
+        start = 0
+        # Without more data a chunk is only cut once a full maximum size chunk fits in the buffer
+        while start < len(buffer) and (at_end or len(buffer) - start >= CDC_MAX_SIZE):
+            end = _next_cut(start, len(buffer), strict, relaxed)
+            chunks.append((buffer_offset + start, end - start, hashlib.sha256(view[start:end]).digest()))
+            start = end
+        view.release()
+
+        if at_end:
+            return chunks
+        buffer = buffer[start:]
+        buffer_offset += start
+
+def pack_chunk_digests(chunks: list):
+    return struct.pack('!I', len(chunks)) + b''.join(digest + struct.pack('!I', length) for _, length, digest in chunks)
+
+def parse_chunk_digests(data: bytes):
+    # Returns [(digest, length)] from pack_chunk_digests
+    count = struct.unpack('!I', data[:4])[0]
+    entry_size = DIGEST_SIZE + 4
+    chunks = []
+    for index in range(count):
+        entry = data[4 + index * entry_size:4 + (index + 1) * entry_size]
+        chunks.append((bytes(entry[:DIGEST_SIZE]), struct.unpack('!I', entry[DIGEST_SIZE:])[0]))
+    return chunks
+
+class ChunkReader:
+    # File-like view of selected chunks of a file, read back to back
+    def __init__(self, file, base_offset: int, chunks: list):
+        self.file = file
+        self.base_offset = base_offset
+        self.chunks = chunks
+        self.chunk_index = 0
+        self.chunk_position = 0
+
+    def readinto(self, buffer):
+        # Fills buffer completely unless the chunks run out
+        view = memoryview(buffer)
+        filled = 0
+        while filled < len(view) and self.chunk_index < len(self.chunks):
+            offset, length, _ = self.chunks[self.chunk_index]
+            size = min(length - self.chunk_position, len(view) - filled)
+            self.file.seek(self.base_offset + offset + self.chunk_position)
+            read = self.file.readinto(view[filled:filled + size])
+            if not read:
+                break
+            filled += read
+            self.chunk_position += read
+            if self.chunk_position == length:
+                self.chunk_index += 1
+                self.chunk_position = 0
+        return filled
+
+    def read(self, size: int):
+        buffer = bytearray(size)
+        return bytes(buffer[:self.readinto(buffer)])
+
+class ChunkSink:
+    # File-like writer that splits received data into the expected chunks, verifies every chunk
+    # against its SHA-256 digest and passes it on; failed is set if any chunk did not match
+    def __init__(self, chunks: list, on_chunk):
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+        self.chunk_index = 0
+        self.pending = bytearray()
+        self.failed = False
+
+    def write(self, data):
+        self.pending += data
+        while self.chunk_index < len(self.chunks) and len(self.pending) >= self.chunks[self.chunk_index][1]:
+            digest, length = self.chunks[self.chunk_index]
+            chunk = bytes(self.pending[:length])
+            del self.pending[:length]
+            self.chunk_index += 1
+            if hashlib.sha256(chunk).digest() != digest:
+                self.failed = True
+                continue
+            self.on_chunk(digest, chunk)
+        return len(data)
+
+class ChunkStore:
+    # Content-addressed chunk store: chunk data is appended to chunks.pack and
+    # chunks.index (JSON lines) maps every SHA-256 digest to its place in the pack;
+    # shared by all receive sessions
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.pack_path = os.path.join(path, "chunks.pack")
+        self.index_path = os.path.join(path, "chunks.index")
+        self.lock = threading.Lock()
+        self.index = {}
+
+        pack_size = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index:
+                for line in index:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Partial last line of an interrupted write
+                    if entry["offset"] + entry["length"] <= pack_size:
+                        self.index[bytes.fromhex(entry["sha256"])] = (entry["offset"], entry["length"])
+
+        self.pack = open(self.pack_path, 'a+b')
+        self.index_file = open(self.index_path, 'a')
+
+    def __contains__(self, digest: bytes):
+        return digest in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def add(self, digest: bytes, data: bytes):
+        with self.lock:
+            if digest in self.index:
+                return
+            # Chunk data is flushed before its index entry, an entry never points at missing data
+            offset = self.pack.seek(0, 2)
+            self.pack.write(data)
+            self.pack.flush()
+            self.index_file.write(json.dumps({"sha256": digest.hex(), "offset": offset, "length": len(data)}) + "\n")
+            self.index_file.flush()
+            self.index[digest] = (offset, len(data))
+
+    def read(self, digest: bytes):
+        offset, length = self.index[digest]
+        with self.lock:
+            self.pack.seek(offset)
+            return self.pack.read(length)
@@ -0,0 +1,285 @@
+import hashlib
+import struct
+from itertools import accumulate
+from math import isqrt
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Optional: weak checksums are computed with a pure Python rolling loop instead
+
+DELTA_SEGMENT_SIZE = 4 * 1024 * 1024  # Source file is matched 4MB at a time
+COPY_PIECE_SIZE = 1024 * 1024         # Literal and copied data is moved 1MB at a time
+WEAK_FILTER_MASK = (1 << 24) - 1      # 16MB lookup table that rejects most weak checksums at once
+ROLLING_SCAN_BUDGET = 1024 * 1024     # Without numpy: unmatched bytes searched byte by byte before the rest is sent as literal data
+STRONG_SIZE = 16
+
+OP_LITERAL = b'L'  # Length + data that is not in the receiver's copy
+OP_COPY = b'C'     # First block index + block count from the receiver's copy
+OP_END = b'E'      # SHA-256 of the whole source file
+
+def delta_block_size(filesize: int):
+    # About sqrt(filesize) as in rsync, a power of two between 2KB and 128KB
+    return 1 << max(11, min(17, isqrt(filesize).bit_length()))
+
+def _strong(block):
+    return hashlib.blake2b(block, digest_size=STRONG_SIZE).digest()
+
+def _block_weaks(data, block_size: int):
+    # rsync weak checksum of every full block: a = sum of bytes, b = sum of (block_size - i) * byte,
+    # both mod 2^16, packed as a | b << 16
+    count = len(data) // block_size
+    if numpy is not None:
+        blocks = numpy.frombuffer(data, dtype=numpy.uint8, count=count * block_size).reshape(count, block_size)
+        a = blocks.sum(axis=1, dtype=numpy.uint32)
+        b = (blocks * numpy.arange(block_size, 0, -1, dtype=numpy.uint32)).sum(axis=1, dtype=numpy.uint32)  # Wraps, low 16 bits stay exact
+        return ((a & 0xffff) | ((b & 0xffff) << 16)).tolist()
+
+    weaks = []
+    for start in range(0, count * block_size, block_size):
+        block = data[start:start + block_size]
+        weaks.append((sum(block) & 0xffff) | ((sum(accumulate(block)) & 0xffff) << 16))
+    return weaks
+
+def _rolling_weaks(buffer, block_size: int):
+    # Weak checksum at every offset of the buffer at once (numpy only): a(k) and b(k) come from
+    # prefix sums of the bytes and of position * byte; uint32 wraps around, only the low 16 bits count
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    sums = numpy.zeros(len(data) + 1, dtype=numpy.uint32)
+    numpy.cumsum(data, dtype=numpy.uint32, out=sums[1:])
+    weighted = numpy.zeros(len(data) + 1, dtype=numpy.uint32)
+    numpy.cumsum(data * numpy.arange(len(data), dtype=numpy.uint32), dtype=numpy.uint32, out=weighted[1:])
+
+    a = sums[block_size:] - sums[:-block_size]
+    b = numpy.arange(block_size, len(sums), dtype=numpy.uint32) * a - (weighted[block_size:] - weighted[:-block_size])
+    return (a & 0xffff) | ((b & 0xffff) << 16)
+
+def file_signature(path: str):
+    # Block size, then weak checksum and strong hash of every full block of the receiver's copy;
+    # a shorter last block is never matched and simply arrives as literal data
+    with open(path, 'rb') as file:
+        filesize = file.seek(0, 2)
+        file.seek(0)
+        block_size = delta_block_size(filesize)
+        blocks_per_read = max(1, DELTA_SEGMENT_SIZE // block_size)
+        entries = []
+
+        while True:
+            data = file.read(block_size * blocks_per_read)
+            weaks = _block_weaks(data, block_size)
+            for index, weak in enumerate(weaks):
+                entries.append(struct.pack('!I', weak) + _strong(memoryview(data)[index * block_size:(index + 1) * block_size]))
+            if len(data) < block_size * blocks_per_read:
+                break
+
+    return struct.pack('!II', block_size, len(entries)) + b''.join(entries)
+
+def parse_signature(signature: bytes):
+    # Returns block size, {weak: {strong: block index}} and the strong hash of every block
+    block_size, count = struct.unpack('!II', signature[:8])
+    weak_table = {}
+    strongs = []
+    entry_size = 4 + STRONG_SIZE
+    for index in range(count):
+        entry = signature[8 + index * entry_size:8 + (index + 1) * entry_size]
+        weak = struct.unpack('!I', entry[:4])[0]
+        strong = entry[4:]
+        weak_table.setdefault(weak, {}).setdefault(strong, index)
+        strongs.append(strong)
+    return block_size, weak_table, strongs
+
+class _DeltaWriter:
+    # Writes delta commands, consecutive block references become one copy command
+    def __init__(self, out, block_size: int):
+        self.out = out
+        self.block_size = block_size
+        self.copy_start = 0
+        self.copy_count = 0
+        self.literal_bytes = 0
+        self.copied_bytes = 0
+
+    def literal(self, data):
+        if not len(data):
+            return
+        self._flush_copy()
+        self.out.write(OP_LITERAL + struct.pack('!I', len(data)))
+        self.out.write(data)
+        self.literal_bytes += len(data)
+
+    def copy(self, index: int):
+        self.copied_bytes += self.block_size
+        if self.copy_count and index == self.copy_start + self.copy_count:
+            self.copy_count += 1
+            return
+        self._flush_copy()
+        self.copy_start = index
+        self.copy_count = 1
+
+    def end(self, digest: bytes):
+        self._flush_copy()
+        self.out.write(OP_END + digest)
+
+    def _flush_copy(self):
+        if self.copy_count:
+            self.out.write(OP_COPY + struct.pack('!QI', self.copy_start, self.copy_count))
+            self.copy_count = 0
+
+class _BufferSearch:
+    # Finds the next offset in a buffer whose block is also in the receiver's copy
+    def __init__(self, buffer, block_size: int, weak_table: dict, weak_filter):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.block_size = block_size
+        self.weak_table = weak_table
+        self.weak_filter = weak_filter  # Weak checksums present in the signature (numpy only)
+
+    def next_match(self, start: int, limit: int):
+        # Returns (offset, block index) of the first match in start..limit, or None
+        if self.weak_filter is not None:
+            return self._next_match_vectorized(start, limit)
+        return self._next_match_rolling(start, limit)
+
+    def _check(self, offset: int, weak: int):
+        blocks = self.weak_table.get(weak)
+        if blocks:
+            return blocks.get(_strong(self.view[offset:offset + self.block_size]))
+        return None
+
+    def _next_match_vectorized(self, start: int, limit: int):
+        # Scan windows that double in size: a single changed block costs a small window,
+        # long unmatched runs are covered by few large vectorized steps
+        window = 4 * self.block_size
+        while start <= limit:
+            end = min(limit, start + window - 1)
+            weaks = _rolling_weaks(self.view[start:end + self.block_size], self.block_size)
+            for offset in numpy.flatnonzero(self.weak_filter[weaks & WEAK_FILTER_MASK]).tolist():
+                index = self._check(start + offset, int(weaks[offset]))
+                if index is not None:
+                    return start + offset, index
+            start = end + 1
+            window *= 2
+        return None
+
+    def _next_match_rolling(self, start: int, limit: int):
+        buffer = self.buffer
+        block_size = self.block_size
+        weak_table = self.weak_table
+        block = buffer[start:start + block_size]
+        a = sum(block) & 0xffff
+        b = sum(accumulate(block)) & 0xffff
+        offset = start
+
+        while True:
+            weak = a | (b << 16)
+            if weak in weak_table:
+                index = self._check(offset, weak)
+                if index is not None:
+                    return offset, index
+            if offset >= limit:
+                return None
+
+            # Roll the window one byte forward
+            removed = buffer[offset]
+            a = (a - removed + buffer[offset + block_size]) & 0xffff
+            b = (b - block_size * removed + a) & 0xffff
+            offset += 1
+
+def write_delta(file, filesize: int, signature: tuple, out):
+    # Writes literal data and block references that rebuild filesize bytes of file
+    # from the receiver's copy; returns (literal bytes, copied bytes)
+    block_size, weak_table, strongs = signature
+    writer = _DeltaWriter(out, block_size)
+    file_hash = hashlib.sha256()
+
+    weak_filter = None
+    if numpy is not None:
+        weak_filter = numpy.zeros(WEAK_FILTER_MASK + 1, dtype=bool)
+        weak_filter[numpy.fromiter(weak_table, dtype=numpy.int64, count=len(weak_table)) & WEAK_FILTER_MASK] = True
+
+    # The pure Python search runs at a few MB/s, slower than sending the data: it goes on only while it
+    # pays off (ROLLING_SCAN_BUDGET unmatched bytes plus a quarter of the copied bytes), then the rest of
+    # the file is sent as literal data, so an unrelated file costs little more than a whole-file send
+    searching = True
+    scanned = 0
+    
+    buffer = b''
+    bytes_read = 0
+    expected = 0  # Block that most likely comes next: the one after the last match
+
+    while True:
+        data = file.read(min(DELTA_SEGMENT_SIZE, filesize - bytes_read))
+        bytes_read += len(data)
+        file_hash.update(data)
+        at_end = not data or bytes_read >= filesize
+
+        buffer += data
+        view = memoryview(buffer)
+        search = _BufferSearch(buffer, block_size, weak_table, weak_filter)
+        limit = len(buffer) - block_size  # Last offset with a full block in the buffer
+        position = 0
+        literal_start = 0
+
+        while position <= limit:
+            # Fast path: unchanged data continues with the next block, one hash and no rolling
+            if expected < len(strongs) and _strong(view[position:position + block_size]) == strongs[expected]:
+                match = position, expected
+            elif not searching:
+                position = limit + 1
+                break
+            else:
+                search_limit = limit
+                if weak_filter is None:
+                    search_limit = min(limit, position + ROLLING_SCAN_BUDGET + writer.copied_bytes // 4 - scanned)
+                match = search.next_match(position, search_limit)
+                if weak_filter is None:
+                    scanned += (match[0] if match is not None else search_limit + 1) - position
+                    searching = match is not None or search_limit == limit
+                if match is None:
+                    position = search_limit + 1
+                    continue
+
+            offset, index = match
+            writer.literal(view[literal_start:offset])
+            writer.copy(index)
+            expected = index + 1
+            position = offset + block_size
+            literal_start = position
+
+        if at_end:
+            writer.literal(view[literal_start:])
+            break
+
+        # Unmatched bytes before position are literal; the rest is carried into the next segment
+        writer.literal(view[literal_start:position])
+        view.release()
+        buffer = buffer[position:]
+
+    writer.end(file_hash.digest())
+    return writer.literal_bytes, writer.copied_bytes
+
+def _copy_exact(source, out, length: int, file_hash):
+    while length:
+        data = source.read(min(COPY_PIECE_SIZE, length))
+        if not data:
+            raise ValueError("Delta verisi eksik")
+        out.write(data)
+        file_hash.update(data)
+        length -= len(data)
+
+def apply_delta(delta, base, out, block_size: int):
+    # Rebuilds the source file into out from delta commands and the receiver's copy,
+    # returns the SHA-256 of the rebuilt file and the one sent by the sender
+    file_hash = hashlib.sha256()
+    while True:
+        op = delta.read(1)
+        if op == OP_LITERAL:
+            length = struct.unpack('!I', delta.read(4))[0]
+            _copy_exact(delta, out, length, file_hash)
+        elif op == OP_COPY:
+            start, count = struct.unpack('!QI', delta.read(12))
+            base.seek(start * block_size)
+            _copy_exact(base, out, count * block_size, file_hash)
+        elif op == OP_END:
+            return file_hash.hexdigest(), delta.read(32).hex()
+        else:
+            raise ValueError("Geçersiz delta komutu")
@@ -0,0 +1,20 @@
+class TransferError(Exception):
+    # Base class of transfer failures; network failures are raised as OSError (ConnectionError, timeout)
+    pass
+
+class SourceError(TransferError):
+    # File or directory to send (or the receive folder) is missing or unreadable
+    pass
+
+class AuthenticationError(TransferError):
+    pass
+
+class ProtocolError(TransferError, ValueError):
+    # Malformed or unexpected message from the peer
+    pass
+
+class VerificationError(TransferError):
+    # Data arrived but failed verification; result (if known) is the TransferResult of the attempt
+    def __init__(self, message: str, result=None):
+        super().__init__(message)
+        self.result = result
@@ -0,0 +1,169 @@
+import struct
+from utils.aead import recv_exact
+from utils.errors import ProtocolError
+
+# Every control message is one frame: version, frame type and payload length, then the payload.
+# TCP reads frames with exact reads, UDP sends one frame per datagram
+PROTOCOL_VERSION = 4  # 2: single hello instead of separate auth, key and IV messages, 3: TCP file results, 4: Merkle tree checksums
+FRAME_HEADER = struct.Struct('!BBI')
+MAX_PAYLOAD_SIZE = 1 << 30  # Chunk lists, signatures and results of large files, only read after authentication
+
+FRAME_CONNECT = 1
+FRAME_PUBLIC_KEY = 2
+FRAME_HELLO = 3             # Credentials and key material (UDP: followed by the file info)
+FRAME_AUTH_RESULT = 4       # The server's only answer to the hello
+FRAME_FILE_INFO = 5
+FRAME_END = 6               # End of a TCP session
+FRAME_SIGNATURE = 7         # Sealed delta signature, empty if the receiver has no copy
+FRAME_DELTA = 8             # Size of the delta stream that follows
+FRAME_CHUNK_DIGESTS = 9     # Sealed content-defined chunk list
+FRAME_CHUNK_LIST = 10       # Indices of missing chunks
+FRAME_DATA = 11             # UDP: packet number + encrypted data
+FRAME_PACKET_ACK = 12       # UDP: packet number
+FRAME_RESEND = 13           # UDP: packet number
+FRAME_FILE_RESULT = 14      # Receiver's verification result of one file (TCP: of every file, range or entry stream)
+FRAME_REPAIR = 15           # TCP: index of an earlier file in the session, its damaged chunks follow
+
+# Largest payload per frame type; the payload buffer is allocated from the header, so frames that
+# can arrive before authentication (public key, hello) stay at a few KiB
+FRAME_LIMITS = {
+    FRAME_CONNECT: 0,
+    FRAME_PUBLIC_KEY: 16 * 1024,
+    FRAME_HELLO: 16 * 1024,
+    FRAME_AUTH_RESULT: 1,
+    FRAME_FILE_INFO: 64 * 1024,
+    FRAME_END: 0,
+    FRAME_SIGNATURE: MAX_PAYLOAD_SIZE,
+    FRAME_DELTA: 8,
+    FRAME_CHUNK_DIGESTS: MAX_PAYLOAD_SIZE,
+    FRAME_CHUNK_LIST: MAX_PAYLOAD_SIZE,
+    FRAME_DATA: 65507,
+    FRAME_PACKET_ACK: 4,
+    FRAME_RESEND: 4,
+    FRAME_FILE_RESULT: MAX_PAYLOAD_SIZE,
+    FRAME_REPAIR: 4,
+}
+
+RESULT_OK = b'\x01'
+RESULT_FAILED = b'\x00'
+RESULT_REPAIR = b'\x02'  # Followed by the indices of the damaged chunks, the file is answered again once they are received
+
+# File info flags
+FLAG_DELTA = 1
+FLAG_DEDUP = 2
+FLAG_TREE = 4   # Directory tree as entry stream
+FLAG_PACK = 8   # Packed small files as entry stream
+
+TCP_FILE_INFO = struct.Struct('!QQQIHB')  # Length, offset, total size, fragment, streams, flags
+UDP_FILE_INFO = struct.Struct('!QIqB')    # File size, fragment, stream size (-1: not compressed), flags
+UDP_DATA_SIZE = 65507 - FRAME_HEADER.size - 4  # Max UDP payload minus frame header and packet number
+
+def pack_frame(frame_type: int, payload: bytes = b''):
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, frame_type, len(payload)) + payload
+
+def _check_header(version: int, frame_type: int, length: int):
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Desteklenmeyen protokol sürümü: {version}")
+    if frame_type not in FRAME_LIMITS:
+        raise ProtocolError(f"Bilinmeyen çerçeve: {frame_type}")
+    if length > FRAME_LIMITS[frame_type]:
+        raise ProtocolError("Çerçeve çok büyük")
+
+def _recv_header(sock):
+    # Returns (frame type, payload length) of a checked header, before any payload is read
+    version, frame_type, length = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    _check_header(version, frame_type, length)
+    return frame_type, length
+
+def send_frame(sock, frame_type: int, payload: bytes = b''):
+    sock.sendall(pack_frame(frame_type, payload))
+
+def recv_frame(sock):
+    # Returns (frame type, payload); exact reads, TCP segmentation does not matter
+    frame_type, length = _recv_header(sock)
+    return frame_type, bytes(recv_exact(sock, length))
+
+def expect_frame(sock, frame_type: int):
+    # Payload of the next frame, which must be of frame_type; the type is checked before the payload is read
+    received_type, length = _recv_header(sock)
+    if received_type != frame_type:
+        raise ProtocolError(f"Beklenmeyen çerçeve: {received_type} (beklenen {frame_type})")
+    return bytes(recv_exact(sock, length))
+
+def parse_datagram(data: bytes):
+    # Returns (frame type, payload) of one UDP datagram
+    if len(data) < FRAME_HEADER.size:
+        raise ProtocolError("Çerçeve eksik")
+    version, frame_type, length = FRAME_HEADER.unpack_from(data)
+    _check_header(version, frame_type, length)
+    if len(data) != FRAME_HEADER.size + length:
+        raise ProtocolError("Çerçeve boyutu hatalı")
+    return frame_type, data[FRAME_HEADER.size:]
+
+def expect_datagram(data: bytes, frame_type: int):
+    received_type, payload = parse_datagram(data)
+    if received_type != frame_type:
+        raise ProtocolError(f"Beklenmeyen çerçeve: {received_type} (beklenen {frame_type})")
+    return payload
+
+def pack_file_result(status: bytes, damaged: list = ()):
+    return status + struct.pack(f'!{len(damaged)}I', *damaged)
+
+def unpack_file_result(payload: bytes):
+    # Returns (status, damaged chunk indices)
+    status = payload[:1]
+    if status not in (RESULT_OK, RESULT_FAILED, RESULT_REPAIR) or (len(payload) - 1) % 4 or (status == RESULT_REPAIR) != (len(payload) > 1):
+        raise ProtocolError("Dosya sonucu hatalı")
+    return status, list(struct.unpack_from(f'!{(len(payload) - 1) // 4}I', payload, 1))
+
+def pack_hello(hello: bytes, file_info: bytes = b''):
+    # UDP hello: the client hello with a 2-byte length prefix, then the file info in the same datagram
+    return struct.pack('!H', len(hello)) + hello + file_info
+
+def unpack_hello(payload: bytes):
+    # Returns (client hello, file info)
+    length = struct.unpack_from('!H', payload)[0]
+    if 2 + length > len(payload):
+        raise ProtocolError("Çerçeve eksik")
+    return payload[2:2 + length], payload[2 + length:]
+
+def _pack_strings(*values: str):
+    # Strings are UTF-8 with a 2-byte length prefix
+    parts = []
+    for value in values:
+        encoded = value.encode('utf-8')
+        parts.append(struct.pack('!H', len(encoded)) + encoded)
+    return b''.join(parts)
+
+def _unpack_strings(payload: bytes, offset: int, count: int):
+    values = []
+    for _ in range(count):
+        length = struct.unpack_from('!H', payload, offset)[0]
+        offset += 2
+        if offset + length > len(payload):
+            raise ProtocolError("Çerçeve eksik")
+        values.append(payload[offset:offset + length].decode('utf-8'))
+        offset += length
+    return values
+
+def pack_file_info(filename: str, length: int, fragment: int, cipher_mode: str, offset: int = 0, total_size: int = None,
+                   transfer_id: str = "", streams: int = 1, fingerprint: str = "", flags: int = 0):
+    # TCP file info; empty transfer id / fingerprint mean none
+    total_size = length if total_size is None else total_size
+    return (TCP_FILE_INFO.pack(length, offset, total_size, fragment, streams, flags)
+            + _pack_strings(filename, cipher_mode, transfer_id, fingerprint))
+
+def unpack_file_info(payload: bytes):
+    # Returns (filename, length, fragment, cipher_mode, offset, total_size, transfer_id, streams, fingerprint, flags)
+    length, offset, total_size, fragment, streams, flags = TCP_FILE_INFO.unpack_from(payload)
+    filename, cipher_mode, transfer_id, fingerprint = _unpack_strings(payload, TCP_FILE_INFO.size, 4)
+    return filename, length, fragment, cipher_mode, offset, total_size, transfer_id, streams, fingerprint, flags
+
+def pack_udp_file_info(filename: str, filesize: int, fragment: int, checksum: str, stream_size: int = None, flags: int = 0):
+    return UDP_FILE_INFO.pack(filesize, fragment, -1 if stream_size is None else stream_size, flags) + _pack_strings(filename, checksum)
+
+def unpack_udp_file_info(payload: bytes):
+    # Returns (filename, filesize, fragment, checksum, stream_size or None, flags)
+    filesize, fragment, stream_size, flags = UDP_FILE_INFO.unpack_from(payload)
+    filename, checksum = _unpack_strings(payload, UDP_FILE_INFO.size, 2)
+    return filename, filesize, fragment, checksum, None if stream_size < 0 else stream_size, flags
@@ -0,0 +1,120 @@
+import os
+import secrets
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from utils.errors import SourceError, AuthenticationError
+
+HANDSHAKE_MODES = ("rsa", "x25519")
+X25519_KEY_SIZE = 32
+AUTH_NONCE = b'\x00' * 12  # Auth key is fresh for every handshake, so a fixed nonce is safe
+RSA_OAEP = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+def load_host_key(path: str):
+    # Load a persisted X25519 host key, or create and save one on first start;
+    # a file that is not an unencrypted X25519 key raises SourceError
+    if os.path.exists(path):
+        with open(path, 'rb') as file:
+            try:
+                private_key = serialization.load_pem_private_key(file.read(), password=None)
+            except (ValueError, TypeError) as e:
+                raise SourceError(f"{path} okunamadı: {e}") from e
+        if not isinstance(private_key, X25519PrivateKey):
+            raise SourceError(f"{path} bir X25519 anahtarı değil")
+        return private_key
+
+    private_key = X25519PrivateKey.generate()
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)  # Private key, owner only
+    with os.fdopen(fd, 'wb') as file:
+        file.write(pem)
+    print(f"Host anahtarı oluşturuldu: {path}")
+    return private_key
+
+def public_key_pem(private_key):
+    return private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+def server_key(handshake: str, host_key: str = None):
+    # Returns (private key, public key PEM) of a receiver: a persisted X25519 host key (no key generation
+    # on start), an RSA key pair generated on start, or (None, None) for x25519 without a host key,
+    # where every session generates its own ephemeral key
+    if host_key:
+        private_key = load_host_key(host_key)
+    elif handshake == "x25519":
+        return None, None
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    return private_key, public_key_pem(private_key)
+
+def _raw_public_bytes(public_key):
+    return public_key.public_bytes(encoding=serialization.Encoding.Raw, format=serialization.PublicFormat.Raw)
+
+def _derive_session_keys(shared_secret: bytes, server_public: bytes, client_public: bytes):
+    # Auth key, AES key and IV from one HKDF expansion bound to both public keys
+    key_material = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32 + 32 + 16,
+        salt=None,
+        info=b"file-transfer-system x25519" + server_public + client_public
+    ).derive(shared_secret)
+    return key_material[:32], key_material[32:64], key_material[64:]
+
+def x25519_client_hello(server_public_key: X25519PublicKey, username: str, password: str):
+    # Returns the hello message (client public key + encrypted credentials), AES key and IV
+    client_key = X25519PrivateKey.generate()
+    client_public = _raw_public_bytes(client_key.public_key())
+    server_public = _raw_public_bytes(server_public_key)
+
+    auth_key, aes_key, iv = _derive_session_keys(client_key.exchange(server_public_key), server_public, client_public)
+    encrypted_auth = AESGCM(auth_key).encrypt(AUTH_NONCE, f"{username}|{password}".encode('utf-8'), client_public)
+    return client_public + encrypted_auth, aes_key, iv
+
+def x25519_server_accept(server_key: X25519PrivateKey, hello: bytes):
+    # Returns username, password, AES key and IV; raises InvalidTag on tampered hello
+    client_public = hello[:X25519_KEY_SIZE]
+    server_public = _raw_public_bytes(server_key.public_key())
+    shared_secret = server_key.exchange(X25519PublicKey.from_public_bytes(client_public))
+
+    auth_key, aes_key, iv = _derive_session_keys(shared_secret, server_public, client_public)
+    auth_data = AESGCM(auth_key).decrypt(AUTH_NONCE, hello[X25519_KEY_SIZE:], client_public)
+    username, password = auth_data.decode('utf-8').split('|')
+    return username, password, aes_key, iv
+
+def rsa_client_hello(public_key, username: str, password: str):
+    # AES key, IV and credentials in one RSA-OAEP block, the server needs a single decryption;
+    # returns the hello message, AES key and IV
+    aes_key = secrets.token_bytes(32)  # 256-bit key
+    iv = secrets.token_bytes(16)       # 128-bit IV
+    plaintext = aes_key + iv + f"{username}|{password}".encode('utf-8')
+    if len(plaintext) > public_key.key_size // 8 - 66:  # OAEP-SHA256 limit: key size - 2 * hash size - 2
+        raise AuthenticationError("Kullanıcı adı ve şifre çok uzun")
+    return public_key.encrypt(plaintext, RSA_OAEP), aes_key, iv
+
+def rsa_server_accept(private_key, hello: bytes):
+    # Returns username, password, AES key and IV
+    plaintext = private_key.decrypt(hello, RSA_OAEP)
+    username, password = plaintext[48:].decode('utf-8').split('|')
+    return username, password, plaintext[:32], plaintext[32:48]
+
+def client_hello(public_key, username: str, password: str):
+    # Everything the server needs to authenticate the client and key the session, in one message:
+    # an X25519 server key selects the ECDH handshake, an RSA key the classic one
+    if isinstance(public_key, X25519PublicKey):
+        return x25519_client_hello(public_key, username, password)
+    return rsa_client_hello(public_key, username, password)
+
+def server_accept(private_key, hello: bytes):
+    # Returns username, password, AES key and IV from the client hello
+    if isinstance(private_key, X25519PrivateKey):
+        return x25519_server_accept(private_key, hello)
+    return rsa_server_accept(private_key, hello)
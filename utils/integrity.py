@@ -0,0 +1,119 @@
+import hmac
+import hashlib
+import struct
+import threading
+import time
+from utils.aead import recv_exact
+from utils.progress import Progress
+from utils.stats import current
+
+MAC_SIZE = 32                   # HMAC-SHA256 tag
+MAC_READ_SIZE = 1024 * 1024     # Piece size of the MAC thread and of the fallback copy loop
+RECEIVE_BUFFER_SIZE = 1024 * 1024
+
+def integrity_key(aes_key: bytes):
+    # Separate key for integrity-only transfers, derived from the session key
+    return hmac.new(aes_key, b"integrity-only mac key", hashlib.sha256).digest()
+
+def _new_mac(mac_key: bytes, iv: bytes, filesize: int):
+    # The per-file IV and the length are authenticated too, a tag cannot be replayed for another file
+    return hmac.new(mac_key, iv + struct.pack('!Q', filesize), hashlib.sha256)
+
+def _mac_range(mac, path: str, offset: int, length: int, errors: list, stats):
+    # Independent read of the same range; the data is usually already in the page cache,
+    # so the time is counted as hashing
+    try:
+        started = time.perf_counter()
+        _update_from_file(mac, path, offset, length)
+        stats.add("hash", time.perf_counter() - started, length)
+    except OSError as e:
+        errors.append(e)
+
+def _update_from_file(mac, path: str, offset: int, length: int):
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        remaining = length
+        while remaining:
+            data = file.read(min(MAC_READ_SIZE, remaining))
+            if not data:
+                break
+            mac.update(data)
+            remaining -= len(data)
+
+def send_mac_file(sock, file, filesize: int, mac_key: bytes, iv: bytes, path: str = None):
+    # Integrity-only: file contents are sent unencrypted, followed by an HMAC-SHA256 tag.
+    # A file opened from path goes out with sendfile (zero-copy from the page cache) while a
+    # second thread computes the MAC; other file-like objects are copied and hashed in one loop
+    mac = _new_mac(mac_key, iv, filesize)
+    progress = Progress(filesize)
+    stats = current()
+    clock = time.perf_counter
+
+    if path is not None and filesize:
+        offset = file.tell()
+        errors = []
+        thread = threading.Thread(target=_mac_range, args=(mac, path, offset, filesize, errors, stats))
+        thread.start()
+        try:
+            started = clock()
+            sent = sock.sendfile(file, offset, filesize)
+            stats.add("socket_send", clock() - started, sent)
+        finally:
+            thread.join()
+        if errors:
+            raise errors[0]
+        if sent != filesize:
+            raise ValueError("Dosya gönderilirken kısaldı")
+        progress.update(sent)
+    else:
+        remaining = filesize
+        while remaining:
+            started = clock()
+            data = file.read(min(MAC_READ_SIZE, remaining))
+            if not data:
+                raise ValueError("Dosya gönderilirken kısaldı")
+            read_done = clock()
+            mac.update(data)
+            hash_done = clock()
+            sock.sendall(data)
+            stats.add("disk_read", read_done - started, len(data))
+            stats.add("hash", hash_done - read_done, len(data))
+            stats.add("socket_send", clock() - hash_done, len(data))
+            remaining -= len(data)
+            progress.update(filesize - remaining)
+
+    progress.finish()
+    sock.sendall(mac.digest())
+    return mac.hexdigest()
+
+def receive_mac_file(sock, file, filesize: int, mac_key: bytes, iv: bytes):
+    # Received straight into a reused buffer, written and hashed from there;
+    # returns the MAC or None if the tag does not match
+    mac = _new_mac(mac_key, iv, filesize)
+    buffer = bytearray(RECEIVE_BUFFER_SIZE)
+    view = memoryview(buffer)
+    bytes_received = 0
+    progress = Progress(filesize)
+    stats = current()
+    clock = time.perf_counter
+
+    while bytes_received < filesize:
+        started = clock()
+        received = sock.recv_into(view[:min(RECEIVE_BUFFER_SIZE, filesize - bytes_received)])
+        if not received:
+            raise ConnectionError("Bağlantı beklenmedik şekilde kapandı")
+        received_done = clock()
+        file.write(view[:received])
+        write_done = clock()
+        mac.update(view[:received])
+        stats.add("socket_recv", received_done - started, received)
+        stats.add("disk_write", write_done - received_done, received)
+        stats.add("hash", clock() - write_done, received)
+        bytes_received += received
+        progress.update(bytes_received)
+
+    progress.finish()
+    tag = recv_exact(sock, MAC_SIZE)
+    if not hmac.compare_digest(bytes(tag), mac.digest()):
+        return None
+    return mac.hexdigest()
@@ -0,0 +1,120 @@
+import hashlib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.aead import default_workers, file_iv
+from utils.stats import current
+
+# Files are verified with a Merkle tree over SHA-256: every 1MB chunk is a leaf hashed on its own
+# (on worker threads, so hashing scales with the cores), the root stands for the whole file and the
+# leaves show which chunks are damaged. Leaves and inner nodes get different prefixes
+MERKLE_CHUNK_SIZE = 1024 * 1024
+DIGEST_SIZE = 32
+MAX_REPAIR_ROUNDS = 3  # Times the receiver asks for damaged chunks again before the file fails
+REPAIR_IV_INDEX = 1 << 63  # Repair streams derive their IVs far above the chunk streams of a file
+
+def leaf_count(size: int):
+    # Empty files still get one (empty) leaf
+    return max(1, (size + MERKLE_CHUNK_SIZE - 1) // MERKLE_CHUNK_SIZE)
+
+def chunk_ranges(size: int, indices: list):
+    # (offset, length) of the given leaves of a file of size bytes
+    return [(index * MERKLE_CHUNK_SIZE, min(MERKLE_CHUNK_SIZE, size - index * MERKLE_CHUNK_SIZE)) for index in indices]
+
+def repair_iv(iv: bytes, repair_round: int):
+    # IV of the repair stream of a file (or range) whose data was sent under iv
+    return file_iv(iv, REPAIR_IV_INDEX + repair_round)
+
+def _leaf_digest(data, stats):
+    started = time.perf_counter()
+    digest = hashlib.sha256(b'\x00')
+    digest.update(data)
+    stats.add("hash", time.perf_counter() - started, len(data))
+    return digest.digest()
+
+def merkle_root(leaves: list):
+    # Pairs are hashed level by level, an odd node is carried up unchanged
+    level = list(leaves)
+    while len(level) > 1:
+        paired = [hashlib.sha256(b'\x01' + level[index] + level[index + 1]).digest() for index in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+def hash_leaves(data, workers: int = None):
+    # Leaf digests of data in memory, hashed in parallel without copying
+    view = memoryview(data)
+    stats = current()
+    pieces = [view[offset:offset + MERKLE_CHUNK_SIZE] for offset in range(0, len(view), MERKLE_CHUNK_SIZE)] or [view]
+    with ThreadPoolExecutor(max_workers=workers or default_workers()) as pool:
+        return list(pool.map(_leaf_digest, pieces, [stats] * len(pieces)))
+
+class TreeHasher:
+    # Used like hashlib.sha256() on a stream: update() cuts the data into leaves that are hashed on
+    # worker threads (at most workers * 2 in flight), digest() is the Merkle root
+    def __init__(self, workers: int = None):
+        workers = workers or default_workers()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.window = workers * 2
+        self.pending = deque()
+        self.leaves = []
+        self.buffer = bytearray()
+        self.stats = current()
+        self.finished = False
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            size = min(MERKLE_CHUNK_SIZE - len(self.buffer), len(view))
+            self.buffer += view[:size]
+            view = view[size:]
+            if len(self.buffer) == MERKLE_CHUNK_SIZE:
+                self._submit()
+
+    def _submit(self):
+        # The full buffer goes to a worker as it is, a new one collects the next leaf
+        self.pending.append(self.pool.submit(_leaf_digest, self.buffer, self.stats))
+        self.buffer = bytearray()
+        if len(self.pending) >= self.window:
+            self.leaves.append(self.pending.popleft().result())
+
+    def leaf_digests(self):
+        if not self.finished:
+            if self.buffer or not (self.leaves or self.pending):
+                self._submit()
+            while self.pending:
+                self.leaves.append(self.pending.popleft().result())
+            self.pool.shutdown()
+            self.finished = True
+        return self.leaves
+
+    def digest(self):
+        return merkle_root(self.leaf_digests())
+
+    def hexdigest(self):
+        return self.digest().hex()
+
+class ChunkWriter:
+    # File-like writer for a stream of selected chunks sent back to back: every chunk is written
+    # at its own position of file (which has write_at, e.g. storage.OffsetWriter)
+    def __init__(self, file, chunks: list):
+        self.file = file
+        self.chunks = chunks  # (offset, length)
+        self.chunk_index = 0
+        self.chunk_position = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view and self.chunk_index < len(self.chunks):
+            offset, length = self.chunks[self.chunk_index]
+            size = min(length - self.chunk_position, len(view))
+            self.file.write_at(offset + self.chunk_position, view[:size])
+            view = view[size:]
+            self.chunk_position += size
+            if self.chunk_position == length:
+                self.chunk_index += 1
+                self.chunk_position = 0
+        if view:
+            raise ValueError("Parça verisi beklenenden uzun")
+        return len(data)
@@ -26,14 +26,18 @@ def ping_receive(port: int):
                 print(f"Hata oluştu: {e}")
                 continue
 
-def ping_receive_return(port: int):
+def ping_receive_return(port: int, on_listen=None):
+    # on_listen(port) is called once the socket listens (port 0 picks a free port)
     received_average = 0.0
     
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:    # Opening socket
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         s.bind(("0.0.0.0", port))
         s.listen()
+        port = s.getsockname()[1]
         print(f"Sunucu localhost:{port} adresinde dinleniyor...")
+        if on_listen is not None:
+            on_listen(port)
 
         while True:
             try:
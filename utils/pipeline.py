@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from utils.stats import current, recording
+
+DEFAULT_QUEUE_DEPTH = 4  # Items waiting between two pipeline stages, bounds memory use
+
+class PipelineStopped(Exception):
+    # Raised in a stage blocked on a channel once another stage has failed
+    pass
+
+class Channel:
+    # Bounded queue between two stages of a pipeline. Time a producer waits for room is recorded as
+    # "<name>_backpressure" (the next stage is slower), time a consumer waits for an item as "<name>_starved"
+    def __init__(self, depth: int, stop: threading.Event, stats, name: str = None):
+        self._queue = queue.Queue(depth)
+        self._stop = stop
+        self._stats = stats
+        self._full_stage = f"{name}_backpressure"
+        self._empty_stage = f"{name}_starved"
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            started = time.perf_counter()
+            while True:
+                if self._stop.is_set():
+                    raise PipelineStopped()
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if self._stats is not None:
+                self._stats.add(self._full_stage, time.perf_counter() - started)
+
+    def get(self):
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        started = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        if self._stats is not None:
+            self._stats.add(self._empty_stage, time.perf_counter() - started)
+        return item
+
+class Pipeline:
+    # Stages on threads of their own, connected by channels; the calling thread runs the last stage.
+    # The first failing stage stops all others and its exception is raised when the with block ends
+    def __init__(self, depth: int = None):
+        self.depth = depth or DEFAULT_QUEUE_DEPTH
+        self.stats = current()
+        self._stop = threading.Event()
+        self._threads = []
+        self._error = None
+
+    def channel(self, name: str):
+        # name: stage that puts items into the channel
+        return Channel(self.depth, self._stop, self.stats, name)
+
+    def pool(self, buffers: list):
+        # Reusable buffers handed back and forth between two stages; waiting for one is not recorded,
+        # a pool of depth + 2 buffers lets the channel fill up first
+        pool = Channel(len(buffers), self._stop, None)
+        for buffer in buffers:
+            pool.put(buffer)
+        return pool
+
+    def start(self, target, *args):
+        def run():
+            try:
+                with recording(self.stats):
+                    target(*args)
+            except PipelineStopped:
+                pass
+            except BaseException as e:
+                if self._error is None:
+                    self._error = e
+                self._stop.set()
+
+        thread = threading.Thread(target=run, daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None and (exc_type is None or exc_type is PipelineStopped):
+            raise self._error
+        return False
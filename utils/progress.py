@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+DEFAULT_INTERVAL = 0.2  # Seconds between two events of one transfer
+
+# bytes_done / total_bytes: transferred and expected bytes (total None if unknown);
+# items / total_items: packets, files or entries, counted in unit; rate in bytes per second,
+# eta in seconds (None if unknown); finished is set on the last event of a transfer;
+# name (file, range or directory) and peer ("ip:port") tell which transfer the event belongs to, None if unknown
+ProgressEvent = namedtuple('ProgressEvent', ['bytes_done', 'total_bytes', 'items', 'total_items', 'unit', 'rate', 'eta', 'finished',
+                                             'name', 'peer'])
+
+_subscribers = []
+_lock = threading.Lock()
+_interval = DEFAULT_INTERVAL
+
+def subscribe(callback):
+    # callback(event) is called from the transfer threads
+    with _lock:
+        _subscribers.append(callback)
+
+def unsubscribe(callback):
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+def set_interval(seconds: float):
+    global _interval
+    _interval = max(0.0, seconds)
+
+class Transfer:
+    # The transfer a thread is working on: progress created on the thread carries its name and peer,
+    # and callback(event) gets the events of this transfer only (besides the process-wide subscribers).
+    # A session sets name before every file it sends or receives
+    def __init__(self, callback=None, name: str = None, peer: str = None):
+        self.callback = callback
+        self.name = name
+        self.peer = peer
+
+_local = threading.local()
+
+def current_transfer():
+    # Outside of tracking() a fresh unnamed transfer, so setting its name has no effect
+    return getattr(_local, 'transfer', None) or Transfer()
+
+@contextmanager
+def tracking(transfer: Transfer):
+    previous = getattr(_local, 'transfer', None)
+    _local.transfer = transfer
+    try:
+        yield transfer
+    finally:
+        _local.transfer = previous
+
+class Progress:
+    # Progress of one transfer: hot loops call update() as often as they like, subscribers
+    # get at most one event per interval and always the final one; without subscribers
+    # an update is a time check only
+    def __init__(self, total_bytes: int = None, total_items: int = None, unit: str = "paket"):
+        self.total_bytes = total_bytes
+        self.total_items = total_items
+        self.unit = unit
+        self.bytes_done = 0
+        self.items = 0
+        self.start_time = time.perf_counter()
+        self.next_time = self.start_time + _interval
+        transfer = current_transfer()
+        self.name = transfer.name
+        self.peer = transfer.peer
+        self.callback = transfer.callback
+
+    def update(self, bytes_done: int, items: int = None):
+        self.bytes_done = bytes_done
+        if items is not None:
+            self.items = items
+        now = time.perf_counter()
+        if now >= self.next_time:
+            self.next_time = now + _interval
+            self._emit(now, False)
+
+    def finish(self):
+        self._emit(time.perf_counter(), True)
+
+    def _emit(self, now: float, finished: bool):
+        if not _subscribers and self.callback is None:
+            return
+        elapsed = max(now - self.start_time, 1e-9)
+        rate = self.bytes_done / elapsed
+        eta = None
+        if self.total_bytes is not None and rate > 0:
+            eta = max(0.0, self.total_bytes - self.bytes_done) / rate
+        event = ProgressEvent(self.bytes_done, self.total_bytes, self.items, self.total_items, self.unit, rate, eta, finished, self.name, self.peer)
+        with _lock:
+            subscribers = list(_subscribers)
+        if self.callback is not None:
+            subscribers.append(self.callback)
+        for callback in subscribers:
+            callback(event)
+
+def format_progress(event: ProgressEvent):
+    # One status line, e.g. "İlerleme: 42.0% (118.3 MB/s, 12/30 paket, kalan 3 s)", prefixed with the name of the transfer
+    label = f"İlerleme [{event.name}]" if event.name else "İlerleme"
+    details = [f"{event.rate / 1e6:.1f} MB/s"]
+    if event.total_items:
+        details.append(f"{event.items}/{event.total_items} {event.unit}")
+    elif event.items:
+        details.append(f"{event.items} {event.unit}")
+    if event.eta is not None and not event.finished:
+        details.append(f"kalan {event.eta:.0f} s")
+    if event.total_bytes:
+        return f"{label}: {min(event.bytes_done / event.total_bytes, 1.0) * 100:.1f}% ({', '.join(details)})"
+    return f"{label}: {event.bytes_done} bytes ({', '.join(details)})"
+
+def print_progress(event: ProgressEvent):
+    # CLI subscriber: rewrites the current terminal line, the final event ends the line
+    print(f"\r{format_progress(event):<70}", end='\n' if event.finished else '', flush=True)
@@ -0,0 +1,87 @@
+from utils.errors import VerificationError
+from utils.stats import Stats
+
+class FileResult:
+    # One file (or byte range, directory tree or pack of small files) of a transfer;
+    # verified is None while the sender has not heard the receiver's result yet
+    def __init__(self, name: str, size: int, files: int = 1, peer: str = None):
+        self.name = name
+        self.bytes = size
+        self.files = files
+        self.peer = peer
+        self.duration = 0.0
+        self.verified = None
+        self.stats = None  # Receiver side: Stats of this file
+
+    @property
+    def throughput(self):
+        # Bytes per second
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self):
+        return {"name": self.name, "bytes": self.bytes, "files": self.files, "peer": self.peer, "duration": round(self.duration, 6),
+                "throughput": round(self.throughput, 1), "verified": self.verified, "stats": self.stats.to_dict() if self.stats else None}
+
+    def __repr__(self):
+        return (f"FileResult(name={self.name!r}, bytes={self.bytes}, files={self.files}, duration={self.duration:.3f}, "
+                f"verified={self.verified})")
+
+class TransferResult:
+    # Result of one send call; retransmits is None where the protocol leaves them to TCP,
+    # stats holds the per-stage timings of the transfer
+    def __init__(self, protocol: str, files: list, duration: float, handshake_time: float, retransmits: int = None, stats: Stats = None):
+        self.protocol = protocol
+        self.files = files
+        self.duration = duration
+        self.handshake_time = handshake_time
+        self.retransmits = retransmits
+        self.stats = stats
+
+    @property
+    def bytes(self):
+        return sum(result.bytes for result in self.files)
+
+    @property
+    def file_count(self):
+        return sum(result.files for result in self.files)
+
+    @property
+    def throughput(self):
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def verified(self):
+        return bool(self.files) and all(result.verified for result in self.files)
+
+    def summary(self):
+        retransmits = f", yeniden gönderilen paket: {self.retransmits}" if self.retransmits is not None else ""
+        status = "doğrulandı" if self.verified else "DOĞRULANMADI"
+        return (f"{self.protocol.upper()}: {self.file_count} dosya, {self.bytes} bytes, {self.duration:.2f} s, "
+                f"{self.throughput / 1e6:.1f} MB/s, el sıkışma {self.handshake_time * 1000:.1f} ms{retransmits}, {status}")
+
+    def to_dict(self):
+        return {"protocol": self.protocol, "bytes": self.bytes, "file_count": self.file_count, "duration": round(self.duration, 6),
+                "throughput": round(self.throughput, 1), "handshake_time": round(self.handshake_time, 6), "retransmits": self.retransmits,
+                "verified": self.verified, "files": [file.to_dict() for file in self.files],
+                "stats": self.stats.to_dict() if self.stats else None}
+
+    def __repr__(self):
+        return (f"TransferResult(protocol={self.protocol!r}, files={len(self.files)}, bytes={self.bytes}, duration={self.duration:.3f}, "
+                f"handshake_time={self.handshake_time:.4f}, retransmits={self.retransmits}, verified={self.verified})")
+
+def combine_results(protocol: str, results: list, duration: float):
+    # Several sequential transfers (one per connection) as one result
+    retransmits = [result.retransmits for result in results if result.retransmits is not None]
+    stats = Stats()
+    for result in results:
+        if result.stats is not None:
+            stats.merge(result.stats)
+    return TransferResult(protocol, [file for result in results for file in result.files], duration,
+                          sum(result.handshake_time for result in results), sum(retransmits) if retransmits else None, stats)
+
+def check_result(result: TransferResult):
+    # Returns result if the receiver verified every file, raises VerificationError otherwise
+    failed = [file.name for file in result.files if not file.verified]
+    if failed:
+        raise VerificationError(f"Alıcı dosyayı doğrulayamadı: {', '.join(failed)}", result)
+    return result
@@ -0,0 +1,52 @@
+import json
+import struct
+from utils.framing import FRAME_CHUNK_LIST, send_frame, expect_frame
+from utils.errors import ProtocolError
+
+RESUME_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB plaintext per resumable chunk
+
+def resume_chunk_count(filesize: int):
+    # Empty files still get one (empty) chunk so they are verified like any other file
+    return max(1, (filesize + RESUME_CHUNK_SIZE - 1) // RESUME_CHUNK_SIZE)
+
+def file_fingerprint(stat_result):
+    # Changes whenever the source file is modified, so stale partial files are not resumed
+    return f"{stat_result.st_size}-{stat_result.st_mtime_ns}"
+
+def create_manifest(manifest_path: str, fingerprint: str, filesize: int):
+    # Manifest is JSON lines: a header, then one line per verified chunk
+    with open(manifest_path, 'w') as manifest:
+        manifest.write(json.dumps({"fingerprint": fingerprint, "size": filesize, "chunk_size": RESUME_CHUNK_SIZE}) + "\n")
+
+def load_manifest(manifest_path: str, fingerprint: str, filesize: int):
+    # Returns {chunk index: sha256} of an earlier attempt at the same file, or None
+    verified = {}
+    try:
+        with open(manifest_path) as manifest:
+            header = json.loads(manifest.readline())
+            if header != {"fingerprint": fingerprint, "size": filesize, "chunk_size": RESUME_CHUNK_SIZE}:
+                return None
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Partial last line of an interrupted write
+                verified[entry["index"]] = entry["sha256"]
+    except (OSError, ValueError):
+        return None
+    return verified
+
+def record_chunk(manifest, index: int, digest: str):
+    # Appended and flushed per chunk, a crash loses at most the chunk in flight
+    manifest.write(json.dumps({"index": index, "sha256": digest}) + "\n")
+    manifest.flush()
+
+def send_chunk_list(sock, indices: list):
+    send_frame(sock, FRAME_CHUNK_LIST, struct.pack(f'!I{len(indices)}I', len(indices), *indices))
+
+def recv_chunk_list(sock):
+    payload = expect_frame(sock, FRAME_CHUNK_LIST)
+    count = struct.unpack_from('!I', payload)[0]
+    if len(payload) != 4 + count * 4:
+        raise ProtocolError("Parça listesi boyutu hatalı")
+    return list(struct.unpack_from(f'!{count}I', payload, 4))
@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Stages timed in the transfer hot paths:
+# disk_read / disk_write, compress / decompress, encrypt / decrypt (AES, with GCM tag), hash (SHA-256 Merkle leaves / HMAC),
+# socket_send / socket_recv (time blocked in the socket, i.e. socket stall time), ack_wait (UDP sender waiting
+# for ACKs and the result), pipeline_wait (waiting for a worker thread to finish a chunk), <queue>_backpressure /
+# <queue>_starved (pipeline thread waiting on a full / empty queue), handshake
+STALL_STAGES = ("socket_send", "socket_recv", "ack_wait")
+
+class Stats:
+    # Time, bytes and calls per stage of one transfer, plus plain counters (packets, retransmits, repaired_chunks);
+    # stages running on worker threads add up, so the stage times can sum to more than the wall time
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.stages = {}    # stage: [seconds, bytes, calls]
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = [seconds, nbytes, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += nbytes
+                entry[2] += 1
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        # Stats of parallel connections as one
+        with self._lock:
+            for stage, (seconds, nbytes, calls) in other.stages.items():
+                entry = self.stages.setdefault(stage, [0.0, 0, 0])
+                entry[0] += seconds
+                entry[1] += nbytes
+                entry[2] += calls
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.start_time = min(self.start_time, other.start_time)
+            if other.end_time is not None:
+                self.end_time = max(self.end_time or other.end_time, other.end_time)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.start_time = time.perf_counter()
+            self.end_time = None
+
+    def split(self):
+        # Returns the stats recorded so far as a finished Stats and starts over
+        # (one session receiving several files)
+        with self._lock:
+            stats = Stats()
+            stats.stages, stats.counters, stats.start_time = self.stages, self.counters, self.start_time
+            stats.end_time = time.perf_counter()
+            self.stages = {}
+            self.counters = {}
+            self.start_time = stats.end_time
+        return stats
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+        return self
+
+    def to_dict(self):
+        wall = (self.end_time or time.perf_counter()) - self.start_time
+        with self._lock:
+            stages = {stage: {"seconds": round(seconds, 6), "bytes": nbytes, "calls": calls,
+                              "mb_per_s": round(nbytes / seconds / 1e6, 1) if seconds > 0 and nbytes else None}
+                      for stage, (seconds, nbytes, calls) in sorted(self.stages.items())}
+            counters = dict(self.counters)
+        stall = sum(stages[stage]["seconds"] for stage in STALL_STAGES if stage in stages)
+        return {"wall_seconds": round(wall, 6), "stall_seconds": round(stall, 6), "stages": stages, "counters": counters}
+
+class _NoStats:
+    # Used outside of recording(): hot paths keep their timing calls, nothing is stored
+    def add(self, stage: str, seconds: float, nbytes: int = 0):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def split(self):
+        return None
+
+_local = threading.local()
+_no_stats = _NoStats()
+
+def current():
+    # Stats the calling thread records into; worker pools take it from the thread that submits their work
+    return getattr(_local, 'stats', None) or _no_stats
+
+@contextmanager
+def recording(stats: Stats):
+    previous = getattr(_local, 'stats', None)
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+_json_lock = threading.Lock()
+
+def append_json(path: str, record: dict):
+    # --stats-json: one JSON object per line and finished transfer, sessions may finish concurrently
+    with _json_lock:
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + "\n")
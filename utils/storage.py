@@ -0,0 +1,97 @@
+import os
+import secrets
+import threading
+
+def preallocate(fd: int, size: int):
+    # Reserve the final size up front (fewer fragments on large files); file systems without
+    # fallocate support, and Windows, get a plain size change instead
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+def temp_file(path: str):
+    # New temporary file next to path with a unique name, so concurrent sessions receiving
+    # the same filename never write into each other's file; returns (fd, temp path).
+    # Created with the usual permissions (the process umask applies), a taken name is tried again
+    while True:
+        temp_path = f"{path}.{secrets.token_hex(6)}.tmp"
+        try:
+            return os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666), temp_path
+        except FileExistsError:
+            continue
+
+class ReceiveFile:
+    # Receiver side storage: a preallocated temporary file next to the target, written at
+    # offsets (so chunks and ranges can arrive in any order and from several threads) and
+    # moved into place with one atomic rename once the contents are verified
+    def __init__(self, path: str, size: int, temp_path: str = None, existing: bool = False):
+        # temp_path: fixed temporary file (resume), otherwise a unique one is created;
+        # existing: continue an earlier temporary file instead of starting a new one
+        self.path = path
+        self.size = size
+        self.lock = threading.Lock()  # Only used where os.pwrite is missing
+        flags = os.O_RDWR | getattr(os, 'O_BINARY', 0)
+        if temp_path is None:
+            self.fd, self.temp_path = temp_file(path)
+            preallocate(self.fd, size)
+        elif existing:
+            self.temp_path = temp_path
+            self.fd = os.open(self.temp_path, flags)
+        else:
+            self.temp_path = temp_path
+            self.fd = os.open(self.temp_path, flags | os.O_CREAT | os.O_TRUNC, 0o666)
+            preallocate(self.fd, size)
+
+    def write_at(self, offset: int, data):
+        if offset + len(data) > self.size:
+            raise ValueError("Yazma dosya boyutunu aşıyor")
+        if hasattr(os, 'pwrite'):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(self.fd, view, offset)
+                view = view[written:]
+                offset += written
+        else:
+            with self.lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self.fd, view):]
+
+    def writer(self, offset: int = 0):
+        return OffsetWriter(self, offset)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def commit(self):
+        # Verified: the complete file replaces any earlier copy in one step
+        self.close()
+        os.replace(self.temp_path, self.path)
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+class OffsetWriter:
+    # File-like sequential writer into a ReceiveFile from a start offset; write_at takes
+    # positions relative to that offset for writers that place chunks themselves
+    def __init__(self, storage: ReceiveFile, offset: int):
+        self.storage = storage
+        self.offset = offset
+        self.position = 0
+
+    def write(self, data):
+        self.storage.write_at(self.offset + self.position, data)
+        self.position += len(data)
+        return len(data)
+
+    def write_at(self, position: int, data):
+        self.storage.write_at(self.offset + position, data)
@@ -1,34 +1,665 @@
 import socket
 import select
 import os
-import hashlib
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from utils.handshake import server_key, public_key_pem, server_accept
+from utils.resume import RESUME_CHUNK_SIZE, resume_chunk_count, create_manifest, load_manifest, record_chunk, send_chunk_list
+from utils.framing import (FRAME_PUBLIC_KEY, FRAME_HELLO, FRAME_AUTH_RESULT, FRAME_FILE_INFO, FRAME_END, FRAME_SIGNATURE, FRAME_DELTA,
+                           FRAME_CHUNK_DIGESTS, FRAME_FILE_RESULT, FRAME_REPAIR, FLAG_DELTA, FLAG_DEDUP, FLAG_TREE, FLAG_PACK, RESULT_OK, RESULT_FAILED,
+                           RESULT_REPAIR, send_frame, recv_frame, expect_frame, unpack_file_info, pack_file_result)
+from utils.aead import receive_gcm_file, default_workers, file_iv, recv_exact, GcmStreamReader
+from utils.archive import safe_path, safe_name, extract_archive
+from utils.delta import file_signature, apply_delta
+from utils.dedup import parse_chunk_digests, ChunkSink, ChunkStore
+from utils.integrity import integrity_key, receive_mac_file
+from utils.storage import ReceiveFile, temp_file
+from utils.progress import Progress, Transfer, tracking, current_transfer
+from utils.pipeline import Pipeline
+from utils.merkle import (TreeHasher, ChunkWriter, MAX_REPAIR_ROUNDS, MERKLE_CHUNK_SIZE, DIGEST_SIZE, merkle_root, leaf_count, chunk_ranges,
+                          repair_iv)
+from utils.stats import Stats, current, recording
+from utils.errors import SourceError, ProtocolError
+from utils.results import FileResult
+import struct
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def tcp_receive(folderpath: str, port: int, valid_username: str, valid_password: str):
+# Multi-stream transfers that are being received, keyed by (client address, transfer id)
+_range_transfers = {}
+_range_lock = threading.Lock()
+RANGE_TIMEOUT = 60.0  # Seconds a multi-stream transfer with no range in progress waits for its missing ranges
+
+def _receive_cbc_file(sock, file, filesize: int, aes_key: bytes, iv: bytes, queue_depth: int = None, workers: int = None):
+    # Setup AES decryption
+    cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
+    decryptor = cipher.decryptor()
+    
+    # Save file and build the Merkle tree of the real file bytes while receiving, leaves are hashed on a thread pool
+    file_hash = TreeHasher(workers)
+    
+    buffer_size = 262144  # 256KB receive window per call
+    total_encrypted_size = filesize + (16 - filesize % 16) if filesize % 16 != 0 else filesize
+    progress = Progress(filesize)
+    stats = current()
+    clock = time.perf_counter
+    
+    # A network thread drains the socket into a bounded queue, a decrypt thread decrypts and feeds the hash workers,
+    # the calling thread writes: a slow disk stalls the writer only, the socket keeps being read until
+    # the queues are full (recorded as network_backpressure). Buffers are reused, depth + 2 per pool
+    with Pipeline(queue_depth) as pipeline:
+        # update_into needs block_size - 1 spare bytes; the decryptor carries partial blocks itself
+        receive_buffers = pipeline.pool([bytearray(buffer_size) for _ in range(pipeline.depth + 2)])
+        decrypted_buffers = pipeline.pool([bytearray(buffer_size + 15) for _ in range(pipeline.depth + 2)])
+        received_chunks = pipeline.channel("network")
+        decrypted_chunks = pipeline.channel("decrypt")
+        
+        def receive():
+            bytes_received = 0
+            while bytes_received < total_encrypted_size:
+                # Receive directly into a reused buffer
+                buffer = receive_buffers.get()
+                started = clock()
+                received = sock.recv_into(memoryview(buffer)[:min(buffer_size, total_encrypted_size - bytes_received)])
+                stats.add("socket_recv", clock() - started, received)
+                if not received:
+                    raise ConnectionError("Bağlantı beklenmedik şekilde kapandı")
+                bytes_received += received
+                received_chunks.put((buffer, received))
+            received_chunks.put(None)
+        
+        def decrypt():
+            bytes_decrypted = 0
+            while True:
+                chunk = received_chunks.get()
+                if chunk is None:
+                    break
+                buffer, received = chunk
+                
+                # Decrypt every complete 16-byte block in a single call
+                decrypted_buffer = decrypted_buffers.get()
+                started = clock()
+                decrypted_length = decryptor.update_into(memoryview(buffer)[:received], decrypted_buffer)
+                stats.add("decrypt", clock() - started, received)
+                receive_buffers.put(buffer)
+                
+                # Hash only the real file bytes, never the PKCS7 padding
+                useful_length = min(decrypted_length, filesize - bytes_decrypted)
+                file_hash.update(memoryview(decrypted_buffer)[:useful_length])
+                bytes_decrypted += useful_length
+                decrypted_chunks.put((decrypted_buffer, useful_length))
+            decrypted_chunks.put(None)
+        
+        pipeline.start(receive)
+        pipeline.start(decrypt)
+        
+        bytes_written = 0
+        while True:
+            chunk = decrypted_chunks.get()
+            if chunk is None:
+                break
+            decrypted_buffer, useful_length = chunk
+            started = clock()
+            file.write(memoryview(decrypted_buffer)[:useful_length])
+            stats.add("disk_write", clock() - started, useful_length)
+            decrypted_buffers.put(decrypted_buffer)
+            bytes_written += useful_length
+            
+            # Progress events are throttled by the reporter, no printing in the loop
+            progress.update(bytes_written)
+    
+    progress.finish()
+    
+    # Receive the trailer with the sender's leaf hashes (32 bytes per 1MB chunk) that follows the file contents
+    trailer = decryptor.update(bytes(recv_exact(sock, leaf_count(filesize) * DIGEST_SIZE)))
+    expected = [trailer[index:index + DIGEST_SIZE] for index in range(0, len(trailer), DIGEST_SIZE)]
+    print(f"\rBeklenen Merkle kökü: {merkle_root(expected).hex()}")
+    
+    return file_hash.leaf_digests(), expected
+
+class _Repair:
+    # A received file (or range) with chunks whose leaf hash did not match. Its file result asks the sender for
+    # them and they arrive in a repair stream once the sender has read that result, later files are received
+    # meanwhile; finish(repaired) then completes the file as an immediate result would have and returns its result
+    def __init__(self, file, size: int, iv: bytes, damaged: dict, finish):
+        self.file = file          # Has write_at, positions count from the start of the file info's data
+        self.size = size
+        self.iv = iv
+        self.damaged = damaged    # Leaf index: expected leaf hash
+        self.finish = finish
+        self.rounds = 0
+        self.report = None        # Name, size and start time of the file result
+
+def _receive_repair(sock, repair: _Repair, aes_key: bytes, workers: int, queue_depth: int = None):
+    # Full 1MB chunks back to back (only the last chunk of the file is shorter), so the leaves of the
+    # repair stream are the leaves of the damaged chunks; they are written in place
+    repair.rounds += 1
+    indices = sorted(repair.damaged)
+    chunks = chunk_ranges(repair.size, indices)
+    current().count("repaired_chunks", len(indices))
+    repaired, _ = _receive_cbc_file(sock, ChunkWriter(repair.file, chunks), sum(length for _, length in chunks), aes_key,
+                                    repair_iv(repair.iv, repair.rounds), queue_depth, workers)
+    repair.damaged = {index: repair.damaged[index] for index, leaf in zip(indices, repaired) if leaf != repair.damaged[index]}
+
+def _request_repair(sock, repairs: dict, file_index: int, repair: _Repair, name: str, size: int, start_time: float):
+    # The file result carries the damaged chunks; the sender reads it whenever it next reads from the receiver
+    # and sends them between two files after a repair frame, so no file waits for this answer
+    repair.report = (name, size, start_time)
+    repairs[file_index] = repair
+    print(f"\rBozuk parçalar yeniden isteniyor: {len(repair.damaged)} parça ({name})")
+    send_frame(sock, FRAME_FILE_RESULT, pack_file_result(RESULT_REPAIR, sorted(repair.damaged)))
+
+def _receive_data(sock, file, filesize: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int, queue_depth: int = None,
+                  damaged: dict = None):
+    # Receive filesize bytes into file and verify them, returns the Merkle root (HMAC in integrity-only mode)
+    # of the received data or None if verification failed; damaged: file has write_at, in CBC mode chunks whose
+    # leaf hash does not match are collected in it (leaf index: expected leaf hash) to be received again and
+    # the returned root is the one of the repaired data
+    if cipher_mode == "mac":
+        # Integrity-only: unencrypted contents followed by an HMAC-SHA256 tag
+        start_time = time.perf_counter()
+        mac = receive_mac_file(sock, file, filesize, integrity_key(aes_key), iv)
+        if mac is None:
+            print(f"\rHATA: Dosya bozuk! HMAC doğrulaması başarısız.")
+            return None
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        print(f"\rDosya HMAC-SHA256: {mac} ({filesize / elapsed / 1e6:.1f} MB/s)")
+        return mac
+    elif cipher_mode in ("gcm", "gcmz"):
+        # Chunked AES-GCM: every chunk carries its own authentication tag, in gcmz mode chunks are also compressed
+        file_hash = TreeHasher(workers)
+        try:
+            start_time = time.perf_counter()
+            _, wire_bytes = receive_gcm_file(sock, file, filesize, aes_key, iv[:12], workers or default_workers(), file_hash, cipher_mode == "gcmz")
+            if cipher_mode == "gcmz":
+                elapsed = max(time.perf_counter() - start_time, 1e-9)
+                print(f"\rSıkıştırma: {wire_bytes} -> {filesize} bytes (oran {wire_bytes / max(filesize, 1):.2f}), "
+                      f"etkin hız {filesize / elapsed / 1e6:.1f} MB/s")
+            return file_hash.hexdigest()
+        except InvalidTag:
+            print(f"\rHATA: Dosya bozuk! AES-GCM doğrulama etiketi geçersiz.")
+            return None
+    else:
+        # Verify file integrity chunk by chunk using the leaf hashes of the trailer
+        received, expected = _receive_cbc_file(sock, file, filesize, aes_key, iv, queue_depth, workers)
+        if received != expected and damaged is not None:
+            damaged.update((index, leaf) for index, leaf in enumerate(expected) if received[index] != leaf)
+            return merkle_root(expected).hex()
+        if received != expected:
+            print(f"\rHATA: Dosya bozuk! Beklenen: {merkle_root(expected).hex()}, Alınan: {merkle_root(received).hex()}")
+            return None
+        return merkle_root(received).hex()
+
+def _receive_file(sock, storage: ReceiveFile, filesize: int, offset: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int,
+                  queue_depth: int = None, damaged: dict = None):
+    # Receive file contents (or one range of them) at offset of the preallocated storage,
+    # damaged chunks can be received again in place
+    return _receive_data(sock, storage.writer(offset), filesize, cipher_mode, aes_key, iv, workers, queue_depth, damaged)
+
+def _receive_whole_file(sock, filepath: str, filesize: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int, queue_depth: int = None):
+    # Received into a preallocated temporary file that replaces filepath only once verified,
+    # an existing copy is never left half overwritten
+    storage = ReceiveFile(filepath, filesize)
+    damaged = {}
+    try:
+        verified = _receive_file(sock, storage, filesize, 0, cipher_mode, aes_key, iv, workers, queue_depth, damaged)
+    except Exception:
+        storage.discard()
+        raise
+    
+    def finish(verified):
+        if verified:
+            storage.commit()
+        else:
+            storage.discard()
+        return verified
+    
+    if damaged:
+        return _Repair(storage.writer(0), filesize, iv, damaged, lambda repaired: finish(verified if repaired else None))
+    return finish(verified)
+
+def _receive_resumable(sock, folderpath: str, filename: str, filesize: int, fingerprint: str, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int,
+                       queue_depth: int = None):
+    # Receive into <name>.part and record every verified chunk in <name>.part.manifest,
+    # so a new attempt only asks for the chunks that are still missing
+    part_path = folderpath + filename + ".part"
+    manifest_path = part_path + ".manifest"
+    
+    verified = load_manifest(manifest_path, fingerprint, filesize) if os.path.exists(part_path) else None
+    if verified is None:
+        # No usable earlier attempt: start over with a preallocated part file
+        storage = ReceiveFile(folderpath + filename, filesize, part_path)
+        create_manifest(manifest_path, fingerprint, filesize)
+        verified = {}
+    else:
+        storage = ReceiveFile(folderpath + filename, filesize, part_path, existing=True)
+    
+    missing = [index for index in range(resume_chunk_count(filesize)) if index not in verified]
+    print(f"Devam bilgisi: {len(verified)} parça mevcut, {len(missing)} parça eksik")
+    send_chunk_list(sock, missing)
+    
+    failed = False
+    damaged = {}    # Damaged leaves of all chunks, counted from the start of the file (resume chunks are whole leaves)
+    repaired = {}   # Chunk index: digest the chunk has once its damaged leaves are received again
+    try:
+        with open(manifest_path, 'a') as manifest:
+            for index in missing:
+                chunk_offset = index * RESUME_CHUNK_SIZE
+                chunk_length = min(RESUME_CHUNK_SIZE, filesize - chunk_offset)
+                chunk_damaged = {}
+                digest = _receive_file(sock, storage, chunk_length, chunk_offset, cipher_mode, aes_key, file_iv(iv, index), workers, queue_depth,
+                                       chunk_damaged)
+                if not digest:
+                    # Damaged chunk stays missing and is requested again by the next attempt;
+                    # every chunk is a stream of its own, so the following chunks are still received
+                    print(f"HATA: Parça {index} doğrulanamadı, transfer daha sonra devam ettirilebilir.")
+                    failed = True
+                    continue
+                if chunk_damaged:
+                    first_leaf = chunk_offset // MERKLE_CHUNK_SIZE
+                    damaged.update((first_leaf + leaf, expected) for leaf, expected in chunk_damaged.items())
+                    repaired[index] = digest
+                    continue
+                record_chunk(manifest, index, digest)
+    except Exception:
+        storage.close()
+        raise
+    
+    def finish(complete):
+        # Chunks that were repaired are recorded too; a chunk that could not be repaired stays missing
+        try:
+            if complete and repaired:
+                with open(manifest_path, 'a') as manifest:
+                    for index, digest in repaired.items():
+                        record_chunk(manifest, index, digest)
+        finally:
+            storage.close()
+        if failed or not complete:
+            return False
+        
+        # All chunks verified: move the file into place and drop the manifest
+        storage.commit()
+        os.remove(manifest_path)
+        return True
+    
+    if damaged:
+        return _Repair(storage.writer(0), filesize, iv, damaged, finish)
+    return finish(True)
+
+def _receive_delta(sock, folderpath: str, filename: str, filesize: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int,
+                   queue_depth: int = None):
+    # Delta transfer: signatures of the existing copy go to the sender, which answers with
+    # literal data and references to blocks of that copy; the new file replaces the old one
+    base_path = folderpath + filename
+    if not os.path.isfile(base_path):
+        # Nothing to compare against: the file is sent as a whole
+        send_frame(sock, FRAME_SIGNATURE)
+        return _receive_whole_file(sock, base_path, filesize, cipher_mode, aes_key, iv, workers, queue_depth)
+    
+    # Signatures are sealed with AES-GCM under a nonce of their own
+    started = time.perf_counter()
+    signature = file_signature(base_path)
+    current().add("signature", time.perf_counter() - started, os.path.getsize(base_path))
+    block_size, block_count = struct.unpack('!II', signature[:8])
+    sealed_signature = AESGCM(aes_key).encrypt(file_iv(iv, 0)[:12], signature, b"signature")
+    send_frame(sock, FRAME_SIGNATURE, sealed_signature)
+    print(f"İmza gönderildi: {block_count} blok, blok boyutu {block_size} bytes")
+    
+    delta_size = struct.unpack('!Q', expect_frame(sock, FRAME_DELTA))[0]
+    with tempfile.TemporaryFile() as delta:
+        if not _receive_data(sock, delta, delta_size, cipher_mode, aes_key, file_iv(iv, 1), workers, queue_depth):
+            return None
+        delta.seek(0)
+        
+        # Rebuild into a temporary file of its own, the old copy stays untouched until the result is verified
+        started = time.perf_counter()
+        temp_fd, temp_path = temp_file(base_path)
+        try:
+            with open(base_path, 'rb') as base, os.fdopen(temp_fd, 'wb') as out:
+                rebuilt_checksum, checksum = apply_delta(delta, base, out, block_size)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        current().add("delta", time.perf_counter() - started, filesize)
+    
+    if rebuilt_checksum != checksum:
+        os.remove(temp_path)
+        print(f"\rHATA: Dosya bozuk! Beklenen: {checksum}, Alınan: {rebuilt_checksum}")
+        return None
+    os.replace(temp_path, base_path)
+    print(f"\rDelta uygulandı: {delta_size} bytes ile {filesize} bytes dosya oluşturuldu")
+    return rebuilt_checksum
+
+def _receive_dedup(sock, folderpath: str, filename: str, filesize: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int, chunk_store,
+                   queue_depth: int = None):
+    # Deduplicated transfer: the sender offers its content-defined chunk list and only chunks
+    # missing from the chunk store are sent; the file is then reassembled from the store
+    sealed_chunk_list = expect_frame(sock, FRAME_CHUNK_DIGESTS)
+    chunks = parse_chunk_digests(AESGCM(aes_key).decrypt(file_iv(iv, 0)[:12], sealed_chunk_list, b"chunks"))
+    if sum(length for _, length in chunks) != filesize:
+        print("HATA: Parça listesi dosya boyutu ile uyuşmuyor!")
+        return None
+    
+    if chunk_store is None:
+        # No chunk store: every chunk is requested and written straight into the file
+        missing = list(range(len(chunks)))
+    else:
+        # Each unknown chunk is requested once, even if it appears several times in the file
+        missing = []
+        requested = set()
+        for index, (digest, _) in enumerate(chunks):
+            if digest not in chunk_store and digest not in requested:
+                missing.append(index)
+                requested.add(digest)
+    send_chunk_list(sock, missing)
+    print(f"Tekilleştirme: {len(chunks) - len(missing)}/{len(chunks)} parça depoda mevcut")
+    
+    missing_chunks = [chunks[index] for index in missing]
+    missing_size = sum(length for _, length in missing_chunks)
+    temp_fd, temp_path = temp_file(folderpath + filename)
+    try:
+        with os.fdopen(temp_fd, 'wb') as out:
+            sink = ChunkSink(missing_chunks, chunk_store.add if chunk_store is not None else lambda digest, data: out.write(data))
+            verified = _receive_data(sock, sink, missing_size, cipher_mode, aes_key, file_iv(iv, 1), workers, queue_depth)
+            if verified and not sink.failed and chunk_store is not None:
+                # Reassemble the whole file from the store
+                for digest, _ in chunks:
+                    out.write(chunk_store.read(digest))
+    except Exception:
+        os.remove(temp_path)
+        raise
+    
+    if not verified or sink.failed:
+        os.remove(temp_path)
+        print(f"\rHATA: Parça doğrulanamadı: {filename}")
+        return None
+    os.replace(temp_path, folderpath + filename)
+    return verified
+
+def _receive_tree(sock, root: str, total_size: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int):
+    # Directory tree or packed small files: entry frames arrive in one chunked AES-GCM stream
+    # and are extracted below root as they come; returns the file count or None on failure
+    stream = GcmStreamReader(sock, aes_key, iv[:12], cipher_mode == "gcmz")
+    start_time = time.perf_counter()
+    try:
+        files, total_bytes = extract_archive(stream, root, workers or default_workers(), total_size)
+        if stream.read(1):
+            raise ProtocolError("Arşiv sonunda beklenmeyen veri")
+    except InvalidTag:
+        print(f"\rHATA: Dizin akışı bozuk! AES-GCM doğrulama etiketi geçersiz.")
+        return None
+    except ValueError as e:
+        print(f"\rHATA: {e}")
+        return None
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    print(f"\rAlındı: {files} dosya, {total_bytes} bytes ({stream.wire_bytes} bytes aktarıldı), "
+          f"{files / elapsed:.0f} dosya/s")
+    return files
+
+def _expire_ranges():
+    # Called with _range_lock held: transfers whose missing ranges never arrived (a stream that did not
+    # connect or died before its file info) are discarded once no range has been active for RANGE_TIMEOUT
+    now = time.monotonic()
+    for transfer_key, transfer in list(_range_transfers.items()):
+        if transfer["active"] == 0 and now - transfer["updated"] > RANGE_TIMEOUT:
+            del _range_transfers[transfer_key]
+            transfer["storage"].discard()
+            print(f"\rEksik aralıklar gelmedi, dosya silindi: {transfer['filename']}")
+
+def _join_range(transfer_key: tuple, filepath: str, filename: str, filesize: int, offset: int, total_size: int, streams: int):
+    # The first range of a transfer preallocates the whole file, every range is written at its offset;
+    # later ranges must describe the same file
+    with _range_lock:
+        _expire_ranges()
+        transfer = _range_transfers.get(transfer_key)
+        if transfer is None:
+            transfer = {"key": transfer_key, "filename": filename, "total_size": total_size, "streams": streams, "remaining": streams, "active": 0,
+                        "failed": False, "updated": time.monotonic(), "storage": ReceiveFile(filepath, total_size)}
+            _range_transfers[transfer_key] = transfer
+        elif (transfer["filename"], transfer["total_size"], transfer["streams"]) != (filename, total_size, streams):
+            raise ProtocolError(f"Aralık başlığı aktarımla uyuşmuyor: {filename}")
+        if offset + filesize > total_size:
+            raise ProtocolError(f"Aralık dosya boyutunu aşıyor: {offset}-{offset + filesize}")
+        transfer["active"] += 1
+        return transfer
+
+def _receive_range(sock, filename: str, filesize: int, offset: int, cipher_mode: str, aes_key: bytes, iv: bytes, workers: int, transfer: dict,
+                   queue_depth: int = None):
+    # Every range is written at its offset of the shared preallocated file, ranges arrive in parallel
+    storage = transfer["storage"]
+    damaged = {}
+    try:
+        verified = _receive_file(sock, storage, filesize, offset, cipher_mode, aes_key, iv, workers, queue_depth, damaged)
+    except Exception as e:
+        print(f"HATA: {e}")
+        verified = False
+    if damaged:
+        # The range stays active until its repair, the transfer is neither finished nor expired meanwhile
+        return _Repair(storage.writer(offset), filesize, iv, damaged,
+                       lambda repaired: _finish_range(transfer, filename, filesize, offset, verified if repaired else False))
+    return _finish_range(transfer, filename, filesize, offset, verified)
+
+def _finish_range(transfer: dict, filename: str, filesize: int, offset: int, verified):
+    storage = transfer["storage"]
+    
+    # A failed range (also a session that died while receiving it) fails the whole file, which is
+    # discarded as soon as no other range writes into it
+    with _range_lock:
+        transfer["remaining"] -= 1
+        transfer["active"] -= 1
+        transfer["updated"] = time.monotonic()
+        transfer["failed"] |= not verified
+        finished = transfer["remaining"] == 0 or (transfer["failed"] and transfer["active"] == 0)
+        if finished and _range_transfers.get(transfer["key"]) is transfer:
+            del _range_transfers[transfer["key"]]
+    
+    if not finished:
+        print(f"\rAralık alındı: {offset}-{offset + filesize} bytes")
+    elif not transfer["failed"]:
+        storage.commit()
+        print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
+    else:
+        storage.discard()
+        print(f"\rBozuk dosya silindi: {filename}")
+    return verified
+
+def _report(sock, address, on_result, name: str, size: int, start_time: float, verified, files: int = 1):
+    # Every file, range or entry stream is answered with its verification result;
+    # on_result(FileResult) gets the same result on the server side, with the stage timings of the file
+    send_frame(sock, FRAME_FILE_RESULT, RESULT_OK if verified else RESULT_FAILED)
+    if on_result is not None:
+        result = FileResult(name, size, files, f"{address[0]}:{address[1]}")
+        result.duration = time.perf_counter() - start_time
+        result.verified = bool(verified)
+        result.stats = current().split()
+        on_result(result)
+
+def _handle_client(client_socket, address, folderpath: str, private_key, public_pem: bytes, valid_username: str, valid_password: str, workers: int, handshake: str,
+                   chunk_store=None, on_result=None, queue_depth: int = None):
+    # One client session; AES key, IV and cipher state live only in this call,
+    # the server private key is shared read-only between sessions
+    repairs = {}  # Files waiting for their damaged chunks, by file index in the session
+    try:
+        if handshake == "x25519" and private_key is None:
+            # Ephemeral X25519 key for this session only (no persisted host key)
+            private_key = X25519PrivateKey.generate()
+            public_pem = public_key_pem(private_key)
+        
+        # Send public key to client
+        send_frame(client_socket, FRAME_PUBLIC_KEY, public_pem)
+        
+        # Client hello: credentials, AES key and IV in one message (RSA: one OAEP block,
+        # X25519: ECDH + HKDF); the result below is the server's only answer, the client
+        # does not wait for it and its first file header and data are already on the way
+        hello = expect_frame(client_socket, FRAME_HELLO)
+        try:
+            started = time.perf_counter()
+            username, password, aes_key, iv = server_accept(private_key, hello)
+            current().add("handshake", time.perf_counter() - started)
+            
+            if username != valid_username or password != valid_password:
+                print(f"HATA: Geçersiz kimlik doğrulama! ({address[0]}:{address[1]})")
+                send_frame(client_socket, FRAME_AUTH_RESULT, RESULT_FAILED)
+                return
+            else:
+                print(f"Kimlik doğrulama başarılı! ({address[0]}:{address[1]})")
+                send_frame(client_socket, FRAME_AUTH_RESULT, RESULT_OK)
+        except Exception as e:
+            print(f"Kimlik doğrulama hatası: {e}")
+            send_frame(client_socket, FRAME_AUTH_RESULT, RESULT_FAILED)
+            return
+        
+        # Receive any number of files over this session until the end frame
+        file_index = 0
+        while True:
+            # Get file data (filesize is the length of the range carried by this connection)
+            frame_type, payload = recv_frame(client_socket)
+            if frame_type == FRAME_END:
+                break
+            if frame_type == FRAME_REPAIR:
+                # Damaged chunks of an earlier file, sent once the sender has read its result
+                repair_index = struct.unpack('!I', payload)[0]
+                repair = repairs.get(repair_index)
+                if repair is None:
+                    raise ProtocolError(f"Beklenmeyen onarım akışı: {repair_index}")
+                current_transfer().name = repair.report[0]
+                _receive_repair(client_socket, repair, aes_key, workers, queue_depth)
+                del repairs[repair_index]
+                name, size, start_time = repair.report
+                if repair.damaged and repair.rounds < MAX_REPAIR_ROUNDS:
+                    _request_repair(client_socket, repairs, repair_index, repair, name, size, start_time)
+                    continue
+                verified = repair.finish(not repair.damaged)
+                _report(client_socket, address, on_result, name, size, start_time, verified)
+                if verified:
+                    print(f"\rDosya onarıldı ve doğrulandı: {name}")
+                else:
+                    print(f"HATA: Dosya onarılamadı: {name}")
+                continue
+            if frame_type != FRAME_FILE_INFO:
+                raise ProtocolError(f"Beklenmeyen çerçeve: {frame_type}")
+            filename, filesize, fragment, cipher_mode, offset, total_size, transfer_id, streams, fingerprint, flags = unpack_file_info(payload)
+            # Every path below is built from the peer's filename, which must stay inside folderpath;
+            # the data stream of a rejected file cannot be skipped, so it ends the session
+            safe_name(filename)
+            current_transfer().name = filename
+            start_time = time.perf_counter()
+            
+            # Every file in the session has its own IV derived from the session IV
+            file_iv_bytes = file_iv(iv, file_index)
+            file_index += 1
+
+            if flags & (FLAG_TREE | FLAG_PACK):
+                # Directory tree or packed small files as one entry stream;
+                # a broken stream cannot be resynchronized, so it ends the session
+                print(f"Alınacak {'paket' if flags & FLAG_PACK else 'dizin'}: {filename} ({total_size} bytes)")
+                root = folderpath if flags & FLAG_PACK else safe_path(folderpath, filename)
+                files = _receive_tree(client_socket, root, total_size, cipher_mode, aes_key, file_iv_bytes, workers)
+                _report(client_socket, address, on_result, filename, total_size, start_time, files is not None, files or 0)
+                if files is None:
+                    print(f"HATA: Dizin aktarımı başarısız: {filename}")
+                    return
+                continue
+
+            print(f"Alınacak dosya: {filename}")
+            print(f"Dosya boyutu: {total_size} bytes")
+            if streams > 1:
+                print(f"Alınacak aralık: {offset}-{offset + filesize} bytes ({streams} paralel bağlantı)")
+            print(f"Dosya parça boyutu: {fragment} bytes")
+            print(f"Şifreleme modu: {cipher_mode.upper()}")
+        
+            if streams > 1:
+                # Transfer ids are scoped to the client address so sessions cannot write into each other's files;
+                # a range that does not match its transfer cannot be skipped, so it ends the session
+                transfer = _join_range((address[0], transfer_id), folderpath + filename, filename, filesize, offset, total_size, streams)
+                verified = _receive_range(client_socket, filename, filesize, offset, cipher_mode, aes_key, file_iv_bytes, workers, transfer, queue_depth)
+                if isinstance(verified, _Repair):
+                    _request_repair(client_socket, repairs, file_index - 1, verified, filename, filesize, start_time)
+                    continue
+                _report(client_socket, address, on_result, filename, filesize, start_time, verified)
+                continue
+            
+            if flags & FLAG_DELTA:
+                # Delta transfer: only data missing from the existing copy is sent
+                verified = _receive_delta(client_socket, folderpath, filename, filesize, cipher_mode, aes_key, file_iv_bytes, workers, queue_depth)
+                if isinstance(verified, _Repair):
+                    _request_repair(client_socket, repairs, file_index - 1, verified, filename, filesize, start_time)
+                    continue
+                _report(client_socket, address, on_result, filename, filesize, start_time, verified)
+                if verified:
+                    print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
+                else:
+                    print(f"HATA: Delta aktarımı başarısız: {filename}")
+                continue
+            
+            if flags & FLAG_DEDUP:
+                # Deduplicated transfer: only chunks missing from the chunk store are sent
+                verified = _receive_dedup(client_socket, folderpath, filename, filesize, cipher_mode, aes_key, file_iv_bytes, workers, chunk_store, queue_depth)
+                _report(client_socket, address, on_result, filename, filesize, start_time, verified)
+                if verified:
+                    print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
+                else:
+                    print(f"HATA: Tekilleştirilmiş aktarım başarısız: {filename}")
+                continue
+            
+            if fingerprint:
+                # Resumable transfer: only chunks missing from an earlier attempt are sent
+                verified = _receive_resumable(client_socket, folderpath, filename, filesize, fingerprint, cipher_mode, aes_key, file_iv_bytes, workers, queue_depth)
+                if isinstance(verified, _Repair):
+                    _request_repair(client_socket, repairs, file_index - 1, verified, filename, filesize, start_time)
+                    continue
+                _report(client_socket, address, on_result, filename, filesize, start_time, verified)
+                if verified:
+                    print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
+                continue
+        
+            verified = _receive_whole_file(client_socket, folderpath + filename, filesize, cipher_mode, aes_key, file_iv_bytes, workers, queue_depth)
+            if isinstance(verified, _Repair):
+                _request_repair(client_socket, repairs, file_index - 1, verified, filename, filesize, start_time)
+                continue
+            _report(client_socket, address, on_result, filename, filesize, start_time, verified)
+        
+            if verified:
+                print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
+            else:
+                print(f"Bozuk dosya silindi: {filename}")
+    except Exception as e:
+        print(f"HATA: {e}")
+    finally:
+        # Files still waiting for their damaged chunks fail with the session
+        for repair in repairs.values():
+            try:
+                repair.finish(False)
+                print(f"HATA: Dosya onarılamadı: {repair.report[0]}")
+            except Exception as e:
+                print(f"HATA: {e}")
+        client_socket.close()
+
+def tcp_receive(folderpath: str, port: int, valid_username: str, valid_password: str, workers: int = None, max_sessions: int = 16,
+                handshake: str = "rsa", host_key: str = None, chunk_store: str = None, on_result=None, stop_event=None, on_listen=None,
+                queue_depth: int = None, on_progress=None):
+    # Serves until Ctrl+C or until stop_event is set; on_result(FileResult) is called for every received
+    # file from the session threads, on_listen(port) once the socket listens (port 0 picks a free port);
+    # queue_depth: chunks buffered between the network, decrypt and write threads of a session;
+    # on_progress(ProgressEvent) with the progress of every received file, events name their file and peer
     # Dir check
     if not os.path.exists(folderpath):
         os.makedirs(folderpath)
         print(f"Klasör oluşturuldu: {folderpath}")
     elif not os.path.isdir(folderpath):
-        print(f"HATA: {folderpath} bir klasör değil!")
-        return  
-
-    # Generate RSA key pair for this session
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
-    )
-    public_key = private_key.public_key()
-    
-    # Serialize public key
-    public_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
+        raise SourceError(f"{folderpath} bir klasör değil!")
+
+    private_key, public_pem = server_key(handshake, host_key)
+
+    if chunk_store:
+        # Content-addressed chunk store shared by all sessions
+        chunk_store = ChunkStore(chunk_store)
+        print(f"Parça deposu: {len(chunk_store)} parça yüklendi")
 
     # Create Socket with optimized settings
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -39,162 +670,57 @@ def tcp_receive(folderpath: str, port: int, valid_username: str, valid_password:
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024*1024)  # 1MB send buffer
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB receive buffer
     
+    # Sessions run in parallel on a thread pool, limited to max_sessions at a time
+    session_pool = ThreadPoolExecutor(max_workers=max_sessions)
+    session_slots = threading.BoundedSemaphore(max_sessions)
+    
+    def run_session(client_socket, address):
+        try:
+            with recording(Stats()), tracking(Transfer(on_progress, peer=f"{address[0]}:{address[1]}")):
+                _handle_client(client_socket, address, folderpath, private_key, public_pem, valid_username, valid_password, workers, handshake, chunk_store,
+                               on_result, queue_depth)
+        finally:
+            session_slots.release()
+    
     try:
         # Listen Connection
         server_socket.bind(("0.0.0.0", port))
-        server_socket.listen(1)
-        print(f"Sunucu localhost:{port} adresinde dinleniyor...")
+        server_socket.listen(max(16, max_sessions))
+        port = server_socket.getsockname()[1]
+        print(f"Sunucu localhost:{port} adresinde dinleniyor... (en fazla {max_sessions} eşzamanlı oturum)")
+        if on_listen is not None:
+            on_listen(port)
         
-        while True:
+        while stop_event is None or not stop_event.is_set():
             try:
+                # Wait for a free session slot; extra clients wait in the listen backlog
+                with _range_lock:
+                    _expire_ranges()
+                if not session_slots.acquire(timeout=1.0): continue
+                
                 ready, _, _ = select.select([server_socket], [], [], 1.0)
                 
-                if not ready: continue
+                if not ready:
+                    session_slots.release()
+                    continue
 
                 # Accept Connection
-                client_socket, address = server_socket.accept()
-                print(f"\nBağlantı kabul edildi: {address}")
-                
-                # Send public key to client
-                client_socket.send(public_pem)
-                
-                # Client authentication
-                auth_data = client_socket.recv(1024)
                 try:
-                    decrypted_auth = private_key.decrypt(
-                        auth_data,
-                        padding.OAEP(
-                            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                            algorithm=hashes.SHA256(),
-                            label=None
-                        )
-                    )
-                    username, password = decrypted_auth.decode('utf-8').split('|')
-                    
-                    if username != valid_username or password != valid_password:
-                        print("HATA: Geçersiz kimlik doğrulama!")
-                        client_socket.send(b"AUTH_FAILED")
-                        client_socket.close()
-                        continue
-                    else:
-                        print("Kimlik doğrulama başarılı!")
-                        client_socket.send(b"AUTH_SUCCESS")
-                except Exception as e:
-                    print(f"Kimlik doğrulama hatası: {e}")
-                    client_socket.send(b"AUTH_FAILED")
-                    client_socket.close()
-                    continue
-                
-                # Receive encrypted AES key
-                encrypted_aes_key = client_socket.recv(256)
-                aes_key = private_key.decrypt(
-                    encrypted_aes_key,
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                
-                # Receive IV
-                iv = client_socket.recv(16)
-                
-                # Get file data
-                data = client_socket.recv(1024).decode('utf-8')
-                filename, filesize, fragment, checksum, *_ = data.split('|')
-                filesize = int(filesize)
-                fragment = int(fragment)
-
-                print(f"Alınacak dosya: {filename}")
-                print(f"Dosya boyutu: {filesize} bytes")
-                print(f"Dosya parça boyutu: {fragment} bytes")
-                print(f"Beklenen SHA-256 checksum: {checksum}")
-                
-                # Setup AES decryption
-                cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
-                decryptor = cipher.decryptor()
-                
-                # Save file and calculate checksum (SHA-256) - optimized streaming
-                file_hash = hashlib.sha256()
-                receive_buffer = b""
-                
-                with open(folderpath + filename, 'wb') as file:
-                    bytes_received = 0
-                    total_encrypted_size = filesize + (16 - filesize % 16) if filesize % 16 != 0 else filesize
-                    
-                    while bytes_received < total_encrypted_size:
-                        # Receive larger chunks for better performance
-                        chunk_size = min(65536, total_encrypted_size - bytes_received)
-                        encrypted_data = client_socket.recv(chunk_size)
-                        
-                        if not encrypted_data:
-                            break
-                        
-                        receive_buffer += encrypted_data
-                        bytes_received += len(encrypted_data)
-                        
-                        # Process complete 16-byte blocks
-                        while len(receive_buffer) >= 16:
-                            block_to_decrypt = receive_buffer[:16]
-                            receive_buffer = receive_buffer[16:]
-                            
-                            # Decrypt block
-                            decrypted_block = decryptor.update(block_to_decrypt)
-                            file.write(decrypted_block)
-                            file_hash.update(decrypted_block)
-                        
-                        # Update progress less frequently
-                        if bytes_received % 65536 == 0 or bytes_received >= total_encrypted_size:
-                            progress = (bytes_received / total_encrypted_size) * 100
-                            print(f"\rİlerleme: {progress:.1f}%", end='', flush=True)
-                    
-                    # Process any remaining data
-                    if receive_buffer:
-                        decrypted_final = decryptor.update(receive_buffer)
-                        file.write(decrypted_final)
-                        file_hash.update(decrypted_final)
-                    
-                    # Finalize decryption
-                    final_chunk = decryptor.finalize()
-                    if final_chunk:
-                        file.write(final_chunk)
-                        file_hash.update(final_chunk)
-                
-                # Remove PKCS7 padding by truncating file to original size
-                with open(folderpath + filename, 'r+b') as file:
-                    file.truncate(filesize)
-                
-                # Recalculate hash for the actual file content
-                file_hash = hashlib.sha256()
-                with open(folderpath + filename, 'rb') as file:
-                    while True:
-                        chunk = file.read(65536)
-                        if not chunk:
-                            break
-                        file_hash.update(chunk)
-                
-                # Verify file integrity using SHA-256
-                received_checksum = file_hash.hexdigest()
-                if received_checksum == checksum:
-                    print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
-                else:
-                    print(f"\rHATA: Dosya bozuk! Beklenen: {checksum}, Alınan: {received_checksum}")
-                    os.remove(folderpath + filename)
-                    print(f"Bozuk dosya silindi: {filename}")
+                    client_socket, address = server_socket.accept()
+                except OSError:
+                    session_slots.release()
+                    raise
+                print(f"\nBağlantı kabul edildi: {address}")
+                session_pool.submit(run_session, client_socket, address)
                     
             except KeyboardInterrupt:
                 print("Sunucu kapatılıyor...")
                 break
             except Exception as e:
                 print(f"HATA: {e}")
-            finally:
-                if 'client_socket' in locals():
-                    client_socket.close()
-                    
-    except Exception as e:
-        print(f"HATA: {e}")
     finally:
         server_socket.close()
+        session_pool.shutdown(wait=False)
 
 if __name__ == "__main__":
     tcp_receive("output/", 12345, "admin", "admin123")
\ No newline at end of file
@@ -1,160 +1,604 @@
 import socket
 import os
-import hashlib
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 import secrets
+import threading
+from collections import deque
+from utils.handshake import client_hello
+from utils.resume import RESUME_CHUNK_SIZE, resume_chunk_count, file_fingerprint, recv_chunk_list
+from utils.framing import (FRAME_PUBLIC_KEY, FRAME_HELLO, FRAME_AUTH_RESULT, FRAME_FILE_INFO, FRAME_END, FRAME_SIGNATURE, FRAME_DELTA,
+                           FRAME_CHUNK_DIGESTS, FRAME_FILE_RESULT, FRAME_REPAIR, FLAG_DELTA, FLAG_DEDUP, FLAG_TREE, FLAG_PACK, RESULT_OK, RESULT_REPAIR,
+                           pack_frame, expect_frame, pack_file_info, unpack_file_result)
+from utils.aead import send_gcm_file, default_workers, file_iv, CHUNK_SIZE, GcmStreamWriter
+from utils.archive import walk_tree, tree_size, write_archive, PACK_THRESHOLD
+from utils.delta import parse_signature, write_delta
+from utils.dedup import file_chunks, pack_chunk_digests, ChunkReader
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from utils.compression import CODECS
+from utils.integrity import integrity_key, send_mac_file
+from utils.progress import Progress, Transfer, tracking
+from utils.pipeline import Pipeline
+from utils.merkle import TreeHasher, MAX_REPAIR_ROUNDS, leaf_count, chunk_ranges, repair_iv
+from utils.stats import Stats, current, recording
+from utils.errors import SourceError, AuthenticationError, VerificationError, ProtocolError
+from utils.results import FileResult, TransferResult, check_result
+import struct
+import tempfile
+import time
 
-def tcp_send(filepath: str, ip: str, port: int, fragment: int, username: str, password: str):
-    # File check
-    if not os.path.exists(filepath) and not os.path.isfile(filepath):
-        print(f"HATA: {filepath} dosyası bulunamadı!")
-        return
-    
-    if not os.access(filepath, os.R_OK):
-        print(f"HATA: {filepath} dosyası okunamıyor!")
-        return
+PIPELINE_BUFFER_SIZE = 256 * 1024  # Smallest chunk handed between the pipeline threads
+CONNECT_RETRY_INTERVAL = 0.1       # Seconds between connection attempts while a connect is retried
 
-    # Get file data and calculate checksum (SHA-256)
-    filesize = os.path.getsize(filepath)
-    filename = os.path.basename(filepath)
+def _send_cbc_file(sock, file, filesize: int, fragment: int, aes_key: bytes, iv: bytes, queue_depth: int = None, workers: int = None):
+    # Setup AES encryption
+    cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
+    encryptor = cipher.encryptor()
     
-    # Calculate file checksum using SHA-256
-    file_hash = hashlib.sha256()
-    with open(filepath, 'rb') as file:
-        for chunk in iter(lambda: file.read(4096), b""):
-            file_hash.update(chunk)
-    checksum = file_hash.hexdigest()
-
-    # Create Socket with optimized settings
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Send file in optimized chunks (larger buffer for better performance)
+    buffer_size = max(fragment, PIPELINE_BUFFER_SIZE)
+    buffer_size -= buffer_size % 16     # Keep chunks aligned to AES block size
     
-    # TCP optimizations
-    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Disable Nagle's algorithm
-    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024*1024)  # 1MB send buffer
-    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB receive buffer
+    # Merkle tree of the file in the same pass as sending, the 1MB leaves are hashed on a thread pool
+    file_hash = TreeHasher(workers)
     
-    try:
-        # Connect Server
-        client_socket.connect((ip, port))
-        print(f"Sunucuya bağlandı: {ip}:{port}")
-        
-        # Receive server's public key
-        public_key_pem = client_socket.recv(1024)
-        public_key = serialization.load_pem_public_key(public_key_pem, backend=default_backend())
-        
-        # Send authentication credentials (encrypted with RSA)
-        auth_data = f"{username}|{password}".encode('utf-8')
-        encrypted_auth = public_key.encrypt(
-            auth_data,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        client_socket.send(encrypted_auth)
-        
-        # Wait for authentication response
-        auth_response = client_socket.recv(1024)
-        if auth_response != b"AUTH_SUCCESS":
-            print("HATA: Kimlik doğrulama başarısız!")
-            return
-        else:
-            print("Kimlik doğrulama başarılı!")
-        
-        # Generate AES key and IV
-        aes_key = secrets.token_bytes(32)  # 256-bit key
-        iv = secrets.token_bytes(16)       # 128-bit IV
-        
-        # Encrypt AES key with RSA and send
-        encrypted_aes_key = public_key.encrypt(
-            aes_key,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        client_socket.send(encrypted_aes_key)
-        
-        # Send IV
-        client_socket.send(iv)
-        
-        # Send file data with checksum
-        info = f"{filename}|{filesize}|{fragment}|{checksum}|"
-        info_bytes = info.encode('utf-8')
-        length = len(info_bytes)
-
-        if length < 1024:
-            padding_len = 1024 - length
-            info_padded = info_bytes + b'a' * padding_len
-        else:
-            info_padded = info_bytes[:1024]
-
-        client_socket.send(info_padded)
-        
-        print(f"Gönderilen dosya: {filename}")
-        print(f"Dosya boyutu: {filesize} bytes")
-        print(f"Dosya parça boyutu: {fragment} bytes")
-        print(f"Dosya SHA-256 checksum: {checksum}")
+    progress = Progress(filesize)
+    stats = current()
+    clock = time.perf_counter
+    
+    # Reading (handing the data to the hash workers), encryption and sending run on three threads connected by
+    # bounded queues; file reads, hashing, AES and sendall all release the GIL, so the stages overlap and the slowest one
+    # sets the speed. Buffers are reused: depth + 2 per pool, memory use stays bounded
+    with Pipeline(queue_depth) as pipeline:
+        # Read buffers have extra room for padding, update_into needs block_size - 1 spare bytes
+        read_buffers = pipeline.pool([bytearray(buffer_size + 16) for _ in range(pipeline.depth + 2)])
+        encrypted_buffers = pipeline.pool([bytearray(buffer_size + 16 + 15) for _ in range(pipeline.depth + 2)])
+        plain_chunks = pipeline.channel("read")
+        encrypted_chunks = pipeline.channel("encrypt")
         
-        # Setup AES encryption
-        cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
-        encryptor = cipher.encryptor()
+        def read():
+            bytes_read = 0
+            while bytes_read < filesize:
+                # Read chunk from file directly into the buffer
+                buffer = read_buffers.get()
+                view = memoryview(buffer)
+                started = clock()
+                length = file.readinto(view[:min(buffer_size, filesize - bytes_read)])  # Never read past the range
+                if not length:
+                    break
+                bytes_read += length
+                stats.add("disk_read", clock() - started, length)
+                file_hash.update(view[:length])
+                plain_chunks.put((buffer, length, bytes_read >= filesize))
+            plain_chunks.put(None)
         
-        # Send file in optimized chunks (larger buffer for better performance)
-        buffer_size = max(fragment, 65536)  # At least 64KB chunks
-        with open(filepath, 'rb') as file:
-            bytes_sent = 0
-            encrypted_buffer = b""
-            
-            while bytes_sent < filesize:
-                # Read larger chunk from file
-                data = file.read(buffer_size)
-                if not data:
+        def encrypt():
+            while True:
+                chunk = plain_chunks.get()
+                if chunk is None:
                     break
+                buffer, length, is_last = chunk
+                plain_length = length
                 
                 # Apply PKCS7 padding only to the last chunk
-                if bytes_sent + len(data) >= filesize:
-                    padding_length = 16 - (len(data) % 16)
+                if is_last:
+                    padding_length = 16 - (length % 16)
                     if padding_length != 16:
-                        data += bytes([padding_length] * padding_length)
+                        buffer[length:length + padding_length] = bytes([padding_length] * padding_length)
+                        length += padding_length
                 else:
                     # Ensure chunk is multiple of 16 for AES CBC
-                    if len(data) % 16 != 0:
-                        padding_needed = 16 - (len(data) % 16)
-                        data += b'\x00' * padding_needed
-                
-                # Encrypt chunk
-                encrypted_chunk = encryptor.update(data)
-                encrypted_buffer += encrypted_chunk
-                
-                # Send when buffer is large enough or at the end
-                while len(encrypted_buffer) >= 65536 or (bytes_sent + len(data) >= filesize and encrypted_buffer):
-                    send_chunk = encrypted_buffer[:65536] if len(encrypted_buffer) >= 65536 else encrypted_buffer
-                    client_socket.sendall(send_chunk)  # sendall ensures all data is sent
-                    encrypted_buffer = encrypted_buffer[len(send_chunk):]
+                    if length % 16 != 0:
+                        padding_needed = 16 - (length % 16)
+                        buffer[length:length + padding_needed] = b'\x00' * padding_needed
+                        length += padding_needed
                 
-                bytes_sent += len(data) if bytes_sent + len(data) <= filesize else filesize - bytes_sent
-                
-                # Update progress less frequently for better performance
-                if bytes_sent % (buffer_size * 10) == 0 or bytes_sent >= filesize:
-                    progress = (bytes_sent / filesize) * 100
-                    print(f"\rİlerleme: {progress:.1f}%", end='', flush=True)
+                # Encrypt chunk into a reused buffer
+                encrypted_buffer = encrypted_buffers.get()
+                started = clock()
+                encrypted_length = encryptor.update_into(memoryview(buffer)[:length], encrypted_buffer)
+                stats.add("encrypt", clock() - started, length)
+                read_buffers.put(buffer)
+                encrypted_chunks.put((encrypted_buffer, encrypted_length, plain_length))
+            encrypted_chunks.put(None)
+        
+        pipeline.start(read)
+        pipeline.start(encrypt)
+        
+        # Send encrypted chunks without copying, on the calling thread
+        bytes_sent = 0
+        while True:
+            chunk = encrypted_chunks.get()
+            if chunk is None:
+                break
+            encrypted_buffer, encrypted_length, plain_length = chunk
+            started = clock()
+            sock.sendall(memoryview(encrypted_buffer)[:encrypted_length])  # sendall ensures all data is sent
+            stats.add("socket_send", clock() - started, encrypted_length)
+            encrypted_buffers.put(encrypted_buffer)
+            bytes_sent += plain_length
             
-            # Finalize encryption and send any remaining data
-            final_chunk = encryptor.finalize()
-            if final_chunk:
-                client_socket.sendall(final_chunk)
+            # Progress events are throttled by the reporter, no printing in the loop
+            progress.update(bytes_sent)
+    
+    progress.finish()
+    
+    # Send the leaf hashes as trailer (32 bytes per 1MB chunk) in the same cipher stream;
+    # the receiver verifies every chunk on its own and rebuilds the root from them
+    leaves = file_hash.leaf_digests()
+    checksum = file_hash.hexdigest()
+    sock.sendall(encryptor.update(b''.join(leaves)))
+    
+    # Finalize encryption and send any remaining data
+    final_chunk = encryptor.finalize()
+    if final_chunk:
+        sock.sendall(final_chunk)
+    
+    return checksum
+
+class _RepairSource:
+    # Where the data of a file (or range) sent in CBC mode came from, for chunks the receiver asks for again
+    def __init__(self, filepath: str, offset: int, length: int, fragment: int, file_index: int, iv: bytes):
+        self.filepath = filepath
+        self.offset = offset
+        self.length = length
+        self.fragment = fragment
+        self.file_index = file_index
+        self.iv = iv
+        self.rounds = 0
+
+class TcpSendSession:
+    # One authenticated, encrypted connection that carries any number of files
+    def __init__(self, ip: str, port: int, username: str, password: str, aead: bool = False, workers: int = None, compress: str = None,
+                 integrity_only: bool = False, queue_depth: int = None, on_progress=None):
+        # on_progress(ProgressEvent): progress of the files of this session only
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.aead = aead
+        self.workers = workers or default_workers()
+        self.codec = CODECS[compress] if compress else None
+        # Compressed chunks vary in size, so compression always uses the chunked AES-GCM framing;
+        # integrity-only sends file contents unencrypted with an HMAC tag
+        self.cipher_mode = "gcmz" if self.codec is not None else "mac" if integrity_only else "gcm" if aead else "cbc"
+        self.queue_depth = queue_depth  # Chunks waiting between the read, encrypt and send threads
+        self.client_socket = None
+        self.file_index = 0
+        self.hello = None             # Hello frame, sent together with the first frame of the session
+        self.authenticated = False    # Server's answer to the hello has been read
+        self.start_time = None
+        self.handshake_time = None    # Seconds from connect until data can be sent
+        self.first_byte_time = None   # Seconds from connect to the first data byte (TTFB)
+        self.results = []             # FileResult of every file sent in this session
+        self.pending = deque()        # Results the server has not answered yet with their repair source, in sending order
+        self.repairs = deque()        # Damaged chunks the server asked for, sent before the next file
+        self.stats = Stats()          # Per-stage timings, recorded while the session is entered
+        self.transfer = Transfer(on_progress, peer=f"{ip}:{port}")  # Progress of the file being sent, while entered
+        self._recording = None
+        self._tracking = None
+
+    def __enter__(self):
+        self._recording = recording(self.stats)
+        self._recording.__enter__()
+        self._tracking = tracking(self.transfer)
+        self._tracking.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if isinstance(exc, OSError) and self.client_socket is not None and (not self.authenticated or self.pending):
+                # Pipelined data was cut off: report the server's answer if it rejected the hello
+                # or a file the session was still sending after
+                try:
+                    self._read_results()
+                except OSError:
+                    pass
+                failed = [result.name for result in self.results if result.verified is False]
+                if failed:
+                    raise VerificationError(f"Alıcı dosyayı doğrulayamadı: {', '.join(failed)}") from exc
+        finally:
+            try:
+                # Only a cleanly finished session is ended with the end frame
+                self.close(end_session=exc_type is None)
+            finally:
+                self.stats.finish()
+                self._tracking.__exit__(None, None, None)
+                self._recording.__exit__(None, None, None)
+
+    def connect(self, retry_time: float = 0):
+        # retry_time: seconds a refused or reset connection is tried again (auto mode: the receiver
+        # is still switching from the ping socket to the transfer socket)
+        deadline = time.perf_counter() + retry_time
+        while True:
+            # Create Socket with optimized settings
+            self.start_time = time.perf_counter()
+            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.client_socket = client_socket
+            
+            # TCP optimizations
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Disable Nagle's algorithm
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024*1024)  # 1MB send buffer
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024*1024)  # 1MB receive buffer
+            
+            try:
+                # Connect Server
+                client_socket.connect((self.ip, self.port))
+                
+                # Receive server's public key (sent by the server as soon as it accepts)
+                public_key_pem = expect_frame(client_socket, FRAME_PUBLIC_KEY)
+                break
+            except ConnectionError:
+                client_socket.close()
+                self.client_socket = None
+                if time.perf_counter() >= deadline:
+                    raise
+                time.sleep(CONNECT_RETRY_INTERVAL)
+        print(f"Sunucuya bağlandı: {self.ip}:{self.port}")
+        public_key = serialization.load_pem_public_key(public_key_pem, backend=default_backend())
+        
+        # One hello carries credentials and key material (RSA: AES key and IV encrypted together,
+        # X25519: ephemeral public key, AES key and IV are derived). It goes out with the first file
+        # header and the data follows without waiting; the server's answer is read the first time
+        # the session reads anything from the server, or when the session ends
+        hello, self.aes_key, self.iv = client_hello(public_key, self.username, self.password)
+        self.hello = pack_frame(FRAME_HELLO, hello)
+        self.handshake_time = time.perf_counter() - self.start_time
+        self.stats.add("handshake", self.handshake_time)
+        return True
+
+    def _send_frame(self, frame_type: int, payload: bytes = b''):
+        # The pending hello goes out in the same write as the first frame
+        frame = pack_frame(frame_type, payload)
+        if self.hello is not None:
+            frame = self.hello + frame
+            self.hello = None
+        self.client_socket.sendall(frame)
+
+    def _confirm_auth(self):
+        # The server answers the hello exactly once, before anything else it sends
+        if self.authenticated:
+            return
+        if expect_frame(self.client_socket, FRAME_AUTH_RESULT) != RESULT_OK:
+            raise AuthenticationError("Kimlik doğrulama başarısız!")
+        self.authenticated = True
+        print("Kimlik doğrulama başarılı!")
+
+    def _read_results(self):
+        # The server answers every file with its verification result once it is received;
+        # the answers are read before the next read from the server, or when the session ends.
+        # An answer with damaged chunks is not final, the chunks are sent before the next file
+        self._confirm_auth()
+        while self.pending:
+            result, source = self.pending.popleft()
+            status, damaged = unpack_file_result(expect_frame(self.client_socket, FRAME_FILE_RESULT))
+            if status == RESULT_REPAIR:
+                if source is None or source.rounds >= MAX_REPAIR_ROUNDS or max(damaged) >= leaf_count(source.length) or damaged != sorted(set(damaged)):
+                    raise ProtocolError("Geçersiz parça onarım isteği")
+                self.repairs.append((result, source, damaged))
+            else:
+                result.verified = status == RESULT_OK
+
+    def _send_repairs(self):
+        # The damaged chunks of every file asked for so far go back to back in a stream of their own after a
+        # repair frame with the file's index, between two files; the file is then answered again
+        while self.repairs:
+            result, source, damaged = self.repairs.popleft()
+            self.transfer.name = result.name
+            source.rounds += 1
+            chunks = [(chunk_offset, chunk_length, None) for chunk_offset, chunk_length in chunk_ranges(source.length, damaged)]
+            print(f"\rBozuk parçalar yeniden gönderiliyor: {len(damaged)}/{leaf_count(source.length)} ({result.name})")
+            self.stats.count("repaired_chunks", len(damaged))
+            self._send_frame(FRAME_REPAIR, struct.pack('!I', source.file_index))
+            with open(source.filepath, 'rb') as file:
+                _send_cbc_file(self.client_socket, ChunkReader(file, source.offset, chunks), sum(chunk_length for _, chunk_length, _ in chunks),
+                               source.fragment, self.aes_key, repair_iv(source.iv, source.rounds), self.queue_depth, self.workers)
+            self.pending.append((result, source))
+
+    def _start_result(self, name: str, size: int, files: int = 1):
+        result = FileResult(name, size, files, f"{self.ip}:{self.port}")
+        result.duration = time.perf_counter()
+        return result
+
+    def _finish_result(self, result: FileResult, source: _RepairSource = None):
+        result.duration = time.perf_counter() - result.duration
+        self.results.append(result)
+        self.pending.append((result, source))
+        return result
+
+    def _mark_first_byte(self):
+        if self.first_byte_time is None:
+            self.first_byte_time = time.perf_counter() - self.start_time
+            print(f"İlk veri baytına kadar geçen süre (TTFB): {self.first_byte_time * 1000:.1f} ms")
+
+    def send_file(self, filepath: str, fragment: int, filename: str = None, offset: int = 0, length: int = None,
+                  total_size: int = None, transfer_id: str = "", streams: int = 1, resume: bool = False, delta: bool = False,
+                  dedup: bool = False):
+        filename = filename or os.path.basename(filepath)
+        if length is None:
+            length = os.path.getsize(filepath) - offset
+        if total_size is None:
+            total_size = length
+        self._send_repairs()
+        file_index = self.file_index
+        iv = file_iv(self.iv, file_index)
+        self.file_index += 1
+        
+        # Resumable transfers identify the source file so stale partial files are not reused;
+        # delta and deduplicated transfers replace the receiver's copy as a whole, so they are never resumed
+        fingerprint = file_fingerprint(os.stat(filepath)) if resume and not delta and not dedup else ""
+        dedup = dedup and not delta
+        
+        # Send file data (in CBC mode the checksum follows the file contents as a trailer)
+        # length is the size of this range, total_size the size of the whole file
+        cipher_mode = self.cipher_mode
+        flags = (FLAG_DELTA if delta else 0) | (FLAG_DEDUP if dedup else 0)
+        result = self._start_result(filename, length)
+        self.transfer.name = filename
+        self._send_frame(FRAME_FILE_INFO, pack_file_info(filename, length, fragment, cipher_mode, offset, total_size, transfer_id, streams,
+                                                         fingerprint, flags))
+        
+        print(f"Gönderilen dosya: {filename}")
+        print(f"Dosya boyutu: {total_size} bytes")
+        if streams > 1:
+            print(f"Gönderilen aralık: {offset}-{offset + length} bytes")
+        print(f"Dosya parça boyutu: {fragment} bytes")
+        print(f"Şifreleme modu: {cipher_mode.upper()}")
+        
+        # In CBC mode the receiver writes whole files, ranges and resume chunks in place and may ask for
+        # damaged chunks in the file result
+        repairable = cipher_mode == "cbc"
+        with open(filepath, 'rb') as file:
+            file.seek(offset)
+            if delta:
+                repairable &= self._send_delta(file, length, fragment, iv)
+            elif dedup:
+                self._send_dedup(file, offset, length, fragment, iv)
+                repairable = False
+            elif fingerprint:
+                # Receiver answers with the chunks it has not verified yet; only those are sent
+                self._read_results()
+                missing = recv_chunk_list(self.client_socket)
+                print(f"Eksik parça sayısı: {len(missing)}/{resume_chunk_count(length)}")
+                for index in missing:
+                    chunk_offset = index * RESUME_CHUNK_SIZE
+                    file.seek(offset + chunk_offset)
+                    self._send_data(file, min(RESUME_CHUNK_SIZE, length - chunk_offset), fragment, file_iv(iv, index), filepath)
+            else:
+                self._send_data(file, length, fragment, iv, filepath)
         
         print(f"\rDosya başarıyla gönderildi!")
-    except Exception as e:
-        print(f"HATA: {e}")
-    finally:
-        client_socket.close()
+        return self._finish_result(result, _RepairSource(filepath, offset, length, fragment, file_index, iv) if repairable else None)
+
+    def send_tree(self, dirpath: str, fragment: int):
+        # Whole directory tree in one stream of entry frames, received below a folder of the same name
+        dirname = os.path.basename(os.path.normpath(dirpath))
+        print(f"Gönderilen dizin: {dirname}")
+        return self._send_entries(dirname, FLAG_TREE, walk_tree(dirpath), fragment)
+
+    def send_pack(self, filepaths: list, fragment: int):
+        # Small files packed into one entry stream instead of one header and cipher stream each,
+        # received straight into the receive folder
+        entries = [(os.path.basename(filepath), filepath, os.stat(filepath)) for filepath in filepaths]
+        print(f"Paketlenen küçük dosyalar: {len(entries)}")
+        return self._send_entries(f"{len(entries)} dosya", FLAG_PACK, entries, fragment)
+
+    def _send_entries(self, name: str, flags: int, entries: list, fragment: int):
+        # Entry frames (path, mode, mtime, size, data) of all entries in one stream; small files
+        # share sealed chunks, large ones are streamed through, no archive is built
+        self._send_repairs()
+        iv = file_iv(self.iv, self.file_index)
+        self.file_index += 1
+        total_size = tree_size(entries)
+        
+        # The entry stream has no length known in advance, so it always uses the chunked AES-GCM framing
+        cipher_mode = "gcmz" if self.codec is not None else "gcm"
+        result = self._start_result(name, total_size, len(entries))
+        self.transfer.name = name
+        self._send_frame(FRAME_FILE_INFO, pack_file_info(name, total_size, fragment, cipher_mode, flags=flags))
+        
+        print(f"Kayıt sayısı: {len(entries)}, toplam boyut: {total_size} bytes")
+        print(f"Şifreleme modu: {cipher_mode.upper()}")
+        
+        self._mark_first_byte()
+        start_time = time.perf_counter()
+        stream = GcmStreamWriter(self.client_socket, self.aes_key, iv[:12], self.workers, self.codec)
+        try:
+            files = write_archive(stream, entries, self.workers)
+        finally:
+            stream.close()
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        print(f"\rGönderildi: {files} dosya, {stream.bytes_written} -> {stream.wire_bytes} bytes, "
+              f"{files / elapsed:.0f} dosya/s, {total_size / elapsed / 1e6:.1f} MB/s")
+        result.files = files
+        return self._finish_result(result)
+
+    def _send_delta(self, file, length: int, fragment: int, iv: bytes):
+        # Receiver answers with signatures of its copy (empty if it has none);
+        # returns True if the file was sent as a whole
+        self._read_results()
+        sealed_signature = expect_frame(self.client_socket, FRAME_SIGNATURE)
+        if not sealed_signature:
+            print("Alıcıda dosya yok, tamamı gönderiliyor")
+            self._send_data(file, length, fragment, iv)
+            return True
+        
+        signature = parse_signature(AESGCM(self.aes_key).decrypt(file_iv(iv, 0)[:12], sealed_signature, b"signature"))
+        
+        # Delta commands are collected in a temporary file so their size is known before sending
+        with tempfile.TemporaryFile() as delta:
+            started = time.perf_counter()
+            literal_bytes, copied_bytes = write_delta(file, length, signature, delta)
+            self.stats.add("delta", time.perf_counter() - started, length)
+            delta_size = delta.tell()
+            delta.seek(0)
+            print(f"Delta: {copied_bytes} bytes alıcıda mevcut, {literal_bytes} bytes yeni veri ({delta_size} bytes gönderilecek)")
+            
+            self._send_frame(FRAME_DELTA, struct.pack('!Q', delta_size))
+            self._send_data(delta, delta_size, fragment, file_iv(iv, 1))
+        return False
+
+    def _send_dedup(self, file, offset: int, length: int, fragment: int, iv: bytes):
+        # Offer the content-defined chunk list, receiver answers with the chunks it does not have
+        started = time.perf_counter()
+        chunks = file_chunks(file, length)
+        self.stats.add("chunking", time.perf_counter() - started, length)
+        sealed_chunk_list = AESGCM(self.aes_key).encrypt(file_iv(iv, 0)[:12], pack_chunk_digests(chunks), b"chunks")
+        self._send_frame(FRAME_CHUNK_DIGESTS, sealed_chunk_list)
+        
+        self._read_results()
+        missing = [chunks[index] for index in recv_chunk_list(self.client_socket)]
+        missing_size = sum(chunk_length for _, chunk_length, _ in missing)
+        print(f"Tekilleştirme: {len(chunks) - len(missing)}/{len(chunks)} parça alıcıda mevcut, {missing_size}/{length} bytes gönderilecek")
+        if missing_size:
+            print(f"Aktarım küçülme oranı: {length / missing_size:.1f}x")
+        
+        # Only the missing chunks are sent, back to back in one encrypted stream
+        self._send_data(ChunkReader(file, offset, missing), missing_size, fragment, file_iv(iv, 1))
+
+    def _send_data(self, file, length: int, fragment: int, iv: bytes, path: str = None):
+        # path: file was opened from it, integrity-only mode can then send it with sendfile
+        self._mark_first_byte()
+        if self.cipher_mode == "mac":
+            # Integrity-only: no encryption, the HMAC is computed on a second thread
+            start_time = time.perf_counter()
+            mac = send_mac_file(self.client_socket, file, length, integrity_key(self.aes_key), iv, path)
+            elapsed = max(time.perf_counter() - start_time, 1e-9)
+            print(f"\rDosya HMAC-SHA256: {mac}")
+            print(f"Hız: {length / elapsed / 1e6:.1f} MB/s")
+        elif self.cipher_mode in ("gcm", "gcmz"):
+            # Chunked AES-GCM: chunks are compressed (optional) and sealed on a thread pool,
+            # the tags replace the checksum trailer
+            start_time = time.perf_counter()
+            _, wire_bytes = send_gcm_file(self.client_socket, file, length, self.aes_key, iv[:12], self.workers, self.codec)
+            if self.cipher_mode == "gcmz":
+                elapsed = max(time.perf_counter() - start_time, 1e-9)
+                print(f"\rSıkıştırma: {length} -> {wire_bytes} bytes (oran {wire_bytes / max(length, 1):.2f}), "
+                      f"etkin hız {length / elapsed / 1e6:.1f} MB/s")
+        else:
+            checksum = _send_cbc_file(self.client_socket, file, length, fragment, self.aes_key, iv, self.queue_depth, self.workers)
+            print(f"\rDosya Merkle kökü: {checksum}")
+
+    def close(self, end_session: bool = True):
+        if self.client_socket is None:
+            return
+        try:
+            if end_session:
+                # Damaged chunks are sent again until every file has its final answer
+                while self.pending or self.repairs:
+                    self._read_results()
+                    self._send_repairs()
+                self._send_frame(FRAME_END)
+                # A session that never read from the server learns here whether its hello was accepted
+                self._read_results()
+        finally:
+            self.client_socket.close()
+            self.client_socket = None
+
+def _send_range(filepath: str, filename: str, ip: str, port: int, fragment: int, username: str, password: str, aead: bool, workers: int, compress: str,
+                offset: int, length: int, total_size: int, transfer_id: str, streams: int, resume: bool = False, delta: bool = False,
+                dedup: bool = False, integrity_only: bool = False, queue_depth: int = None, retry_time: float = 0, on_progress=None):
+    # Returns the session, which holds the verified result of the range and the handshake time
+    with TcpSendSession(ip, port, username, password, aead, workers, compress, integrity_only, queue_depth, on_progress) as session:
+        session.connect(retry_time)
+        session.send_file(filepath, fragment, filename, offset, length, total_size, transfer_id, streams, resume, delta, dedup)
+    return session
+
+def tcp_send(filepath: str, ip: str, port: int, fragment: int, username: str, password: str, aead: bool = False, workers: int = None, streams: int = 1,
+             resume: bool = False, delta: bool = False, dedup: bool = False, compress: str = None, integrity_only: bool = False,
+             queue_depth: int = None, retry_time: float = 0, on_progress=None):
+    # Returns a TransferResult once the receiver has verified the file; raises a TransferError
+    # (SourceError, AuthenticationError, VerificationError) or OSError on failure;
+    # retry_time: seconds a refused connection is tried again; on_progress(ProgressEvent): progress of this transfer
+    # File check
+    if not os.path.isfile(filepath):
+        raise SourceError(f"{filepath} dosyası bulunamadı!")
+    
+    if not os.access(filepath, os.R_OK):
+        raise SourceError(f"{filepath} dosyası okunamıyor!")
+
+    # Get file data (Merkle root is calculated while sending)
+    filesize = os.path.getsize(filepath)
+    filename = os.path.basename(filepath)
+    start_time = time.perf_counter()
+
+    if streams > 1 and filesize > 0 and not resume and not delta and not dedup:
+        # Parallel transfer: every stream is a separately authenticated connection
+        # that carries one byte range; ranges are aligned to AES-GCM chunk size
+        range_size = (filesize + streams - 1) // streams
+        range_size = (range_size + CHUNK_SIZE - 1) // CHUNK_SIZE * CHUNK_SIZE
+        ranges = [(offset, min(range_size, filesize - offset)) for offset in range(0, filesize, range_size)]
+        transfer_id = secrets.token_hex(8)
+        sessions = [None] * len(ranges)
+        errors = []
+
+        def run(index, offset, length):
+            try:
+                sessions[index] = _send_range(filepath, filename, ip, port, fragment, username, password, aead, workers, compress,
+                                              offset, length, filesize, transfer_id, len(ranges), integrity_only=integrity_only,
+                                              queue_depth=queue_depth, retry_time=retry_time, on_progress=on_progress)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(index, offset, length)) for index, (offset, length) in enumerate(ranges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            print(f"\nHATA: {len(errors)}/{len(ranges)} bağlantı başarısız oldu!")
+            raise errors[0]
+        
+        # The ranges together are one file, verified if every range was
+        file_result = FileResult(filename, filesize, peer=f"{ip}:{port}")
+        file_result.duration = time.perf_counter() - start_time
+        file_result.verified = all(session.results[0].verified for session in sessions)
+        stats = Stats()
+        for session in sessions:
+            stats.merge(session.stats)
+        result = TransferResult("tcp", [file_result], file_result.duration, max(session.handshake_time for session in sessions), stats=stats)
+        check_result(result)
+        print(f"\nDosya {len(ranges)} paralel bağlantı ile gönderildi!")
+        return result
+    
+    session = _send_range(filepath, filename, ip, port, fragment, username, password, aead, workers, compress, 0, filesize, filesize, "", 1, resume, delta,
+                          dedup, integrity_only, queue_depth, retry_time, on_progress)
+    return check_result(TransferResult("tcp", session.results, time.perf_counter() - start_time, session.handshake_time, stats=session.stats))
+
+def tcp_send_files(paths: list, ip: str, port: int, fragment: int, username: str, password: str, aead: bool = False, workers: int = None,
+                   resume: bool = False, delta: bool = False, dedup: bool = False, compress: str = None, integrity_only: bool = False,
+                   queue_depth: int = None, retry_time: float = 0, on_progress=None):
+    # Send several files and directory trees over one authenticated session; returns a TransferResult
+    # with one FileResult per file, tree or pack of small files
+    filepaths = []
+    for path in paths:
+        if not (os.path.isdir(path) or (os.path.isfile(path) and os.access(path, os.R_OK))):
+            raise SourceError(f"{path} dosyası bulunamadı veya okunamıyor!")
+        filepaths.append(path)
+    
+    if not filepaths:
+        raise SourceError("Gönderilecek dosya yok!")
+    
+    start_time = time.perf_counter()
+    with TcpSendSession(ip, port, username, password, aead, workers, compress, integrity_only, queue_depth, on_progress) as session:
+        session.connect(retry_time)
+        # Small plain files go together in one packed stream; resumable, delta and
+        # deduplicated transfers need their per-file exchange
+        small = {filepath for filepath in filepaths if os.path.isfile(filepath) and os.path.getsize(filepath) <= PACK_THRESHOLD}
+        if len(small) > 1 and not resume and not delta and not dedup:
+            session.send_pack([filepath for filepath in filepaths if filepath in small], fragment)
+            filepaths = [filepath for filepath in filepaths if filepath not in small]
+        for filepath in filepaths:
+            if os.path.isdir(filepath):
+                session.send_tree(filepath, fragment)
+            else:
+                session.send_file(filepath, fragment, resume=resume, delta=delta, dedup=dedup)
+    
+    result = check_result(TransferResult("tcp", session.results, time.perf_counter() - start_time, session.handshake_time, stats=session.stats))
+    print(f"\n{result.file_count} dosya tek oturumda gönderildi!")
+    return result
 
 if __name__ == "__main__":
     tcp_send("input/test.txt", "localhost", 12345, 1024, "admin", "admin123")
\ No newline at end of file
@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from utils.errors import TransferError
+from utils.results import combine_results
+
+PING_LIMIT = 50  # Auto protocol selection: TCP below this RTT (ms), UDP above
+SWITCH_RETRY_TIME = 10.0  # Auto mode: seconds a refused TCP connection is tried again while the receiver opens the transfer socket
+
+def _select_protocol(rtt: float):
+    if rtt < PING_LIMIT:
+        print(f"\nPing {PING_LIMIT}'den küçük olduğu için TCP protokolü seçildi.\n")
+        return "tcp"
+    print(f"\nPing {PING_LIMIT}'den büyük olduğu için UDP protokolü seçildi.\n")
+    return "udp"
+
+class TransferClient:
+    # Sends files with one set of options, as often as needed from one process; every send returns
+    # a TransferResult once the receiver has verified the data, failures raise a TransferError
+    # (SourceError, AuthenticationError, ProtocolError, VerificationError) or OSError for network errors
+    def __init__(self, ip: str, port: int, username: str = "admin", password: str = "admin123", protocol: str = "tcp", fragment: int = 1024,
+                 aead: bool = False, workers: int = None, streams: int = 1, resume: bool = False, delta: bool = False, dedup: bool = False,
+                 compress: str = None, integrity_only: bool = False, ping_count: int = 5, queue_depth: int = None, on_progress=None):
+        # on_progress(ProgressEvent): progress of this client's transfers, called from the transfer threads
+        if protocol not in ("tcp", "udp", "auto"):
+            raise ValueError(f"Bilinmeyen protokol: {protocol}")
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.protocol = protocol
+        self.fragment = fragment
+        self.aead = aead
+        self.workers = workers
+        self.streams = streams
+        self.resume = resume
+        self.delta = delta
+        self.dedup = dedup
+        self.compress = compress
+        self.integrity_only = integrity_only
+        self.ping_count = ping_count
+        self.queue_depth = queue_depth
+        self.on_progress = on_progress
+
+    def send(self, paths):
+        # paths: one path or a list of files and directories
+        if isinstance(paths, str):
+            paths = [paths]
+        if not paths:
+            raise TransferError("Gönderilecek dosya yok!")
+
+        protocol = self.protocol
+        if protocol == "auto":
+            # The receiver measures the same pings and makes the same choice
+            from utils.ping_sender import ping_send_return
+            protocol = _select_protocol(ping_send_return(self.ip, self.port, self.ping_count))
+        # After the pings the receiver still has to open its transfer socket: TCP connections are
+        # tried again (UDP sends its CONNECT again in any case)
+        retry_time = SWITCH_RETRY_TIME if self.protocol == "auto" else 0
+
+        if protocol == "udp":
+            # One UDP transfer per file or directory
+            from utils.udp_sender import udp_send
+            start_time = time.perf_counter()
+            results = [udp_send(path, self.ip, self.port, self.fragment, self.username, self.password, self.compress, self.workers, self.on_progress)
+                       for path in paths]
+            return combine_results("udp", results, time.perf_counter() - start_time)
+
+        if len(paths) > 1 or os.path.isdir(paths[0]):
+            # Several files or a directory are sent over one TCP session
+            from utils.tcp_sender import tcp_send_files
+            return tcp_send_files(paths, self.ip, self.port, self.fragment, self.username, self.password, self.aead, self.workers, self.resume,
+                                  self.delta, self.dedup, self.compress, self.integrity_only, self.queue_depth, retry_time, self.on_progress)
+        from utils.tcp_sender import tcp_send
+        return tcp_send(paths[0], self.ip, self.port, self.fragment, self.username, self.password, self.aead, self.workers, self.streams,
+                        self.resume, self.delta, self.dedup, self.compress, self.integrity_only, self.queue_depth, retry_time, self.on_progress)
+
+class TransferServer:
+    # Receives files into folderpath; serve_forever() blocks, start() serves on a background thread
+    # until stop(). Every received file is appended to results as a FileResult and passed to
+    # on_result (called from the session threads), their progress to on_progress(ProgressEvent).
+    # Port 0 picks a free port, see port after start()
+    def __init__(self, folderpath: str, port: int, username: str = "admin", password: str = "admin123", protocol: str = "tcp",
+                 workers: int = None, max_sessions: int = 16, handshake: str = "rsa", host_key: str = None, chunk_store: str = None,
+                 on_result=None, queue_depth: int = None, on_progress=None):
+        if protocol not in ("tcp", "udp", "auto"):
+            raise ValueError(f"Bilinmeyen protokol: {protocol}")
+        self.folderpath = folderpath
+        self.port = port
+        self.username = username
+        self.password = password
+        self.protocol = protocol
+        self.workers = workers
+        self.max_sessions = max_sessions
+        self.handshake = handshake
+        self.host_key = host_key
+        self.chunk_store = chunk_store
+        self.on_result = on_result
+        self.queue_depth = queue_depth
+        self.on_progress = on_progress
+        self.results = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._listening = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def _record(self, result):
+        with self._lock:
+            self.results.append(result)
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def _on_listen(self, port: int):
+        self.port = port
+        self._listening.set()
+
+    def serve_forever(self):
+        protocol = self.protocol
+        if protocol == "auto":
+            from utils.ping_receiver import ping_receive_return
+            # The ping socket takes the port first (port 0: the transfer socket reuses the port it got)
+            protocol = _select_protocol(ping_receive_return(self.port, self._on_listen))
+
+        if protocol == "tcp":
+            from utils.tcp_receiver import tcp_receive
+            tcp_receive(self.folderpath, self.port, self.username, self.password, self.workers, self.max_sessions, self.handshake, self.host_key,
+                        self.chunk_store, self._record, self._stop_event, self._on_listen, self.queue_depth, self.on_progress)
+        else:
+            from utils.udp_receiver import udp_receive
+            udp_receive(self.folderpath, self.port, self.username, self.password, self.handshake, self.host_key, self._record, self._stop_event,
+                        self._on_listen, self.on_progress)
+
+    def start(self, timeout: float = 30.0):
+        # Returns once the server listens; errors while starting (folder, key, bind) are raised here
+        def run():
+            try:
+                self.serve_forever()
+            except Exception as e:
+                self._error = e
+            finally:
+                self._listening.set()
+
+        self._stop_event.clear()
+        self._listening.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not self._listening.wait(timeout):
+            raise TransferError("Sunucu başlatılamadı: zaman aşımı")
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        # Stops accepting new transfers; sessions in progress are finished on their own threads
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.stop()
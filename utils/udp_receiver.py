@@ -1,35 +1,54 @@
 import socket
 import select
 import os
-import hashlib
+import io
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.backends import default_backend
 import struct
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from utils.handshake import server_key, public_key_pem, server_accept
+from utils.compression import StreamDecompressor
+from utils.archive import safe_path, safe_name, extract_archive
+from utils.aead import default_workers
+from utils.merkle import TreeHasher
+from utils.storage import ReceiveFile
+from utils.progress import Progress, Transfer, tracking, current_transfer
+from utils.stats import Stats, recording
+from utils.errors import TransferError, SourceError
+from utils.results import FileResult
+from utils.framing import (FRAME_CONNECT, FRAME_PUBLIC_KEY, FRAME_HELLO, FRAME_AUTH_RESULT, FRAME_DATA, FRAME_PACKET_ACK, FRAME_RESEND,
+                           FRAME_FILE_RESULT, FLAG_TREE, RESULT_OK, RESULT_FAILED, UDP_DATA_SIZE, pack_frame, parse_datagram,
+                           expect_datagram, unpack_hello, unpack_udp_file_info)
+import time
 
-def udp_receive(folderpath: str, port: int, valid_username: str, valid_password: str):
+MAX_IDLE_TIMEOUTS = 4  # Consecutive 5 second timeouts without a packet before a transfer is given up
+
+def _report(on_result, name: str, size: int, files: int, address, start_time: float, verified: bool, stats: Stats):
+    if on_result is not None:
+        result = FileResult(name, size, files, f"{address[0]}:{address[1]}")
+        result.duration = time.perf_counter() - start_time
+        result.verified = verified
+        result.stats = stats.split()
+        on_result(result)
+
+def udp_receive(folderpath: str, port: int, valid_username: str, valid_password: str, handshake: str = "rsa", host_key: str = None,
+                on_result=None, stop_event=None, on_listen=None, on_progress=None):
+    # Serves until Ctrl+C or until stop_event is set; on_result(FileResult) is called for every
+    # received file (with its stage timings), on_listen(port) once the socket is bound (port 0 picks a free port),
+    # on_progress(ProgressEvent) with the progress of every received file
+    with recording(Stats()) as stats, tracking(Transfer(on_progress)):
+        _serve(folderpath, port, valid_username, valid_password, handshake, host_key, on_result, stop_event, on_listen, stats)
+
+def _serve(folderpath: str, port: int, valid_username: str, valid_password: str, handshake: str, host_key: str, on_result, stop_event, on_listen,
+           stats: Stats):
     # Dir check
     if not os.path.exists(folderpath):
         os.makedirs(folderpath)
         print(f"Klasör oluşturuldu: {folderpath}")
     elif not os.path.isdir(folderpath):
-        print(f"HATA: {folderpath} bir klasör değil!")
-        return  
+        raise SourceError(f"{folderpath} bir klasör değil!")
 
-    # Generate RSA key pair for this session
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
-    )
-    public_key = private_key.public_key()
-    
-    # Serialize public key
-    public_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
+    private_key, public_pem = server_key(handshake, host_key)
 
     # Create UDP Socket
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -42,203 +61,221 @@ def udp_receive(folderpath: str, port: int, valid_username: str, valid_password:
     try:
         # Bind to port
         server_socket.bind(("0.0.0.0", port))
+        port = server_socket.getsockname()[1]
         print(f"UDP Sunucu localhost:{port} adresinde dinleniyor...")
+        if on_listen is not None:
+            on_listen(port)
         
-        while True:
+        while stop_event is None or not stop_event.is_set():
             try:
+                server_socket.settimeout(None)
                 ready, _, _ = select.select([server_socket], [], [], 1.0)
                 
                 if not ready: continue
 
                 # Receive initial connection request
-                data, client_address = server_socket.recvfrom(1024)
-                if data == b"CONNECT":
-                    print(f"\nBağlantı talebi alındı: {client_address}")
-                    
-                    # Send public key to client
-                    chunks = [public_pem[i:i+1024] for i in range(0, len(public_pem), 1024)]
-                    server_socket.sendto(struct.pack('!I', len(chunks)), client_address)
-                    
-                    for i, chunk in enumerate(chunks):
-                        server_socket.sendto(struct.pack('!I', i) + chunk, client_address)
-                    
-                    # Wait for ACK
-                    ack_data, _ = server_socket.recvfrom(1024)
-                    if ack_data != b"KEY_RECEIVED":
-                        continue
+                data, client_address = server_socket.recvfrom(65535)
+                if parse_datagram(data)[0] != FRAME_CONNECT:
+                    continue  # Late packets of an earlier transfer
+                print(f"\nBağlantı talebi alındı: {client_address}")
+                connect_time = time.perf_counter()
+                stats.reset()
+                
+                if handshake == "x25519" and not host_key:
+                    # Ephemeral X25519 key for this session only (no persisted host key)
+                    private_key = X25519PrivateKey.generate()
+                    public_pem = public_key_pem(private_key)
+                
+                # Send public key to client (one datagram)
+                server_socket.sendto(pack_frame(FRAME_PUBLIC_KEY, public_pem), client_address)
                 
-                # Client authentication
-                auth_data, _ = server_socket.recvfrom(2048)
+                # Client hello: credentials, key material and the file info in one datagram;
+                # a client that never sends it does not block the server
+                server_socket.settimeout(10.0)
+                while True:
+                    hello_frame, address = server_socket.recvfrom(65535)
+                    if address != client_address:
+                        continue
+                    if parse_datagram(hello_frame)[0] != FRAME_CONNECT:
+                        break
+                    # CONNECT sent again: the public key datagram may have been lost
+                    server_socket.sendto(pack_frame(FRAME_PUBLIC_KEY, public_pem), client_address)
+                hello, file_info = unpack_hello(expect_datagram(hello_frame, FRAME_HELLO))
                 try:
-                    decrypted_auth = private_key.decrypt(
-                        auth_data,
-                        padding.OAEP(
-                            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                            algorithm=hashes.SHA256(),
-                            label=None
-                        )
-                    )
-                    username, password = decrypted_auth.decode('utf-8').split('|')
+                    # RSA: one OAEP block with credentials, AES key and IV; X25519: ECDH + HKDF
+                    username, password, aes_key, iv = server_accept(private_key, hello)
+                    stats.add("handshake", time.perf_counter() - connect_time)
                     
                     if username != valid_username or password != valid_password:
                         print("HATA: Geçersiz kimlik doğrulama!")
-                        server_socket.sendto(b"AUTH_FAILED", client_address)
+                        server_socket.sendto(pack_frame(FRAME_AUTH_RESULT, RESULT_FAILED), client_address)
                         continue
-                    else:
-                        print("Kimlik doğrulama başarılı!")
-                        server_socket.sendto(b"AUTH_SUCCESS", client_address)
+                    
+                    # Get file data
+                    filename, filesize, fragment, checksum, stream_size, flags = unpack_udp_file_info(file_info)
+                    safe_name(filename)  # Stays inside folderpath
+                    transfer = current_transfer()
+                    transfer.name, transfer.peer = filename, f"{client_address[0]}:{client_address[1]}"
                 except Exception as e:
                     print(f"Kimlik doğrulama hatası: {e}")
-                    server_socket.sendto(b"AUTH_FAILED", client_address)
+                    server_socket.sendto(pack_frame(FRAME_AUTH_RESULT, RESULT_FAILED), client_address)
                     continue
                 
-                # Receive encrypted AES key
-                encrypted_aes_key, _ = server_socket.recvfrom(2048)
-                aes_key = private_key.decrypt(
-                    encrypted_aes_key,
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                
-                # Send ACK for AES key
-                server_socket.sendto(b"AES_KEY_RECEIVED", client_address)
-                
-                # Receive IV
-                iv_data, _ = server_socket.recvfrom(1024)
-                iv = iv_data
-                
-                # Send ACK for IV
-                server_socket.sendto(b"IV_RECEIVED", client_address)
-                
-                # Get file data
-                file_info, _ = server_socket.recvfrom(2048)
-                data_str = file_info.decode('utf-8').rstrip('a')  # Remove padding
-                filename, filesize, fragment, checksum, *_ = data_str.split('|')
-                filesize = int(filesize)
-                fragment = int(fragment)
+                # The only answer to the hello: authenticated and file info accepted
+                print("Kimlik doğrulama başarılı!")
+                server_socket.sendto(pack_frame(FRAME_AUTH_RESULT, RESULT_OK), client_address)
+                
+                # A compressed file arrives as a stream of compressed frames of stream_size bytes
+                compressed = stream_size is not None
+                stream_size = stream_size if compressed else filesize
+                
+                # A directory arrives as a stream of entry frames, kept in memory until it is verified
+                tree = bool(flags & FLAG_TREE)
 
                 print(f"Alınacak dosya: {filename}")
                 print(f"Dosya boyutu: {filesize} bytes")
                 print(f"Dosya parça boyutu: {fragment} bytes")
-                print(f"Beklenen SHA-256 checksum: {checksum}")
-                
-                # Send ACK for file info
-                server_socket.sendto(b"FILE_INFO_RECEIVED", client_address)
+                print(f"Beklenen Merkle kökü: {checksum}")
                 
                 # Setup AES decryption
                 cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
                 decryptor = cipher.decryptor()
                 
                 # Prepare for file reception with packet ordering
-                total_encrypted_size = filesize + (16 - filesize % 16) if filesize % 16 != 0 else filesize
-                max_packet_size = 65507  # Max UDP payload size
-                expected_packets = (total_encrypted_size + max_packet_size - 1) // max_packet_size
+                total_encrypted_size = stream_size + (16 - stream_size % 16) if stream_size % 16 != 0 else stream_size
+                expected_packets = (total_encrypted_size + UDP_DATA_SIZE - 1) // UDP_DATA_SIZE
                 received_packets = {}
                 
                 print(f"Beklenen paket sayısı: {expected_packets}")
                 
                 # Receive file data packets
                 bytes_received = 0
+                start_time = time.perf_counter()
+                progress = Progress(total_encrypted_size, expected_packets)
+                idle_timeouts = 0
                 while len(received_packets) < expected_packets:
                     try:
                         server_socket.settimeout(5.0)  # 5 second timeout
-                        packet_data, addr = server_socket.recvfrom(max_packet_size + 100)
+                        started = time.perf_counter()
+                        try:
+                            packet_data, addr = server_socket.recvfrom(65535)
+                        finally:
+                            stats.add("socket_recv", time.perf_counter() - started)
                         
                         if addr != client_address:
                             continue
                         
                         # Extract packet number and data
-                        packet_num = struct.unpack('!I', packet_data[:4])[0]
-                        encrypted_chunk = packet_data[4:]
+                        frame_type, payload = parse_datagram(packet_data)
+                        if frame_type != FRAME_DATA:
+                            continue
+                        packet_num = struct.unpack('!I', payload[:4])[0]
+                        if packet_num >= expected_packets:
+                            continue
+                        encrypted_chunk = payload[4:]
+                        idle_timeouts = 0
                         
+                        if packet_num not in received_packets:  # Resent duplicates count once
+                            bytes_received += len(encrypted_chunk)
+                            stats.count("packets")
+                        else:
+                            stats.count("duplicates")
                         received_packets[packet_num] = encrypted_chunk
-                        bytes_received += len(encrypted_chunk)
                         
                         # Send ACK for this packet
-                        server_socket.sendto(struct.pack('!I', packet_num), client_address)
+                        started = time.perf_counter()
+                        server_socket.sendto(pack_frame(FRAME_PACKET_ACK, struct.pack('!I', packet_num)), client_address)
+                        stats.add("socket_send", time.perf_counter() - started, len(payload))
                         
-                        # Update progress
-                        progress = (len(received_packets) / expected_packets) * 100
-                        print(f"\rPaket alındı: {len(received_packets)}/{expected_packets} ({progress:.1f}%)", end='', flush=True)
+                        # Progress events are throttled by the reporter, no printing per datagram
+                        progress.update(bytes_received, len(received_packets))
                         
                     except socket.timeout:
                         print(f"\nTimeout! Alınan paket: {len(received_packets)}/{expected_packets}")
+                        idle_timeouts += 1
+                        if idle_timeouts >= MAX_IDLE_TIMEOUTS:
+                            # The sender gave up; wait for the next connection instead
+                            raise TransferError(f"Gönderici yanıt vermiyor, aktarım iptal edildi: {filename}")
                         # Request missing packets
                         missing = [i for i in range(expected_packets) if i not in received_packets]
                         if missing:
                             for miss in missing[:10]:  # Request first 10 missing packets
-                                server_socket.sendto(b"RESEND:" + struct.pack('!I', miss), client_address)
+                                server_socket.sendto(pack_frame(FRAME_RESEND, struct.pack('!I', miss)), client_address)
+                                stats.count("resend_requests")
                         continue
                 
                 server_socket.settimeout(None)  # Remove timeout
+                progress.finish()
+                
+                # Save file and calculate checksum (Merkle root, leaves hashed on a thread pool) - decrypt in order
+                file_hash = TreeHasher()
                 
-                # Save file and calculate checksum - decrypt in order
-                file_hash = hashlib.sha256()
+                decompressor = StreamDecompressor() if compressed else None
                 
-                with open(folderpath + filename, 'wb') as file:
-                    receive_buffer = b""
+                # Files go into a preallocated temporary file that is moved into place once verified
+                storage = None if tree else ReceiveFile(folderpath + filename, filesize)
+                file = io.BytesIO() if tree else storage.writer()
+                try:
+                    bytes_written = 0
+                    clock = time.perf_counter
                     
                     for packet_num in sorted(received_packets.keys()):
-                        encrypted_data = received_packets[packet_num]
-                        receive_buffer += encrypted_data
+                        # Decrypt whole packet at once (the decryptor keeps partial blocks itself)
+                        started = clock()
+                        decrypted_data = decryptor.update(received_packets[packet_num])
+                        decrypted = clock()
+                        stats.add("decrypt", decrypted - started, len(received_packets[packet_num]))
                         
-                        # Process complete 16-byte blocks
-                        while len(receive_buffer) >= 16:
-                            block_to_decrypt = receive_buffer[:16]
-                            receive_buffer = receive_buffer[16:]
-                            
-                            # Decrypt block
-                            decrypted_block = decryptor.update(block_to_decrypt)
-                            file.write(decrypted_block)
-                            file_hash.update(decrypted_block)
-                    
-                    # Process any remaining data
-                    if receive_buffer:
-                        decrypted_final = decryptor.update(receive_buffer)
-                        file.write(decrypted_final)
-                        file_hash.update(decrypted_final)
-                    
-                    # Finalize decryption
-                    final_chunk = decryptor.finalize()
-                    if final_chunk:
-                        file.write(final_chunk)
-                        file_hash.update(final_chunk)
-                
-                # Remove PKCS7 padding by truncating file to original size
-                with open(folderpath + filename, 'r+b') as file:
-                    file.truncate(filesize)
-                
-                # Recalculate hash for the actual file content
-                file_hash = hashlib.sha256()
-                with open(folderpath + filename, 'rb') as file:
-                    while True:
-                        chunk = file.read(65536)
-                        if not chunk:
-                            break
-                        file_hash.update(chunk)
-                
-                # Verify file integrity using SHA-256
+                        # Write and hash only the real file bytes, never the PKCS7 padding
+                        useful_length = min(len(decrypted_data), stream_size - bytes_written)
+                        data = decrypted_data[:useful_length]
+                        bytes_written += useful_length
+                        if decompressor is not None:
+                            data = decompressor.feed(data)
+                            decompressed = clock()
+                            stats.add("decompress", decompressed - decrypted, len(data))
+                            decrypted = decompressed
+                        file.write(data)
+                        stats.add("disk_write", clock() - decrypted, len(data))
+                        file_hash.update(data)
+                except Exception:
+                    if storage is not None:
+                        storage.discard()
+                    raise
+                
+                tree_data = file.getvalue() if tree else None
+                
+                if compressed:
+                    elapsed = max(time.perf_counter() - start_time, 1e-9)
+                    print(f"\rSıkıştırma: {stream_size} -> {filesize} bytes (oran {stream_size / max(filesize, 1):.2f}), "
+                          f"etkin hız {filesize / elapsed / 1e6:.1f} MB/s")
+                
+                # Verify file integrity using the Merkle root
                 received_checksum = file_hash.hexdigest()
-                if received_checksum == checksum:
+                if received_checksum == checksum and tree:
+                    # Verified entry stream: recreate the directory tree
+                    files, total_bytes = extract_archive(io.BytesIO(tree_data), safe_path(folderpath, filename), default_workers())
+                    print(f"\rDizin başarıyla alındı ve doğrulandı: {filename} ({files} dosya, {total_bytes} bytes)")
+                    server_socket.sendto(pack_frame(FRAME_FILE_RESULT, RESULT_OK), client_address)
+                    _report(on_result, filename, total_bytes, files, client_address, connect_time, True, stats)
+                elif received_checksum == checksum:
+                    storage.commit()
                     print(f"\rDosya başarıyla alındı ve doğrulandı: {filename}")
-                    server_socket.sendto(b"FILE_SUCCESS", client_address)
+                    server_socket.sendto(pack_frame(FRAME_FILE_RESULT, RESULT_OK), client_address)
+                    _report(on_result, filename, filesize, 1, client_address, connect_time, True, stats)
                 else:
                     print(f"\rHATA: Dosya bozuk! Beklenen: {checksum}, Alınan: {received_checksum}")
-                    os.remove(folderpath + filename)
+                    if storage is not None:
+                        storage.discard()
                     print(f"Bozuk dosya silindi: {filename}")
-                    server_socket.sendto(b"FILE_FAILED", client_address)
+                    server_socket.sendto(pack_frame(FRAME_FILE_RESULT, RESULT_FAILED), client_address)
+                    _report(on_result, filename, filesize, 0 if tree else 1, client_address, connect_time, False, stats)
                     
             except KeyboardInterrupt:
                 print("Sunucu kapatılıyor...")
                 break
             except Exception as e:
                 print(f"HATA: {e}")
-                    
-    except Exception as e:
-        print(f"HATA: {e}")
     finally:
         server_socket.close()
 
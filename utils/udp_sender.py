@@ -1,34 +1,79 @@
 import socket
 import os
-import hashlib
+import io
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
-import secrets
 import struct
 import time
+from utils.handshake import client_hello
+from utils.compression import CODECS, compress_stream
+from utils.aead import default_workers
+from utils.merkle import merkle_root, hash_leaves
+from utils.archive import walk_tree, tree_size, write_archive
+from utils.progress import Progress, Transfer, tracking
+from utils.stats import Stats, recording
+from utils.errors import TransferError, SourceError, AuthenticationError
+from utils.results import FileResult, TransferResult, check_result
+from utils.framing import (FRAME_CONNECT, FRAME_PUBLIC_KEY, FRAME_HELLO, FRAME_AUTH_RESULT, FRAME_DATA, FRAME_PACKET_ACK, FRAME_RESEND,
+                           FRAME_FILE_RESULT, FLAG_TREE, RESULT_OK, UDP_DATA_SIZE, pack_frame, parse_datagram, expect_datagram,
+                           pack_hello, pack_udp_file_info)
 
-def udp_send(filepath: str, ip: str, port: int, fragment: int, username: str, password: str):
-    # File check
-    if not os.path.exists(filepath) and not os.path.isfile(filepath):
-        print(f"HATA: {filepath} dosyası bulunamadı!")
-        return
+CONNECT_TIMEOUTS = (0.5, 1.0, 2.0, 4.0, 2.5)  # Waits for the public key, CONNECT is sent again after each (10 seconds in total)
+
+def udp_send(filepath: str, ip: str, port: int, fragment: int, username: str, password: str, compress: str = None, workers: int = None,
+             on_progress=None):
+    # Returns a TransferResult once the receiver has verified the file; raises a TransferError
+    # (SourceError, AuthenticationError, VerificationError) or OSError on failure;
+    # on_progress(ProgressEvent): progress of this transfer
+    stats = Stats()
+    with recording(stats), tracking(Transfer(on_progress, os.path.basename(os.path.normpath(filepath)), f"{ip}:{port}")):
+        return _send(filepath, ip, port, fragment, username, password, compress, workers, stats)
+
+def _send(filepath: str, ip: str, port: int, fragment: int, username: str, password: str, compress: str, workers: int, stats: Stats):
+    # File check (a directory is sent as a stream of entry frames)
+    if not os.path.exists(filepath):
+        raise SourceError(f"{filepath} dosyası bulunamadı!")
     
     if not os.access(filepath, os.R_OK):
-        print(f"HATA: {filepath} dosyası okunamıyor!")
-        return
+        raise SourceError(f"{filepath} dosyası okunamıyor!")
 
-    # Get file data and calculate checksum (SHA-256)
-    filesize = os.path.getsize(filepath)
-    filename = os.path.basename(filepath)
+    # Get file data and calculate checksum (Merkle root)
+    tree = os.path.isdir(filepath)
+    filename = os.path.basename(os.path.normpath(filepath))
+    
+    if tree:
+        # UDP keeps the whole transfer in memory anyway: the entry frames of the tree
+        # are built into an in-memory stream and sent like the contents of one file
+        stream = io.BytesIO()
+        entries = walk_tree(filepath)
+        files = write_archive(stream, entries, workers or default_workers())
+        result = FileResult(filename, tree_size(entries), files, f"{ip}:{port}")
+        file_data = stream.getvalue()
+        print(f"\rDizin akışı: {files} dosya, {len(file_data)} bytes")
+    else:
+        # Read file once; the same data is hashed here and encrypted later
+        started = time.perf_counter()
+        with open(filepath, 'rb') as file:
+            file_data = file.read()
+        stats.add("disk_read", time.perf_counter() - started, len(file_data))
+        result = FileResult(filename, len(file_data), peer=f"{ip}:{port}")
+    filesize = len(file_data)
+    # Merkle root over 1MB leaves hashed in parallel (the workers record the hash time)
+    checksum = merkle_root(hash_leaves(file_data, workers)).hex()
     
-    # Calculate file checksum using SHA-256
-    file_hash = hashlib.sha256()
-    with open(filepath, 'rb') as file:
-        for chunk in iter(lambda: file.read(4096), b""):
-            file_hash.update(chunk)
-    checksum = file_hash.hexdigest()
+    if compress:
+        # Compress chunk by chunk on worker threads before encryption; the receiver
+        # gets the size of the compressed stream next to the real file size
+        start_time = time.perf_counter()
+        file_data = compress_stream(file_data, CODECS[compress], workers or default_workers())
+        stream_size = len(file_data)
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        stats.add("compress", elapsed, filesize)
+        print(f"Sıkıştırma: {filesize} -> {stream_size} bytes (oran {stream_size / max(filesize, 1):.2f}), "
+              f"{filesize / elapsed / 1e6:.1f} MB/s")
+    else:
+        stream_size = None
 
     # Create UDP Socket
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -40,136 +85,80 @@ def udp_send(filepath: str, ip: str, port: int, fragment: int, username: str, pa
     try:
         server_address = (ip, port)
         print(f"UDP Sunucuya bağlanılıyor: {ip}:{port}")
+        start_time = time.perf_counter()
         
-        # Send connection request
-        client_socket.sendto(b"CONNECT", server_address)
-        
-        # Receive server's public key (in chunks)
-        chunk_count_data, _ = client_socket.recvfrom(1024)
-        chunk_count = struct.unpack('!I', chunk_count_data)[0]
-        
-        public_key_chunks = {}
-        for _ in range(chunk_count):
-            chunk_data, _ = client_socket.recvfrom(2048)
-            chunk_num = struct.unpack('!I', chunk_data[:4])[0]
-            chunk_content = chunk_data[4:]
-            public_key_chunks[chunk_num] = chunk_content
-        
-        # Reconstruct public key
-        public_key_pem = b''.join([public_key_chunks[i] for i in sorted(public_key_chunks.keys())])
-        public_key = serialization.load_pem_public_key(public_key_pem, backend=default_backend())
-        
-        # Send ACK for public key
-        client_socket.sendto(b"KEY_RECEIVED", server_address)
-        
-        # Send authentication credentials (encrypted with RSA)
-        auth_data = f"{username}|{password}".encode('utf-8')
-        encrypted_auth = public_key.encrypt(
-            auth_data,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        client_socket.sendto(encrypted_auth, server_address)
-        
-        # Wait for authentication response
-        client_socket.settimeout(10.0)  # 10 second timeout
-        auth_response, _ = client_socket.recvfrom(1024)
-        if auth_response != b"AUTH_SUCCESS":
-            print("HATA: Kimlik doğrulama başarısız!")
-            return
-        else:
-            print("Kimlik doğrulama başarılı!")
-        
-        # Generate AES key and IV
-        aes_key = secrets.token_bytes(32)  # 256-bit key
-        iv = secrets.token_bytes(16)       # 128-bit IV
-        
-        # Encrypt AES key with RSA and send
-        encrypted_aes_key = public_key.encrypt(
-            aes_key,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        client_socket.sendto(encrypted_aes_key, server_address)
-        
-        # Wait for AES key ACK
-        ack_response, _ = client_socket.recvfrom(1024)
-        if ack_response != b"AES_KEY_RECEIVED":
-            print("HATA: AES anahtarı gönderimi başarısız!")
-            return
-        
-        # Send IV
-        client_socket.sendto(iv, server_address)
-        
-        # Wait for IV ACK
-        ack_response, _ = client_socket.recvfrom(1024)
-        if ack_response != b"IV_RECEIVED":
-            print("HATA: IV gönderimi başarısız!")
-            return
-        
-        # Send file data with checksum
-        info = f"{filename}|{filesize}|{fragment}|{checksum}|"
-        info_bytes = info.encode('utf-8')
-        length = len(info_bytes)
-
-        if length < 1024:
-            padding_len = 1024 - length
-            info_padded = info_bytes + b'a' * padding_len
+        # Send connection request; it is sent again after every wait without an answer (a lost datagram,
+        # or a receiver that is still opening its socket after the auto mode pings)
+        for timeout in CONNECT_TIMEOUTS:
+            client_socket.settimeout(timeout)
+            client_socket.sendto(pack_frame(FRAME_CONNECT), server_address)
+            try:
+                # Receive server's public key (one datagram)
+                public_key_data, _ = client_socket.recvfrom(65535)
+                break
+            except (socket.timeout, ConnectionError):
+                continue
         else:
-            info_padded = info_bytes[:1024]
-
-        client_socket.sendto(info_padded, server_address)
-        
-        # Wait for file info ACK
-        ack_response, _ = client_socket.recvfrom(1024)
-        if ack_response != b"FILE_INFO_RECEIVED":
-            print("HATA: Dosya bilgisi gönderimi başarısız!")
-            return
+            raise socket.timeout(f"Sunucu yanıt vermiyor: {ip}:{port}")
+        client_socket.settimeout(10.0)  # 10 second timeout
+        public_key_pem = expect_datagram(public_key_data, FRAME_PUBLIC_KEY)
+        public_key = serialization.load_pem_public_key(public_key_pem, backend=default_backend())
         
-        print(f"Gönderilen dosya: {filename}")
-        print(f"Dosya boyutu: {filesize} bytes")
-        print(f"Dosya parça boyutu: {fragment} bytes")
-        print(f"Dosya SHA-256 checksum: {checksum}")
+        # One datagram carries credentials, key material (RSA: AES key and IV encrypted together,
+        # X25519: derived from the exchange) and the file info; the server answers it once
+        hello, aes_key, iv = client_hello(public_key, username, password)
+        info = pack_udp_file_info(filename, filesize, fragment, checksum, stream_size, FLAG_TREE if tree else 0)
+        client_socket.sendto(pack_frame(FRAME_HELLO, pack_hello(hello, info)), server_address)
         
-        # Setup AES encryption
+        # Setup AES encryption (while the hello is on its way, the round trip hides the encryption time)
         cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv), backend=default_backend())
         encryptor = cipher.encryptor()
         
-        # Prepare file data for UDP transmission
-        max_packet_size = 65507 - 4  # Max UDP payload minus packet number
+        # Encrypt entire file first
+        # Apply PKCS7 padding
+        padding_length = 16 - (len(file_data) % 16)
+        if padding_length != 16:
+            file_data += bytes([padding_length] * padding_length)
         
-        # Read and encrypt entire file first
-        encrypted_data = b""
-        with open(filepath, 'rb') as file:
-            file_data = file.read()
-            
-            # Apply PKCS7 padding
-            padding_length = 16 - (len(file_data) % 16)
-            if padding_length != 16:
-                file_data += bytes([padding_length] * padding_length)
-            
-            # Encrypt all data
-            encrypted_data = encryptor.update(file_data)
-            encrypted_data += encryptor.finalize()
+        # Encrypt all data
+        started = time.perf_counter()
+        encrypted_data = encryptor.update(file_data)
+        encrypted_data += encryptor.finalize()
+        stats.add("encrypt", time.perf_counter() - started, len(file_data))
+        del file_data
         
         # Split into packets
         packets = []
-        for i in range(0, len(encrypted_data), max_packet_size):
-            packet_data = encrypted_data[i:i + max_packet_size]
+        for i in range(0, len(encrypted_data), UDP_DATA_SIZE):
+            packet_data = encrypted_data[i:i + UDP_DATA_SIZE]
             packets.append(packet_data)
         
+        # Wait for the answer: authentication result, which also accepts the file info;
+        # public keys answering a CONNECT that was sent again are skipped
+        auth_response, _ = client_socket.recvfrom(65535)
+        while parse_datagram(auth_response)[0] == FRAME_PUBLIC_KEY:
+            auth_response, _ = client_socket.recvfrom(65535)
+        if expect_datagram(auth_response, FRAME_AUTH_RESULT) != RESULT_OK:
+            raise AuthenticationError("Kimlik doğrulama başarısız!")
+        print("Kimlik doğrulama başarılı!")
+        handshake_time = time.perf_counter() - start_time
+        stats.add("handshake", handshake_time)
+        
+        print(f"Gönderilen dosya: {filename}")
+        print(f"Dosya boyutu: {filesize} bytes")
+        print(f"Dosya parça boyutu: {fragment} bytes")
+        print(f"Dosya Merkle kökü: {checksum}")
         print(f"Toplam paket sayısı: {len(packets)}")
+        print(f"İlk veri baytına kadar geçen süre (TTFB): {handshake_time * 1000:.1f} ms")
         
         # Send packets with reliable delivery
         packet_acks = set()
+        acked_bytes = 0
+        final_response = None
         max_retries = 3
         retry_count = 0
+        retransmits = 0  # Packets sent more than once, in retry rounds or on resend requests
+        progress = Progress(len(encrypted_data), len(packets))
         
         client_socket.settimeout(2.0)  # 2 second timeout for ACKs
         
@@ -178,58 +167,83 @@ def udp_send(filepath: str, ip: str, port: int, fragment: int, username: str, pa
             for packet_num, packet_data in enumerate(packets):
                 if packet_num not in packet_acks:
                     # Create packet with sequence number
-                    full_packet = struct.pack('!I', packet_num) + packet_data
+                    full_packet = pack_frame(FRAME_DATA, struct.pack('!I', packet_num) + packet_data)
+                    started = time.perf_counter()
                     client_socket.sendto(full_packet, server_address)
+                    stats.add("socket_send", time.perf_counter() - started, len(full_packet))
+                    retransmits += retry_count > 0
             
             # Collect ACKs with timeout
-            start_time = time.time()
-            while time.time() - start_time < 5.0:  # 5 second window for ACKs
+            window_start = time.time()
+            while time.time() - window_start < 5.0:  # 5 second window for ACKs
                 try:
-                    ack_data, _ = client_socket.recvfrom(1024)
+                    started = time.perf_counter()
+                    try:
+                        ack_data, _ = client_socket.recvfrom(1024)
+                    finally:
+                        stats.add("ack_wait", time.perf_counter() - started)
+                    try:
+                        frame_type, payload = parse_datagram(ack_data)
+                        if frame_type == FRAME_FILE_RESULT:
+                            final_response = ack_data  # Receiver is done, all packets arrived
+                            packet_acks.update(range(len(packets)))
+                            acked_bytes = len(encrypted_data)
+                            break
+                        packet_num = struct.unpack('!I', payload)[0]
+                    except (ValueError, struct.error):
+                        continue
                     
                     # Handle resend requests
-                    if ack_data.startswith(b"RESEND:"):
-                        resend_packet = struct.unpack('!I', ack_data[7:])[0]
-                        if resend_packet < len(packets):
-                            full_packet = struct.pack('!I', resend_packet) + packets[resend_packet]
+                    if frame_type == FRAME_RESEND:
+                        if packet_num < len(packets):
+                            full_packet = pack_frame(FRAME_DATA, struct.pack('!I', packet_num) + packets[packet_num])
+                            started = time.perf_counter()
                             client_socket.sendto(full_packet, server_address)
-                            continue
+                            stats.add("socket_send", time.perf_counter() - started, len(full_packet))
+                            retransmits += 1
                     
                     # Handle regular ACKs
-                    try:
-                        ack_packet_num = struct.unpack('!I', ack_data)[0]
-                        packet_acks.add(ack_packet_num)
-                    except:
-                        continue
+                    elif frame_type == FRAME_PACKET_ACK and packet_num < len(packets) and packet_num not in packet_acks:
+                        packet_acks.add(packet_num)
+                        acked_bytes += len(packets[packet_num])
+                        progress.update(acked_bytes, len(packet_acks))
                         
                 except socket.timeout:
                     break
             
-            progress = (len(packet_acks) / len(packets)) * 100
-            print(f"\rGönderim ilerlemesi: {len(packet_acks)}/{len(packets)} paket ({progress:.1f}%)", end='', flush=True)
-            
             if len(packet_acks) < len(packets):
                 retry_count += 1
                 print(f"\nYeniden deneme: {retry_count}/{max_retries}")
                 time.sleep(1)
         
         client_socket.settimeout(10.0)  # Reset timeout
+        progress.update(acked_bytes, len(packet_acks))
+        progress.finish()
         
-        if len(packet_acks) == len(packets):
-            # Wait for final confirmation
-            try:
+        if len(packet_acks) < len(packets):
+            raise TransferError(f"Tüm paketler gönderilemedi! {len(packet_acks)}/{len(packets)}")
+        
+        # Wait for final confirmation
+        started = time.perf_counter()
+        try:
+            if final_response is None:
                 final_response, _ = client_socket.recvfrom(1024)
-                if final_response == b"FILE_SUCCESS":
-                    print(f"\rDosya başarıyla gönderildi ve doğrulandı!")
-                else:
-                    print(f"\rDosya gönderildi ancak doğrulama başarısız!")
-            except socket.timeout:
-                print(f"\rDosya gönderildi, doğrulama yanıtı alınamadı!")
-        else:
-            print(f"\rHATA: Tüm paketler gönderilemedi! {len(packet_acks)}/{len(packets)}")
-            
-    except Exception as e:
-        print(f"HATA: {e}")
+            while parse_datagram(final_response)[0] != FRAME_FILE_RESULT:
+                final_response, _ = client_socket.recvfrom(1024)  # Late duplicate ACKs and resend requests
+            stats.add("ack_wait", time.perf_counter() - started)
+            result.verified = expect_datagram(final_response, FRAME_FILE_RESULT) == RESULT_OK
+            if result.verified:
+                print(f"\rDosya başarıyla gönderildi ve doğrulandı!")
+            else:
+                print(f"\rDosya gönderildi ancak doğrulama başarısız!")
+        except socket.timeout:
+            stats.add("ack_wait", time.perf_counter() - started)
+            print(f"\rDosya gönderildi, doğrulama yanıtı alınamadı!")
+        
+        result.duration = time.perf_counter() - start_time
+        stats.count("packets", len(packets))
+        stats.count("retransmits", retransmits)
+        return check_result(TransferResult("udp", [result], result.duration, handshake_time, retransmits, stats.finish()))
     finally:
         client_socket.close()
 